@@ -0,0 +1,187 @@
+"""
+Eksport zbiorczy plików inspekcji (tryb "plik na zmianę").
+
+Zamiast jednego małego pliku CSV na sztukę wiersze `INSPECT;...` są
+dopisywane do roboczego pliku partii w `local_dir/batch/`. Partia jest
+zamykana na końcu zmiany (06–18 / 18–06) lub po N sztukach i publikowana
+atomowo (`durable_io`): kopia do `sync_dir` pod nazwą tymczasową `.*.tmp`,
+a następnie `os.replace` na nazwę docelową `QW2_<HOST>_<RRRR-MM-DD>_<D|N>_<NNN>.csv`.
+Zamknięta partia zostaje też lokalnie w drzewie `local_dir/RRRR/MM/RRRR-MM-DD/`.
+
+Dopisanie sztuki (`append`) tylko zamyka partię – nigdy nie kopiuje na
+udział. Publikację wykonuje `publish_if_due` (timer GUI); po nieudanej
+próbie kolejna następuje po `RETRY_MIN_S`, z odstępem podwajanym do
+`RETRY_MAX_S`.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from durable_io import append_durable, copy_atomic, csv_bytes, write_atomic
+from logger import host_tag, log_event
+
+# odstęp ponowienia publikacji po błędzie (udział niedostępny), podwajany do maksimum
+RETRY_MIN_S = 60.0
+RETRY_MAX_S = 900.0
+
+def shift_key(ts: datetime) -> str:
+    """Return ``YYYY-MM-DD_D`` for the day shift or ``YYYY-MM-DD_N`` for the night shift.
+
+    The night shift (18:00–06:00) is dated by the day it starts.
+    """
+    if 6 <= ts.hour < 18:
+        return ts.strftime("%Y-%m-%d") + "_D"
+    start = ts if ts.hour >= 18 else ts - timedelta(days=1)
+    return start.strftime("%Y-%m-%d") + "_N"
+
+
+class ShiftBatchWriter:
+    """Rolling per-shift (or per-N-pieces) batch file with atomic publish."""
+
+    def __init__(self, local_dir: str, sync_dir: str, batch_size: int = 0, host: Optional[str] = None):
+        self.local_dir = local_dir
+        self.sync_dir = sync_dir
+        # 0 = jedna partia na zmianę; N > 0 = nowa partia co N sztuk
+        self.batch_size = batch_size
+        self.host = host_tag(host)
+        self.work_dir = os.path.join(local_dir, "batch")
+        self.state_path = os.path.join(self.work_dir, "batch_state.json")
+        self.state = self._load_state()
+        # append() może być wołane z wątku zapisu (tryb potokowy), publish_if_due() z timera GUI
+        self._lock = threading.RLock()
+        self._retry_at = 0.0
+        self._retry_delay = RETRY_MIN_S
+
+    # --- stan partii -------------------------------------------------------
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                data.setdefault("unpublished", [])
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"shift": None, "seq": 0, "pieces": 0, "file": None, "unpublished": []}
+
+    def _save_state(self) -> None:
+        write_atomic(self.state_path, json.dumps(self.state, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def _batch_name(self, shift: str, seq: int) -> str:
+        return f"QW2_{self.host}_{shift}_{seq:03d}.csv"
+
+    def _open_batch(self, shift: str) -> None:
+        seq = self.state["seq"] + 1 if self.state.get("shift") == shift else 1
+        self.state.update({
+            "shift": shift,
+            "seq": seq,
+            "pieces": 0,
+            "file": self._batch_name(shift, seq) + ".part",
+        })
+
+    # --- API ---------------------------------------------------------------
+
+    @property
+    def pending_pieces(self) -> int:
+        return int(self.state.get("pieces") or 0)
+
+    def append(self, rows: List[List[str]], ts: datetime) -> List[str]:
+        """Append one piece's rows; returns the local paths of batches closed by this call.
+
+        Closed batches are published later by `publish_if_due`, so a scan never
+        waits for the network share.
+        """
+        with self._lock:
+            return self._append(rows, ts)
+
+    def _append(self, rows: List[List[str]], ts: datetime) -> List[str]:
+        closed = self._close_if_shift_over(ts)
+        if not self.state.get("file"):
+            self._open_batch(shift_key(ts))
+        path = os.path.join(self.work_dir, self.state["file"])
+        append_durable(path, csv_bytes(rows, delimiter=";"))
+        self.state["pieces"] += 1
+        self._save_state()
+        if self.batch_size and self.state["pieces"] >= self.batch_size:
+            closed += self._close()
+        return closed
+
+    def publish_if_due(self, now: Optional[datetime] = None) -> List[str]:
+        """Close the batch if its shift is over and publish closed batches (backing off after failures)."""
+        with self._lock:
+            self._close_if_shift_over(now or datetime.now())
+            return self._retry_unpublished(force=False)
+
+    def publish(self) -> List[str]:
+        """Close the current batch, keep it in the local day tree and publish it."""
+        with self._lock:
+            self._close()
+            return self._retry_unpublished()
+
+    def _close_if_shift_over(self, now: datetime) -> List[str]:
+        shift = self.state.get("shift")
+        if self.state.get("file") and shift and shift != shift_key(now):
+            return self._close()
+        return []
+
+    def _close(self) -> List[str]:
+        name = self.state.get("file")
+        if not name:
+            return []
+        part_path = os.path.join(self.work_dir, name)
+        final_name = name[: -len(".part")]
+        shift_day = self.state["shift"][:10]
+        day_dir = os.path.join(self.local_dir, shift_day[:4], shift_day[5:7], shift_day)
+        local_path = os.path.join(day_dir, final_name)
+        if os.path.exists(part_path):
+            os.makedirs(day_dir, exist_ok=True)
+            os.replace(part_path, local_path)
+            self.state["unpublished"].append(local_path)
+        log_event("batch_closed", path=local_path, shift=self.state["shift"], pieces=self.state["pieces"])
+        self.state["file"] = None
+        self.state["pieces"] = 0
+        self._save_state()
+        # świeżo zamknięta partia – próba przy najbliższym publish_if_due, bez czekania na odstęp
+        self._retry_at = 0.0
+        return [local_path]
+
+    def retry_unpublished(self) -> List[str]:
+        with self._lock:
+            return self._retry_unpublished()
+
+    def _retry_unpublished(self, force: bool = True) -> List[str]:
+        if not self.state.get("unpublished"):
+            return []
+        if not force and time.monotonic() < self._retry_at:
+            return []
+        done = []
+        for local_path in list(self.state.get("unpublished", [])):
+            try:
+                dest = self._publish_file(local_path)
+            except Exception as exc:  # udział niedostępny – następna próba po odstępie
+                log_event("batch_publish_failed", level="warning", path=local_path, error=str(exc),
+                          retry_in_s=self._retry_delay)
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, RETRY_MAX_S)
+                break
+            self.state["unpublished"].remove(local_path)
+            done.append(dest)
+            log_event("batch_published", path=dest)
+        else:
+            self._retry_at = 0.0
+            self._retry_delay = RETRY_MIN_S
+        if done:
+            self._save_state()
+        return done
+
+    def _publish_file(self, local_path: str) -> str:
+        if not os.path.exists(local_path):
+            return local_path
+        dest = os.path.join(self.sync_dir, os.path.basename(local_path))
+        # importer widzi plik dopiero w całości – zmiana nazwy jest atomowa
+        return copy_atomic(local_path, dest)
@@ -0,0 +1,325 @@
+"""
+Archiwizacja zamkniętych dni plików CSV sztuk.
+
+Drzewo `local_dir/RRRR/MM/RRRR-MM-DD/` ma jeden mały plik na sztukę.
+`archive_day` pakuje katalog dnia do jednego archiwum
+`local_dir/RRRR/MM/RRRR-MM-DD.zip` (deflate) z indeksem `_index.json`
+(nazwa, rozmiar, mtime, SHA-1 każdego pliku), sprawdza archiwum (odczyt
+każdego pliku i porównanie SHA-1 z indeksem) i dopiero wtedy usuwa luźne
+pliki. Zapis idzie do pliku tymczasowego zamienianego `os.replace`, więc
+przerwana archiwizacja nie zostawia uszkodzonego archiwum.
+
+Archiwizowane są dni starsze niż `keep_days` i tylko wtedy, gdy manifest
+uzgadniania (`sync_reconcile`) nie ma dla nich niewysłanych plików.
+
+Odczyt (dni luźne i zarchiwizowane tak samo): `day_files`,
+`read_day_file`, `find_files` – wyszukiwanie po fragmencie nazwy (np. DMC)
+korzysta tylko z indeksów, bez rozpakowywania.
+
+    python day_archive.py archive --local C:\\QW2 --keep-days 30 [--dry-run]
+    python day_archive.py list --local C:\\QW2 2025-06-26
+    python day_archive.py cat --local C:\\QW2 2025-06-26 202506261012_<DMC>.csv
+    python day_archive.py find --local C:\\QW2 <DMC> [--since 2025-06-01] [--until 2025-06-30]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import zipfile
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from logger import log_event
+
+INDEX_NAME = "_index.json"
+_DAY = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+_BUNDLE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.zip$")
+
+
+class ArchiveError(Exception):
+    """The bundle could not be written or did not verify; loose files are kept."""
+
+
+def day_dir(local_dir: str, day: str) -> str:
+    return os.path.join(local_dir, day[:4], day[5:7], day)
+
+
+def bundle_path(local_dir: str, day: str) -> str:
+    return os.path.join(local_dir, day[:4], day[5:7], f"{day}.zip")
+
+
+def _disk_size(st: os.stat_result) -> int:
+    """Space taken on disk (small files occupy a whole cluster)."""
+    blocks = getattr(st, "st_blocks", None)
+    if blocks is not None:
+        return blocks * 512
+    return -(-st.st_size // 4096) * 4096
+
+
+def _read_index(zf: zipfile.ZipFile) -> Dict[str, Dict[str, Any]]:
+    try:
+        return {e["name"]: e for e in json.loads(zf.read(INDEX_NAME).decode("utf-8"))["files"]}
+    except (KeyError, ValueError):
+        return {}
+
+
+def archive_day(local_dir: str, day: str, dry_run: bool = False) -> Dict[str, Any]:
+    """Pack one day directory into its bundle, verify it and remove the loose files."""
+    src_dir = day_dir(local_dir, day)
+    target = bundle_path(local_dir, day)
+    loose = sorted(e.name for e in os.scandir(src_dir) if e.is_file() and not e.name.endswith(".tmp"))
+    result = {"day": day, "files": len(loose), "disk_before": 0, "disk_after": 0, "removed": 0}
+    if not loose or dry_run:
+        result["disk_before"] = sum(_disk_size(os.stat(os.path.join(src_dir, n))) for n in loose)
+        return result
+
+    tmp = target + ".tmp"
+    index: List[Dict[str, Any]] = []
+    try:
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as out:
+            # dzień zarchiwizowany wcześniej, a potem uzupełniony – dołączamy stare archiwum
+            if os.path.exists(target):
+                with zipfile.ZipFile(target) as old:
+                    for name, entry in _read_index(old).items():
+                        if name not in loose:
+                            out.writestr(old.getinfo(name), old.read(name))
+                            index.append(entry)
+            for name in loose:
+                path = os.path.join(src_dir, name)
+                with open(path, "rb") as f:
+                    data = f.read()
+                st = os.stat(path)
+                result["disk_before"] += _disk_size(st)
+                info = zipfile.ZipInfo.from_file(path, arcname=name)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                out.writestr(info, data)
+                index.append({"name": name, "size": len(data), "mtime": int(st.st_mtime),
+                              "sha1": hashlib.sha1(data).hexdigest()})
+            out.writestr(INDEX_NAME, json.dumps({"day": day, "files": index}, ensure_ascii=False))
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+
+        # weryfikacja przed usunięciem czegokolwiek: każdy plik musi się rozpakować z tym samym SHA-1
+        with zipfile.ZipFile(tmp) as check:
+            stored = _read_index(check)
+            for entry in index:
+                if hashlib.sha1(check.read(entry["name"])).hexdigest() != entry["sha1"]:
+                    raise ArchiveError(f"{day}: niezgodna suma kontrolna {entry['name']}")
+            if set(stored) != {e["name"] for e in index}:
+                raise ArchiveError(f"{day}: niekompletny indeks archiwum")
+        os.replace(tmp, target)
+    except (OSError, zipfile.BadZipFile, ArchiveError) as exc:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        if isinstance(exc, ArchiveError):
+            raise
+        raise ArchiveError(f"{day}: {exc}") from exc
+
+    for name in loose:
+        try:
+            os.remove(os.path.join(src_dir, name))
+            result["removed"] += 1
+        except OSError:
+            pass
+    try:
+        os.rmdir(src_dir)
+    except OSError:
+        pass  # katalog niepusty (np. plik dopisany w trakcie) – zostanie w następnym przebiegu
+    result["disk_after"] = _disk_size(os.stat(target))
+    return result
+
+
+def _sync_pending(local_dir: str, day: str) -> bool:
+    """True when a loose file of ``day`` is not confirmed on the share by the sync manifest.
+
+    Days without a manifest (older than the reconciler) are not blocked.
+    """
+    from sync_reconcile import MANIFEST_DIR
+
+    try:
+        with open(os.path.join(local_dir, MANIFEST_DIR, f"{day}.json"), "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return False
+    loose = [e.name for e in os.scandir(day_dir(local_dir, day)) if e.is_file() and e.name.lower().endswith(".csv")]
+    return any(not files.get(name, {}).get("synced") for name in loose)
+
+
+def closed_days(local_dir: str, keep_days: int, today: Optional[date] = None) -> List[str]:
+    """Loose day directories older than ``keep_days``."""
+    limit = ((today or date.today()) - timedelta(days=keep_days)).isoformat()
+    days = []
+    for year in _listdir(local_dir):
+        if not (len(year) == 4 and year.isdigit()):
+            continue
+        for month in _listdir(os.path.join(local_dir, year)):
+            for name in _listdir(os.path.join(local_dir, year, month)):
+                if _DAY.match(name) and name < limit and os.path.isdir(os.path.join(local_dir, year, month, name)):
+                    days.append(name)
+    return sorted(days)
+
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def archive_closed_days(local_dir: str, keep_days: int = 30, dry_run: bool = False,
+                        cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+    summary = {"days": 0, "files": 0, "disk_before": 0, "disk_after": 0, "skipped_unsynced": 0, "errors": []}
+    for day in closed_days(local_dir, keep_days):
+        if cancel is not None and cancel.is_set():
+            break
+        if _sync_pending(local_dir, day):
+            # pliki niewysłane do sync_dir zostają luźne – uzgadnianie musi mieć źródło
+            summary["skipped_unsynced"] += 1
+            continue
+        try:
+            res = archive_day(local_dir, day, dry_run)
+        except ArchiveError as exc:
+            summary["errors"].append(str(exc))
+            log_event("day_archive_failed", level="error", day=day, error=str(exc))
+            continue
+        summary["days"] += 1
+        for key in ("files", "disk_before", "disk_after"):
+            summary[key] += res[key]
+        if not dry_run:
+            log_event("day_archived", **res)
+    return summary
+
+
+class DayArchiver:
+    """Background thread archiving closed days every ``interval_s`` (first run after ``delay_s``)."""
+
+    def __init__(self, local_dir: str, keep_days: int = 30, interval_s: float = 6 * 3600, delay_s: float = 120.0,
+                 on_done: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.local_dir = local_dir
+        self.keep_days = keep_days
+        self.interval_s = interval_s
+        self.delay_s = delay_s
+        self.on_done = on_done
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="qw2-day-archive", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        # pierwszy przebieg z opóźnieniem – nie konkuruje z uruchomieniem aplikacji
+        wait = self.delay_s
+        while not self._stop.wait(wait):
+            wait = self.interval_s
+            try:
+                summary = archive_closed_days(self.local_dir, self.keep_days, cancel=self._stop)
+            except Exception as exc:
+                log_event("day_archive_failed", level="error", error=str(exc))
+                continue
+            if self.on_done is not None and summary["days"]:
+                self.on_done(summary)
+
+
+# --- odczyt -----------------------------------------------------------------
+
+def day_files(local_dir: str, day: str) -> List[str]:
+    """Names of the day's files, loose or archived."""
+    names = set()
+    bundle = bundle_path(local_dir, day)
+    if os.path.exists(bundle):
+        with zipfile.ZipFile(bundle) as zf:
+            names.update(_read_index(zf))
+    src_dir = day_dir(local_dir, day)
+    if os.path.isdir(src_dir):
+        names.update(e.name for e in os.scandir(src_dir) if e.is_file())
+    return sorted(names)
+
+
+def read_day_file(local_dir: str, day: str, name: str) -> bytes:
+    """Content of one file of ``day``; a loose file wins over the archived copy."""
+    path = os.path.join(day_dir(local_dir, day), name)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    bundle = bundle_path(local_dir, day)
+    if os.path.exists(bundle):
+        with zipfile.ZipFile(bundle) as zf:
+            try:
+                return zf.read(name)
+            except KeyError:
+                pass
+    raise FileNotFoundError(f"{day}/{name}")
+
+
+def _known_days(local_dir: str) -> List[str]:
+    days = set()
+    for year in _listdir(local_dir):
+        if not (len(year) == 4 and year.isdigit()):
+            continue
+        for month in _listdir(os.path.join(local_dir, year)):
+            for name in _listdir(os.path.join(local_dir, year, month)):
+                m = _BUNDLE.match(name)
+                if m:
+                    days.add(m.group(1))
+                elif _DAY.match(name):
+                    days.add(name)
+    return sorted(days)
+
+
+def find_files(local_dir: str, text: str, since: Optional[str] = None,
+               until: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Yield ``(day, name)`` of files whose name contains ``text`` (e.g. a DMC), using only the indexes."""
+    for day in _known_days(local_dir):
+        if (since and day < since) or (until and day > until):
+            continue
+        for name in day_files(local_dir, day):
+            if text in name:
+                yield day, name
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Archiwa dni plików CSV sztuk")
+    parser.add_argument("--local", required=True, help="folder lokalny (local_dir)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_arch = sub.add_parser("archive", help="spakuj zamknięte dni")
+    p_arch.add_argument("--keep-days", type=int, default=30, help="ile ostatnich dni zostawić luzem")
+    p_arch.add_argument("--dry-run", action="store_true")
+    p_list = sub.add_parser("list", help="pliki dnia")
+    p_list.add_argument("day")
+    p_cat = sub.add_parser("cat", help="wypisz plik dnia")
+    p_cat.add_argument("day")
+    p_cat.add_argument("name")
+    p_find = sub.add_parser("find", help="szukaj plików po fragmencie nazwy (np. DMC)")
+    p_find.add_argument("text")
+    p_find.add_argument("--since")
+    p_find.add_argument("--until")
+    args = parser.parse_args(argv)
+
+    if args.command == "archive":
+        print(json.dumps(archive_closed_days(args.local, args.keep_days, args.dry_run), ensure_ascii=False, indent=2))
+    elif args.command == "list":
+        for name in day_files(args.local, args.day):
+            print(name)
+    elif args.command == "cat":
+        sys.stdout.write(read_day_file(args.local, args.day, args.name).decode("utf-8", errors="replace"))
+    else:
+        for day, name in find_files(args.local, args.text, args.since, args.until):
+            print(f"{day}\t{name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
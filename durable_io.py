@@ -0,0 +1,361 @@
+"""
+Trwały zapis plików wyjściowych z grupowym zatwierdzaniem (group commit).
+
+Każdy plik jest zapisywany do pliku tymczasowego w tym samym katalogu,
+utrwalany `fsync` i podmieniany atomowo (`os.replace`), więc po zaniku
+zasilania na dysku jest albo stara, albo nowa, kompletna wersja pliku.
+
+Aby `fsync` nie spowalniał każdego skanu, zapisy trafiają do kolejki
+obsługiwanej przez jeden wątek. Żądania, które napłyną w trakcie
+zatwierdzania poprzedniej grupy (opcjonalnie także w ciągu `max_delay`
+sekund), są zatwierdzane razem, maksymalnie `max_batch` naraz:
+- wielokrotne nadpisania tego samego pliku w partii są łączone w jeden zapis,
+- dopisy do tego samego pliku są łączone w jeden `write` + `fsync`,
+- katalogi docelowe są synchronizowane raz na partię,
+- zastąpienie i dopis tej samej ścieżki w jednej partii są zatwierdzane
+  osobno, w kolejności zgłoszenia.
+
+Kopie na udział sieciowy (`copy_atomic`) wykonuje wątek wywołujący, poza
+kolejką – wolny lub zawieszony udział nie wstrzymuje zapisów lokalnych.
+
+Benchmark (porównanie z zapisem bez `fsync` i z naiwnym `fsync` na każdy plik):
+    python durable_io.py --bench 200 --dir C:\\temp\\qw2_bench
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class _Op:
+    __slots__ = ("kind", "path", "data", "future", "queued_at")
+
+    def __init__(self, kind: str, path: str, data: bytes):
+        self.kind = kind  # "replace" albo "append"
+        self.path = path
+        self.data = data
+        self.future: Future = Future()
+        self.queued_at = time.perf_counter()
+
+
+def _fsync_dir(path: str) -> None:
+    # Windows nie pozwala otworzyć katalogu do fsync – tam rename jest utrwalany przez NTFS
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _split_mixed(batch: List[_Op]) -> List[List[_Op]]:
+    """Split a batch where one path switches between replace and append.
+
+    `_commit` appends before renaming staged replaces, so within one group a
+    path must see only one kind of operation; splitting keeps submit order.
+    """
+    groups: List[List[_Op]] = [[]]
+    kinds: Dict[str, str] = {}
+    for op in batch:
+        if kinds.setdefault(op.path, op.kind) != op.kind:
+            groups.append([])
+            kinds = {op.path: op.kind}
+        groups[-1].append(op)
+    return groups
+
+
+class GroupCommitWriter:
+    """Crash-safe writes (temp file + fsync + rename) committed in groups by a worker thread."""
+
+    def __init__(self, max_delay: float = 0.0, max_batch: int = 64, fsync: bool = True):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._queue: List[_Op] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="qw2-group-commit", daemon=True)
+        self._thread.start()
+        # statystyki dla benchmarku / metryk
+        self.commits = 0
+        self.ops = 0
+        self.fsyncs = 0
+        self.max_latency = 0.0
+
+    # --- API ---------------------------------------------------------------
+
+    def write_bytes(self, path: str, data: bytes) -> Future:
+        """Atomically replace ``path`` with ``data``; the future resolves when durable."""
+        return self._submit(_Op("replace", os.path.abspath(path), data))
+
+    def write_text(self, path: str, text: str, encoding: str = "utf-8") -> Future:
+        return self.write_bytes(path, text.encode(encoding))
+
+    def append_bytes(self, path: str, data: bytes) -> Future:
+        """Append ``data`` to ``path`` and fsync it."""
+        return self._submit(_Op("append", os.path.abspath(path), data))
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # --- wątek zatwierdzający ----------------------------------------------
+
+    def _submit(self, op: _Op) -> Future:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("GroupCommitWriter is closed")
+            self._queue.append(op)
+            self._cond.notify_all()
+        return op.future
+
+    def _take_batch(self) -> List[_Op]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            # opcjonalnie czekamy chwilę na kolejne żądania, aby zatwierdzić je razem
+            deadline = self._queue[0].queued_at + self.max_delay
+            while self.max_delay > 0 and len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[: self.max_batch]
+            del self._queue[: self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            for group in _split_mixed(batch):
+                self._commit(group)
+
+    def _commit(self, batch: List[_Op]) -> None:
+        # nadpisania: wygrywa ostatnie żądanie dla danej ścieżki
+        replaces: Dict[str, List[_Op]] = {}
+        appends: Dict[str, List[_Op]] = {}
+        order: List[Tuple[str, str]] = []
+        for op in batch:
+            target = replaces if op.kind == "replace" else appends
+            if op.path not in target:
+                order.append((op.kind, op.path))
+            target.setdefault(op.path, []).append(op)
+
+        dirs = set()
+        results: Dict[Tuple[str, str], Optional[Exception]] = {}
+        staged: List[Tuple[str, str]] = []
+        for kind, path in order:
+            ops = replaces[path] if kind == "replace" else appends[path]
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if kind == "replace":
+                    staged.append((self._write_temp(path, ops[-1].data), path))
+                else:
+                    self._append(path, b"".join(op.data for op in ops))
+                    dirs.add(os.path.dirname(path))
+                results[(kind, path)] = None
+            except Exception as exc:  # błąd jednego pliku nie blokuje pozostałych
+                results[(kind, path)] = exc
+
+        for tmp, path in staged:
+            try:
+                os.replace(tmp, path)
+                dirs.add(os.path.dirname(path))
+            except Exception as exc:
+                results[("replace", path)] = exc
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+        if self.fsync:
+            for d in dirs:
+                try:
+                    _fsync_dir(d)
+                    self.fsyncs += 1
+                except OSError:
+                    pass
+
+        now = time.perf_counter()
+        self.commits += 1
+        self.ops += len(batch)
+        for kind, path in order:
+            error = results.get((kind, path))
+            ops = replaces[path] if kind == "replace" else appends[path]
+            for op in ops:
+                self.max_latency = max(self.max_latency, now - op.queued_at)
+                if error is None:
+                    op.future.set_result(path)
+                else:
+                    op.future.set_exception(error)
+
+    def _write_temp(self, path: str, data: bytes) -> str:
+        fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                    self.fsyncs += 1
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return tmp
+
+    def _append(self, path: str, data: bytes) -> None:
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+                self.fsyncs += 1
+
+
+_writer: Optional[GroupCommitWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> GroupCommitWriter:
+    """Shared writer used by the application (created on first use)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = GroupCommitWriter()
+        return _writer
+
+
+def csv_bytes(rows: Iterable[Sequence[str]], delimiter: str = ";") -> bytes:
+    import csv  # import leniwy – poza ścieżką startu aplikacji
+
+    buf = io.StringIO(newline="")
+    csv.writer(buf, delimiter=delimiter).writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+def write_atomic(path: str, data: bytes, timeout: Optional[float] = 10.0) -> str:
+    """Durably replace ``path`` and wait for the commit."""
+    return get_writer().write_bytes(path, data).result(timeout)
+
+
+def write_csv_atomic(path: str, rows: Iterable[Sequence[str]], delimiter: str = ";",
+                     timeout: Optional[float] = 10.0) -> str:
+    return write_atomic(path, csv_bytes(rows, delimiter), timeout)
+
+
+def append_durable(path: str, data: bytes, timeout: Optional[float] = 10.0) -> str:
+    return get_writer().append_bytes(path, data).result(timeout)
+
+
+def copy_atomic(src: str, dest: str) -> str:
+    """Publish a copy of ``src`` at ``dest`` atomically (readers never see a partial file).
+
+    Runs in the calling thread, not on the group-commit writer: a slow or hung
+    network share must not hold up local writes queued behind it.
+    """
+    dest = os.path.abspath(dest)
+    directory = os.path.dirname(dest)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(dest) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f, open(src, "rb") as source:
+            shutil.copyfileobj(source, f, 1024 * 1024)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, dest)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return dest
+
+
+# --- benchmark -------------------------------------------------------------
+
+def _bench(count: int, directory: str, threads: int) -> None:
+    payload = csv_bytes([["INSPECT", "", "2025-06-26 12:00:00", "436", "X" * 40]] * 4)
+
+    def plain(i: int) -> None:
+        with open(os.path.join(directory, f"plain_{i}.csv"), "wb") as f:
+            f.write(payload)
+
+    def naive(i: int) -> None:
+        path = os.path.join(directory, f"naive_{i}.csv")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(directory)
+
+    writer = GroupCommitWriter()
+
+    def grouped(i: int) -> None:
+        writer.write_bytes(os.path.join(directory, f"group_{i}.csv"), payload).result()
+
+    for name, fn in (("bez fsync", plain), ("naiwny fsync", naive), ("group commit", grouped)):
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def worker(start: int) -> None:
+            for i in range(start, count, threads):
+                t0 = time.perf_counter()
+                fn(i)
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        total = time.perf_counter() - t0
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(f"{name:14s} {count / total:8.0f} plików/s  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+    print(f"group commit: {writer.commits} zatwierdzeń dla {writer.ops} zapisów, {writer.fsyncs} fsync")
+    writer.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark trwałego zapisu plików QW2")
+    parser.add_argument("--bench", type=int, default=200, help="liczba plików na wariant")
+    parser.add_argument("--threads", type=int, default=4, help="liczba równoległych zapisujących")
+    parser.add_argument("--dir", help="katalog testowy (domyślnie tymczasowy)")
+    args = parser.parse_args(argv)
+    directory = args.dir or tempfile.mkdtemp(prefix="qw2_bench_")
+    os.makedirs(directory, exist_ok=True)
+    try:
+        _bench(args.bench, directory, args.threads)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Klient usług intranetu Traceability2 (`getMaching`, `getInspect`).
+
+`IntranetClient` wykonuje zapytania HTTP i zgłasza `IntranetError` przy
+błędzie sieci, statusu HTTP lub nieprawidłowej odpowiedzi – bez okienek,
+dzięki czemu może być używany także z wątków roboczych. Każdy wątek ma
+własną sesję `requests` (połączenia keep-alive bez współdzielenia sesji
+między wątkami).
+
+Identyczne zapytania wykonywane w tym samym czasie (np. ponowny skan,
+wątki trybu potokowego i weryfikacji zbiorczej) są łączone (single-flight):
+do sieci idzie jedno zapytanie, a jego wynik lub błąd dostają wszystkie
+oczekujące wątki. Liczniki oszczędzonych zapytań zwraca `stats()`.
+
+`CircuitBreaker` chroni stanowisko przy awarii intranetu: po kilku
+kolejnych błędach sieci (lub HTTP 5xx) obwód się otwiera i zapytania od
+razu kończą się `IntranetOffline`, bez czekania na timeout. W tle wątek
+co `probe_interval` sekund sprawdza dostępność usługi i po udanej próbie
+zamyka obwód. Zmiany stanu zgłasza `on_state_change(online, message)`
+(wywoływane z wątku roboczego lub wątku próby).
+
+Ustawienie `recorder` (np. `intranet_replay.TrafficRecorder`) zapisuje
+każde zapytanie sieciowe z odpowiedzią i czasem trwania; nagranie można
+odtworzyć klientem `intranet_replay.ReplayClient`. `observer(endpoint, ms,
+ok)` dostaje czas każdego zapytania sieciowego (np. do metryk).
+
+`FakeIntranetClient` zwraca stałe odpowiedzi do pracy w `TEST_MODE`.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BASE_URL = "http://intranet/Traceability2"
+DEFAULT_TIMEOUT = 10.0
+# liczba kolejnych błędów otwierająca obwód i odstęp prób dostępności [s]
+FAILURE_THRESHOLD = 3
+PROBE_INTERVAL = 5.0
+
+
+class IntranetError(Exception):
+    """Lookup failed (network error, HTTP status or malformed response)."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def request_key(endpoint: str, params: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Identity of a lookup (endpoint + parameters as sent), used for coalescing and replay."""
+    return endpoint, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class IntranetOffline(IntranetError):
+    """Raised without a network call while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Open after ``threshold`` consecutive failures; a background ``probe`` closes it again."""
+
+    def __init__(self, probe: Callable[[], bool], threshold: int = FAILURE_THRESHOLD,
+                 probe_interval: float = PROBE_INTERVAL,
+                 on_change: Optional[Callable[[bool, str], None]] = None):
+        self.probe = probe
+        self.threshold = max(1, threshold)
+        self.probe_interval = probe_interval
+        self.on_change = on_change
+        self.is_open = False
+        self.opened_at: Optional[float] = None
+        self.last_error = ""
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record_success(self) -> None:
+        if not self._failures and not self.is_open:
+            return  # ścieżka szybka – brak zmian stanu
+        with self._lock:
+            self._failures = 0
+            changed = self.is_open
+            self.is_open = False
+            self.opened_at = None
+        if changed:
+            self._notify(True, "")
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self._failures += 1
+            self.last_error = error
+            changed = not self.is_open and self._failures >= self.threshold
+            if changed:
+                self.is_open = True
+                self.opened_at = time.monotonic()
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._probe_loop, name="qw2-intranet-probe", daemon=True)
+                    self._thread.start()
+        if changed:
+            self._notify(False, error)
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            with self._lock:
+                if not self.is_open:
+                    self._thread = None
+                    return
+            try:
+                ok = self.probe()
+            except Exception as exc:
+                ok = False
+                self.last_error = str(exc)
+            if ok:
+                self.record_success()
+
+    def _notify(self, online: bool, message: str) -> None:
+        if self.on_change is not None:
+            try:
+                self.on_change(online, message)
+            except Exception:
+                pass
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error", "status", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[IntranetError] = None
+        self.status: Optional[int] = None
+        self.waiters = 0
+
+
+class IntranetClient:
+    """HTTP client for the Traceability2 lookups."""
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 on_state_change: Optional[Callable[[bool, str], None]] = None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(self._probe, on_change=on_state_change)
+        # opcjonalny zapis ruchu: obiekt z metodą record(endpoint, params, status, ms, body=..., error=...)
+        self.recorder = None
+        # opcjonalny odbiorca czasów zapytań: observer(endpoint, ms, ok)
+        self.observer: Optional[Callable[[str, float, bool], None]] = None
+        self._local = threading.local()
+        self._flights: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Flight] = {}
+        self._flights_lock = threading.Lock()
+        self._stats = {"requests": 0, "network_calls": 0, "coalesced": 0, "rejected": 0}
+
+    @property
+    def online(self) -> bool:
+        return not self.breaker.is_open
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: all lookups, network calls, lookups served by a shared call and fast-failed lookups."""
+        with self._flights_lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        self.breaker.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests  # import leniwy – skraca start aplikacji
+
+            session = self._local.session = requests.Session()
+        return session
+
+    def _get(self, endpoint: str, params: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> Any:
+        if self.breaker.is_open:
+            # intranet niedostępny – natychmiastowy błąd zamiast czekania na timeout
+            with self._flights_lock:
+                self._stats["requests"] += 1
+                self._stats["rejected"] += 1
+            if result is not None:
+                result["offline"] = True
+            raise IntranetOffline(f"{endpoint}: intranet niedostępny ({self.breaker.last_error})")
+        key = request_key(endpoint, params)
+        with self._flights_lock:
+            self._stats["requests"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["network_calls"] += 1
+            else:
+                flight.waiters += 1
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            # to samo zapytanie jest już w drodze – czekamy na jego wynik (ograniczony timeoutem lidera)
+            flight.done.wait()
+            if result is not None:
+                result["status"] = flight.status
+                result["coalesced"] = True
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._fetch(endpoint, params, flight)
+            return flight.value
+        except IntranetError as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+            if result is not None:
+                result["status"] = flight.status
+                if flight.waiters:
+                    result["shared_with"] = flight.waiters
+
+    def _fetch(self, endpoint: str, params: Dict[str, Any], flight: _Flight) -> Any:
+        recorder, observer = self.recorder, self.observer
+        if recorder is None and observer is None:
+            return self._request(endpoint, params, flight)
+        t0 = time.perf_counter()
+        data, error = None, None
+        try:
+            data = self._request(endpoint, params, flight)
+            return data
+        except IntranetError as exc:
+            error = str(exc)
+            raise
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            if observer is not None:
+                observer(endpoint, ms, error is None)
+            if recorder is not None:
+                if error is None:
+                    recorder.record(endpoint, params, flight.status, ms, body=data)
+                else:
+                    recorder.record(endpoint, params, flight.status, ms, error=error)
+
+    def _request(self, endpoint: str, params: Dict[str, Any], flight: _Flight) -> Any:
+        url = f"{self.base_url}/{endpoint}/"
+        try:
+            resp = self._session().get(url, params=params, timeout=self.timeout)
+        except Exception as exc:
+            self.breaker.record_failure(str(exc))
+            raise IntranetError(f"{endpoint}: {exc}") from exc
+        flight.status = resp.status_code
+        if resp.status_code >= 500:
+            self.breaker.record_failure(f"HTTP {resp.status_code}")
+        else:
+            # usługa odpowiada (także 4xx / zły JSON) – obwód pozostaje zamknięty
+            self.breaker.record_success()
+        if resp.status_code >= 400:
+            raise IntranetError(f"{endpoint}: HTTP {resp.status_code}", resp.status_code)
+        try:
+            return resp.json()
+        except ValueError as exc:
+            raise IntranetError(f"{endpoint}: nieprawidłowa odpowiedź JSON", resp.status_code) from exc
+
+    def _probe(self) -> bool:
+        """Health check used while the breaker is open: any non-5xx answer means the service is back."""
+        resp = self._session().get(
+            f"{self.base_url}/getMaching/", params={"line": 436, "machine": "", "serno_out": ""},
+            timeout=min(self.timeout, 3.0),
+        )
+        return resp.status_code < 500
+
+    def get_matching_info(self, serno: str, line: int = 436,
+                          result: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return the getMaching record (``child_serno`` etc.) or None when there is no data."""
+        data = self._get("getMaching", {"line": line, "machine": "", "serno_out": serno}, result)
+        if result is not None:
+            result["found"] = isinstance(data, dict) and bool(data.get("child_serno"))
+        return data if isinstance(data, dict) else None
+
+    def check_inspect(self, serno: str, inspect: str, line: int, machine: Any,
+                      result: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Return the list of inspection records, or None when there are none."""
+        data = self._get(
+            "getInspect", {"line": line, "machine": machine, "inspect": inspect, "serno": serno}, result
+        )
+        if result is not None:
+            result["records"] = len(data) if isinstance(data, list) else 0
+        if isinstance(data, list) and data:
+            return data
+        return None
+
+
+class FakeIntranetClient(IntranetClient):
+    """Canned responses for TEST_MODE (no network)."""
+
+    def get_matching_info(self, serno, line=436, result=None):
+        # zawsze zwraca child_serno „1”
+        if result is not None:
+            result.update(status=200, found=True)
+        return {"child_serno": "1"}
+
+    def check_inspect(self, serno, inspect, line, machine, result=None):
+        if result is not None:
+            result["status"] = 200
+        # ⋅QW2_child_serno→ pusty (nie było skanu)
+        if inspect == "QW2_child_serno":
+            return None
+        # ⋅Status EOL→ zawsze OK
+        return [{"inspectdate": "2025-06-26 12:00:00", "judge": "1"}]
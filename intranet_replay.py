@@ -0,0 +1,260 @@
+"""
+Nagrywanie i odtwarzanie ruchu do intranetu Traceability2.
+
+`TrafficRecorder` zapisuje każde zapytanie `IntranetClient` (endpoint,
+parametry, status HTTP, odpowiedź lub błąd, czas trwania i moment
+wysłania) do pliku JSON Lines kompresowanego gzip – jeden wiersz na
+zapytanie, pierwszy wiersz to nagłówek z adresem i czasem startu.
+
+`ReplayClient` to `IntranetClient`, który zamiast sieci odpowiada
+z nagrania: dla każdego zapytania (endpoint + parametry) zwraca kolejne
+nagrane odpowiedzi w tej samej kolejności, z nagranym opóźnieniem
+pomnożonym przez `time_scale` (0 = natychmiast, 1 = jak na stanowisku).
+Scalanie zapytań i obwód (`CircuitBreaker`) działają jak w prawdziwym
+kliencie, więc aplikacja zachowuje się tak, jak przy nagranym dniu.
+
+W aplikacji (`QSettings`): `intranet_record` = `true` zapisuje ruch do
+`<local_dir>/logs/intranet_<data>.jsonl.gz`; `intranet_replay` = ścieżka
+nagrania przełącza aplikację na odtwarzanie (`intranet_replay_scale`).
+
+Bez GUI:
+    python intranet_replay.py info nagranie.jsonl.gz
+    python intranet_replay.py run nagranie.jsonl.gz --speed 2 --scale 1
+    python intranet_replay.py run nagranie.jsonl.gz --url http://127.0.0.1:8080/Traceability2
+
+`run` wysyła nagrane zapytania w nagranej kolejności i odstępach
+(przyspieszonych `--speed`) do klienta odtwarzającego albo do prawdziwego
+serwera (`--url`) i raportuje czasy odpowiedzi oraz różnice względem
+nagrania – do porównywania wydajności na prawdziwym ruchu.
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from intranet import IntranetClient, IntranetError, request_key
+
+FORMAT_VERSION = 1
+# co tyle wpisów bufor gzip jest zrzucany na dysk (kompromis kompresja / utrata przy awarii)
+FLUSH_EVERY = 20
+
+
+class TrafficRecorder:
+    """Append intranet request/response pairs with timings to a gzip JSON Lines file."""
+
+    def __init__(self, path: str, base_url: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._pending = 0
+        self.count = 0
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._write({"v": FORMAT_VERSION, "started": datetime.now().isoformat(timespec="seconds"),
+                     "base_url": base_url})
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(self, endpoint: str, params: Dict[str, Any], status: Optional[int], ms: float,
+               body: Any = None, error: Optional[str] = None) -> None:
+        entry: Dict[str, Any] = {
+            "t": round(time.perf_counter() - self._start, 4),
+            "ep": endpoint,
+            "p": {k: str(v) for k, v in params.items()},
+            "st": status,
+            "ms": round(ms, 2),
+        }
+        if error is not None:
+            entry["err"] = error
+        else:
+            entry["body"] = body
+        with self._lock:
+            if self._file is None:
+                return
+            self._write(entry)
+            self.count += 1
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield recorded requests (header lines skipped; several sessions in one file are concatenated)."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # niedokończony ostatni wiersz po awarii
+            if "ep" in entry:
+                yield entry
+
+
+class ReplayClient(IntranetClient):
+    """`IntranetClient` answering from a recording instead of the network."""
+
+    def __init__(self, path: str, time_scale: float = 1.0, **kwargs):
+        super().__init__("replay://" + path, **kwargs)
+        self.time_scale = max(0.0, time_scale)
+        self.entries: List[Dict[str, Any]] = list(load_recording(path))
+        self._answers: Dict[Any, List[Dict[str, Any]]] = {}
+        for entry in self.entries:
+            self._answers.setdefault(request_key(entry["ep"], entry["p"]), []).append(entry)
+        self._positions: Dict[Any, int] = {}
+        self._replay_lock = threading.Lock()
+        self.misses = 0
+
+    def _next_answer(self, endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = request_key(endpoint, params)
+        answers = self._answers.get(key)
+        if not answers:
+            return None
+        with self._replay_lock:
+            pos = self._positions.get(key, 0)
+            # po wyczerpaniu nagranych odpowiedzi powtarzamy ostatnią
+            self._positions[key] = min(pos + 1, len(answers) - 1)
+        return answers[pos]
+
+    def _request(self, endpoint, params, flight):
+        entry = self._next_answer(endpoint, params)
+        if entry is None:
+            with self._replay_lock:
+                self.misses += 1
+            flight.status = 404
+            self.breaker.record_success()
+            raise IntranetError(f"{endpoint}: brak odpowiedzi w nagraniu", 404)
+        delay = entry.get("ms", 0.0) / 1000.0 * self.time_scale
+        if delay > 0:
+            time.sleep(delay)
+        status = entry.get("st")
+        flight.status = status
+        if "err" in entry:
+            if status is None or status >= 500:
+                self.breaker.record_failure(entry["err"])
+            else:
+                self.breaker.record_success()
+            raise IntranetError(entry["err"], status)
+        self.breaker.record_success()
+        return entry.get("body")
+
+    def _probe(self) -> bool:
+        return True
+
+
+# --- bez GUI ----------------------------------------------------------------
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    per_endpoint: Dict[str, List[float]] = {}
+    errors = 0
+    for e in entries:
+        per_endpoint.setdefault(e["ep"], []).append(e.get("ms", 0.0))
+        errors += "err" in e
+    return {
+        "requests": len(entries),
+        "errors": errors,
+        "duration_s": round(entries[-1]["t"] - entries[0]["t"], 1) if entries else 0.0,
+        "endpoints": {
+            ep: {"count": len(ms), "p50_ms": round(_percentile(ms, 0.5), 1),
+                 "p95_ms": round(_percentile(ms, 0.95), 1), "max_ms": round(max(ms), 1)}
+            for ep, ms in per_endpoint.items()
+        },
+    }
+
+
+def run_replay(path: str, speed: float = 1.0, scale: float = 1.0, url: Optional[str] = None,
+               workers: int = 16) -> Dict[str, Any]:
+    """Re-issue the recorded requests with the recorded pacing and compare the answers."""
+    entries = list(load_recording(path))
+    client = IntranetClient(url) if url else ReplayClient(path, time_scale=scale)
+    latencies: List[float] = []
+    differences = 0
+    failures = 0
+    lock = threading.Lock()
+
+    def issue(entry):
+        nonlocal differences, failures
+        t0 = time.perf_counter()
+        try:
+            body, error = client._get(entry["ep"], dict(entry["p"])), None
+        except IntranetError as exc:
+            body, error = None, str(exc)
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            latencies.append(elapsed)
+            failures += error is not None
+            if (error is not None) != ("err" in entry) or (error is None and body != entry.get("body")):
+                differences += 1
+
+    start = time.perf_counter()
+    first_t = entries[0]["t"] if entries else 0.0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="qw2-replay") as pool:
+        for entry in entries:
+            # zachowujemy nagrane odstępy między zapytaniami (przyspieszone przez speed)
+            due = (entry["t"] - first_t) / max(speed, 1e-6)
+            wait = due - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(issue, entry)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return {
+        "recorded": summarize(entries),
+        "replayed": {
+            "requests": len(latencies),
+            "elapsed_s": round(elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 0.5), 1),
+            "p95_ms": round(_percentile(latencies, 0.95), 1),
+            "max_ms": round(max(latencies), 1) if latencies else 0.0,
+            "failures": failures,
+            "differences": differences,
+            "client": client.stats(),
+        },
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Nagrania ruchu do intranetu Traceability2")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_info = sub.add_parser("info", help="podsumowanie nagrania")
+    p_info.add_argument("path")
+    p_run = sub.add_parser("run", help="odtworzenie nagrania z nagranymi odstępami")
+    p_run.add_argument("path")
+    p_run.add_argument("--speed", type=float, default=1.0, help="przyspieszenie odstępów między zapytaniami")
+    p_run.add_argument("--scale", type=float, default=1.0, help="mnożnik nagranych czasów odpowiedzi")
+    p_run.add_argument("--url", help="zamiast nagrania wysyłaj zapytania na ten adres (np. stub)")
+    p_run.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        report = summarize(list(load_recording(args.path)))
+    else:
+        report = run_replay(args.path, args.speed, args.scale, args.url, args.workers)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
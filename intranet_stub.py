@@ -0,0 +1,347 @@
+"""
+Lokalny zamiennik intranetu Traceability2 do testów bez sieci zakładowej.
+
+Serwer HTTP obsługuje te same ścieżki co intranet
+(`/Traceability2/getMaching/`, `/Traceability2/getInspect/`), więc
+aplikacja używa prawdziwego `IntranetClient` – wystarczy w ustawieniach
+podać adres `http://127.0.0.1:8080/Traceability2` (klucz `intranet_url`).
+
+Dane są generowane deterministycznie z ziarna (`--seed`) i numeru sztuki:
+ten sam DMC zawsze ma ten sam `child_serno` i ten sam wynik EOL. Odsetki
+sztuk NOK, bez danych EOL, bez `child_serno` i już sprawdzonych na QW2
+ustawia się parametrami; wybrane sztuki można nadpisać plikiem JSON
+(`--data`):
+
+    {"matching": {"DMC": {"child_serno": "..."} | null},
+     "inspect": {"SERNO|Status": [{"inspectdate": "...", "judge": "0"}]}}
+
+Awarie: opóźnienie odpowiedzi z rozkładu (`--latency`, np. `fixed:50`,
+`uniform:20,200`, `normal:80,20`, `lognormal:60,0.6`, `exp:50` – w ms),
+odsetek odpowiedzi HTTP 500 (`--error-rate`) i odpowiedzi wstrzymanych
+na `--hang-s` sekund, czyli dłużej niż timeout klienta (`--timeout-rate`).
+Parametry awarii można zmieniać w trakcie pracy:
+`GET /_stub/config?error_rate=1` (np. symulacja awarii dla obwodu
+klienta); `GET /_stub/stats` zwraca liczniki zapytań.
+
+Przykład:
+    python intranet_stub.py --port 8080 --seed 7 --latency lognormal:60,0.6 --error-rate 0.01
+    python intranet_stub.py --load 500 --workers 8   # test obciążeniowy klienta na stubie
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+BASE_PATH = "/Traceability2"
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Return a sampler of delays in ms for ``kind:params`` (fixed, uniform, normal, lognormal, exp)."""
+    kind, _, params = (spec or "fixed:0").partition(":")
+    try:
+        args = [float(p) for p in params.split(",") if p.strip()]
+    except ValueError:
+        raise ValueError(f"Nieprawidłowe parametry opóźnienia: {spec}")
+    kind = kind.strip().lower()
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal" and len(args) == 2:
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal" and len(args) == 2:
+        # mediana w ms i sigma logarytmu – długi ogon jak w prawdziwej sieci
+        return lambda rng: rng.lognormvariate(math.log(max(args[0], 0.001)), args[1])
+    if kind == "exp" and len(args) == 1:
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    raise ValueError(f"Nieznany rozkład opóźnienia: {spec}")
+
+
+class StubData:
+    """Deterministic getMaching / getInspect answers derived from ``seed`` and the serial number."""
+
+    def __init__(self, seed: int = 0, nok_rate: float = 0.02, missing_rate: float = 0.01,
+                 no_child_rate: float = 0.0, checked_rate: float = 0.0,
+                 overrides: Optional[Dict[str, Any]] = None):
+        self.seed = seed
+        self.nok_rate = nok_rate
+        self.missing_rate = missing_rate
+        self.no_child_rate = no_child_rate
+        self.checked_rate = checked_rate
+        self.overrides = overrides or {}
+
+    def _rng(self, kind: str, serno: str) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}:{serno}")
+
+    def child_serno(self, serno: str) -> str:
+        digest = hashlib.sha1(f"{self.seed}:{serno}".encode("utf-8")).hexdigest()
+        return "ST" + digest[:12].upper()
+
+    def matching(self, serno: str) -> Optional[Dict[str, Any]]:
+        overrides = self.overrides.get("matching", {})
+        if serno in overrides:
+            return overrides[serno]
+        if self._rng("child", serno).random() < self.no_child_rate:
+            return None
+        return {"serno_out": serno, "child_serno": self.child_serno(serno), "line": 436}
+
+    def inspect(self, serno: str, inspect: str) -> list:
+        overrides = self.overrides.get("inspect", {})
+        key = f"{serno}|{inspect}"
+        if key in overrides:
+            return overrides[key]
+        rng = self._rng(inspect, serno)
+        date = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(0, 365 * 86400))
+        if inspect == "QW2_child_serno":
+            if rng.random() < self.checked_rate:
+                return [{"inspectdate": date.strftime("%Y-%m-%d %H:%M:%S"), "judge": "1"}]
+            return []
+        if inspect == "Status":
+            roll = rng.random()
+            if roll < self.missing_rate:
+                return []
+            judge = "0" if roll < self.missing_rate + self.nok_rate else "1"
+            return [{"inspectdate": date.strftime("%Y-%m-%d %H:%M:%S"), "judge": judge}]
+        return []
+
+
+class FaultConfig:
+    """Latency and failure injection; fields may be changed at runtime via ``/_stub/config``."""
+
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, timeout_rate: float = 0.0,
+                 hang_s: float = 30.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self._sampler = parse_latency(latency)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def update(self, values: Dict[str, str]) -> None:
+        with self._lock:
+            if "latency" in values:
+                self._sampler = parse_latency(values["latency"])
+                self.latency = values["latency"]
+            for name in ("error_rate", "timeout_rate", "hang_s"):
+                if name in values:
+                    setattr(self, name, float(values[name]))
+
+    def draw(self):
+        """Return ``(delay_s, fault)`` for one request; fault is None, "error" or "timeout"."""
+        with self._lock:
+            delay = self._sampler(self._rng) / 1000.0
+            roll = self._rng.random()
+        if roll < self.timeout_rate:
+            return self.hang_s, "timeout"
+        if roll < self.timeout_rate + self.error_rate:
+            return delay, "error"
+        return delay, None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "error_rate": self.error_rate,
+                "timeout_rate": self.timeout_rate, "hang_s": self.hang_s}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, data: StubData, faults: FaultConfig, verbose: bool = False):
+        super().__init__(address, _Handler)
+        self.data = data
+        self.faults = faults
+        self.verbose = verbose
+        self.counters: Dict[str, int] = {}
+        self._counters_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def count(self, name: str) -> None:
+        with self._counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"  # keep-alive jak w intranecie – sesja klienta używa jednego połączenia
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        path = url.path.rstrip("/")
+
+        if path == "/_stub/config":
+            try:
+                self.server.faults.update(params)
+            except ValueError as exc:
+                self._send_json(400, {"error": str(exc)})
+                return
+            self._send_json(200, self.server.faults.as_dict())
+            return
+        if path == "/_stub/stats":
+            self._send_json(200, dict(self.server.counters))
+            return
+
+        if path == f"{BASE_PATH}/getMaching":
+            endpoint = "getMaching"
+        elif path == f"{BASE_PATH}/getInspect":
+            endpoint = "getInspect"
+        else:
+            self.server.count("not_found")
+            self._send_json(404, {"error": "not found"})
+            return
+
+        delay, fault = self.server.faults.draw()
+        if delay > 0:
+            time.sleep(delay)
+        self.server.count(endpoint)
+        if fault is not None:
+            self.server.count(fault)
+            if fault == "timeout":
+                # klient zwykle zrezygnował już z odpowiedzi – zamykamy połączenie
+                self.close_connection = True
+                return
+            self._send_json(500, {"error": "injected failure"})
+            return
+
+        data = self.server.data
+        if endpoint == "getMaching":
+            self._send_json(200, data.matching(params.get("serno_out", "")))
+        else:
+            self._send_json(200, data.inspect(params.get("serno", ""), params.get("inspect", "")))
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8080, data: Optional[StubData] = None,
+                faults: Optional[FaultConfig] = None, verbose: bool = False) -> StubServer:
+    return StubServer((host, port), data or StubData(), faults or FaultConfig(), verbose)
+
+
+def serve_in_thread(server: StubServer) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, name="qw2-intranet-stub", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- test obciążeniowy ------------------------------------------------------
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_load(base_url: str, count: int, workers: int, timeout: float, seed: int) -> Dict[str, Any]:
+    """Verify ``count`` pieces against the stub with the real client and `verify_many`."""
+    from intranet import IntranetClient
+    from verification import verify_many
+
+    latencies = []
+
+    class TimedClient(IntranetClient):
+        def _fetch(self, endpoint, params, flight):
+            t0 = time.perf_counter()
+            try:
+                return super()._fetch(endpoint, params, flight)
+            finally:
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    client = TimedClient(base_url, timeout=timeout)
+    rng = random.Random(seed)
+    pairs = [(f"12VIT{rng.randrange(10 ** 14):014d}", None) for _ in range(count)]
+    start = time.perf_counter()
+    results = verify_many(client, pairs, workers=workers)
+    elapsed = time.perf_counter() - start
+    client.close()
+    verdicts: Dict[str, int] = {}
+    for r in results:
+        if r is not None:
+            verdicts[r["verdict"]] = verdicts.get(r["verdict"], 0) + 1
+    return {
+        "pieces": count,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "pieces_per_s": round(count / elapsed, 1) if elapsed else None,
+        "request_p50_ms": round(_percentile(latencies, 0.5), 1),
+        "request_p95_ms": round(_percentile(latencies, 0.95), 1),
+        "request_max_ms": round(max(latencies), 1) if latencies else 0.0,
+        "verdicts": verdicts,
+        "client": client.stats(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Lokalny zamiennik intranetu Traceability2")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--seed", type=int, default=0, help="ziarno danych i losowania awarii")
+    parser.add_argument("--data", help="plik JSON z nadpisanymi odpowiedziami")
+    parser.add_argument("--nok-rate", type=float, default=0.02)
+    parser.add_argument("--missing-rate", type=float, default=0.01, help="odsetek sztuk bez danych EOL")
+    parser.add_argument("--no-child-rate", type=float, default=0.0, help="odsetek DMC bez child_serno")
+    parser.add_argument("--checked-rate", type=float, default=0.0, help="odsetek sztuk już sprawdzonych na QW2")
+    parser.add_argument("--latency", default="fixed:0", help="rozkład opóźnienia w ms, np. lognormal:60,0.6")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="odsetek odpowiedzi HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="odsetek odpowiedzi wstrzymanych")
+    parser.add_argument("--hang-s", type=float, default=30.0, help="czas wstrzymania odpowiedzi [s]")
+    parser.add_argument("--verbose", action="store_true", help="loguj każde zapytanie")
+    parser.add_argument("--load", type=int, metavar="N", help="uruchom stub w tle i zweryfikuj N sztuk klientem")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--client-timeout", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    overrides = None
+    if args.data:
+        with open(args.data, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    try:
+        faults = FaultConfig(args.latency, args.error_rate, args.timeout_rate, args.hang_s, seed=args.seed)
+    except ValueError as exc:
+        parser.error(str(exc))
+    data = StubData(args.seed, args.nok_rate, args.missing_rate, args.no_child_rate, args.checked_rate, overrides)
+    server = make_server(args.host, 0 if args.load else args.port, data, faults, args.verbose)
+
+    if args.load:
+        serve_in_thread(server)
+        report = run_load(server.base_url, args.load, args.workers, args.client_timeout, args.seed)
+        report["server"] = dict(server.counters)
+        server.shutdown()
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"Stub intranetu: {server.base_url} (Ctrl+C kończy)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,493 @@
+"""
+Narzędzia do przeglądania dzienników aplikacji QW2.
+
+Moduł udostępnia indeks pomocniczy (`LogIndex`) budowany obok plików
+`logs/QW2_*.log` (także skompresowanych `.log.gz`) oraz polecenia wiersza
+poleceń:
+- `index` – przyrostowe (od zapamiętanego offsetu pliku) uzupełnienie indeksu
+- `query` – wyszukiwanie po dacie, `event`, `session_id`, użytkowniku, DMC
+    i zakresie czasu bez czytania całych dni
+- `merge` – scalanie (k-way merge) plików wielu stacji, dzień po dniu
+    (`QW2_<HOST>_YYYY-MM-DD.log`) w jeden widok uporządkowany w czasie
+
+Przykłady:
+    python log_tools.py query --logs logs --dmc 123VIT45678901234567 --since "2025-06-26 06:00"
+    python log_tools.py merge --logs \\serwer\qw2 --date 2025-06-26 -o scalone.log
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+import os
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from logger import iter_log_files, open_log, parse_log_name
+
+INDEX_NAME = ".qw2_index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    day TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    file TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    event TEXT,
+    session_id TEXT,
+    user TEXT,
+    dmc TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries (ts);
+CREATE INDEX IF NOT EXISTS entries_event ON entries (event, ts);
+CREATE INDEX IF NOT EXISTS entries_session ON entries (session_id, ts);
+CREATE INDEX IF NOT EXISTS entries_user ON entries (user, ts);
+CREATE INDEX IF NOT EXISTS entries_dmc ON entries (dmc, ts);
+CREATE INDEX IF NOT EXISTS entries_file ON entries (file, offset);
+"""
+
+
+def parse_record(line: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Split a ``timestamp {json}`` log line into ``(timestamp, payload)``."""
+    line = line.rstrip("\r\n")
+    if len(line) < 21 or line[19] != " ":
+        return None
+    try:
+        payload = json.loads(line[20:])
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    return line[:19], payload
+
+
+def _field(payload: Dict[str, Any], *names: str) -> Optional[str]:
+    for name in names:
+        value = payload.get(name)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def _open_binary(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _gzip_isize(path: str) -> int:
+    """Uncompressed size of the last gzip member (the whole file for a freshly compressed log)."""
+    with open(path, "rb") as fh:
+        fh.seek(-4, os.SEEK_END)
+        return int.from_bytes(fh.read(4), "little")
+
+
+def _iter_lines_from(path: str, offset: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield ``(offset, raw_line)`` for complete lines starting at ``offset`` (decompressed bytes)."""
+    with _open_binary(path) as fh:
+        if offset:
+            fh.seek(offset)
+        pos = offset
+        for raw in fh:
+            if not raw.endswith(b"\n"):
+                # niepełna linia – dokończy ją następna indeksacja
+                break
+            yield pos, raw
+            pos += len(raw)
+
+
+class LogIndex:
+    """SQLite sidecar index over the daily logs of one ``logs`` directory."""
+
+    def __init__(self, logs_dir: str, index_path: Optional[str] = None):
+        self.logs_dir = logs_dir
+        self.index_path = index_path or os.path.join(logs_dir, INDEX_NAME)
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "LogIndex":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def rebuild(self) -> int:
+        with self.conn:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM files")
+        return self.update()
+
+    def _known_files(self) -> Dict[str, Tuple[int, int]]:
+        return {name: (offset, size) for name, offset, size in self.conn.execute("SELECT name, offset, size FROM files")}
+
+    def _forget(self, name: str) -> None:
+        self.conn.execute("DELETE FROM entries WHERE file = ?", (name,))
+        self.conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+    def _reconcile_vanished(self, present: Dict[str, str]) -> None:
+        """Carry the index over when rotation replaced ``X.log`` with ``X.log.gz``."""
+        known = self._known_files()
+        for name in known:
+            if name in present:
+                continue
+            compressed = name + ".gz"
+            if not name.endswith(".gz") and compressed in present and compressed not in known:
+                # treść .gz zaczyna się dokładnie od treści skompresowanego pliku – offsety się zgadzają
+                offset = known[name][0]
+                # rozmiar na dysku odnosi się teraz do .gz; gdy w pliku zostały niezaindeksowane
+                # linie, -1 wymusza jednorazowe doczytanie od offsetu (bez indeksowania od zera)
+                gz_size = -1
+                try:
+                    if _gzip_isize(present[compressed]) == offset:
+                        gz_size = os.path.getsize(present[compressed])
+                except OSError:
+                    pass
+                self.conn.execute("UPDATE entries SET file = ? WHERE file = ?", (compressed, name))
+                self.conn.execute("UPDATE files SET name = ?, size = ? WHERE name = ?", (compressed, gz_size, name))
+            else:
+                # linie dopisane później trafią do indeksu przez przyrost pliku .gz
+                self._forget(name)
+
+    def update(self) -> int:
+        """Index new lines of every log file; returns the number of added records."""
+        present = {os.path.basename(p): p for p in iter_log_files(self.logs_dir)}
+        added = 0
+        with self.conn:
+            self._reconcile_vanished(present)
+            known = self._known_files()
+            for name, path in present.items():
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                offset, known_size = known.get(name, (0, -1))
+                if size == known_size:
+                    # bez zmian – dla .gz nie trzeba nawet dekompresować
+                    continue
+                if size < known_size:
+                    # plik przepisany od nowa – indeksujemy od początku
+                    self._forget(name)
+                    offset = 0
+                added += self._index_file(name, path, offset, size)
+        return added
+
+    def _index_file(self, name: str, path: str, offset: int, size: int) -> int:
+        parsed = parse_log_name(name)
+        day = parsed[1].isoformat() if parsed else ""
+        rows = []
+        end = offset
+        try:
+            for pos, raw in _iter_lines_from(path, offset):
+                end = pos + len(raw)
+                record = parse_record(raw.decode("utf-8", errors="replace"))
+                if record is None:
+                    continue
+                ts, payload = record
+                rows.append((
+                    name,
+                    pos,
+                    ts,
+                    _field(payload, "event"),
+                    _field(payload, "session_id"),
+                    _field(payload, "user", "badge"),
+                    _field(payload, "dmc"),
+                ))
+        except (OSError, EOFError):
+            # uszkodzony lub właśnie zapisywany plik .gz – zostawiamy offset do następnej próby
+            pass
+        self.conn.executemany(
+            "INSERT INTO entries (file, offset, ts, event, session_id, user, dmc) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (name, day, offset, size) VALUES (?, ?, ?, ?)",
+            (name, day, end, size),
+        )
+        return len(rows)
+
+    def search(
+        self,
+        event: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user: Optional[str] = None,
+        dmc: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        day: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, int, str]]:
+        """Return ``(file, offset, ts)`` of matching records ordered by time."""
+        clauses = []
+        params: List[Any] = []
+        for column, value in (("event", event), ("session_id", session_id), ("user", user), ("dmc", dmc)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if day:
+            since = max(since or "", f"{day} 00:00:00")
+            until = min(until or "9999", f"{day} 23:59:59")
+        if since:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until:
+            clauses.append("ts <= ?")
+            params.append(until)
+        sql = "SELECT file, offset, ts FROM entries"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts, file, offset"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return list(self.conn.execute(sql, params))
+
+    def read_lines(self, hits: List[Tuple[str, int, str]]) -> Iterator[str]:
+        """Read the log lines behind search hits, opening each file once."""
+        by_file: Dict[str, List[int]] = {}
+        for name, offset, _ in hits:
+            by_file.setdefault(name, []).append(offset)
+        lines: Dict[Tuple[str, int], str] = {}
+        for name, offsets in by_file.items():
+            path = os.path.join(self.logs_dir, name)
+            try:
+                fh = _open_binary(path)
+            except OSError:
+                continue
+            with fh:
+                for offset in sorted(offsets):
+                    fh.seek(offset)
+                    lines[(name, offset)] = fh.readline().decode("utf-8", errors="replace").rstrip("\r\n")
+        for name, offset, _ in hits:
+            line = lines.get((name, offset))
+            if line is not None:
+                yield line
+
+
+def split_shard_stem(stem: str, app_name: str = "QW2") -> Optional[Tuple[str, str]]:
+    """Return ``(kind, host)`` for a log stem; ``kind`` is ``"main"`` or ``"keys"``.
+
+    Files written before per-host sharding (``QW2_YYYY-MM-DD.log``) get an
+    empty host.
+    """
+    if stem == app_name:
+        return "main", ""
+    if stem == f"{app_name}_keys":
+        return "keys", ""
+    if stem.startswith(f"{app_name}_keys_"):
+        return "keys", stem[len(app_name) + 6:]
+    if stem.startswith(f"{app_name}_"):
+        return "main", stem[len(app_name) + 1:]
+    return None
+
+
+def collect_shards(
+    logs_dir: str,
+    kind: str = "main",
+    hosts: Optional[Iterable[str]] = None,
+    first_day: Optional[str] = None,
+    last_day: Optional[str] = None,
+    app_name: str = "QW2",
+) -> Dict[str, List[str]]:
+    """Group daily log files by host, each list in day order."""
+    wanted = set(hosts) if hosts else None
+    shards: Dict[str, List[str]] = {}
+    for path in iter_log_files(logs_dir):
+        stem, day, _ = parse_log_name(os.path.basename(path))
+        split = split_shard_stem(stem, app_name)
+        if split is None or split[0] != kind:
+            continue
+        host = split[1]
+        if wanted is not None and host not in wanted:
+            continue
+        day_str = day.isoformat()
+        if (first_day and day_str < first_day) or (last_day and day_str > last_day):
+            continue
+        shards.setdefault(host, []).append(path)
+    return shards
+
+
+def _iter_shard(host: str, paths: List[str], since: Optional[str], until: Optional[str]) -> Iterator[Tuple[str, str, str]]:
+    """Yield ``(ts, host, line)`` of one host in timestamp order, one day at a time.
+
+    Lines of a daily file are not guaranteed to be in time order: buffered
+    key sequences carry the time of their last key and late lines are appended
+    after rotation. Each day (all files of that day) is therefore sorted before
+    it is yielded.
+    """
+    by_day: Dict[str, List[str]] = {}
+    for path in paths:
+        parsed = parse_log_name(os.path.basename(path))
+        by_day.setdefault(parsed[1].isoformat() if parsed else "", []).append(path)
+    for day in sorted(by_day):
+        if until and day > until[:10]:
+            # pliki kolejnych dni zawierają już tylko późniejsze wpisy
+            return
+        records: List[Tuple[str, str]] = []
+        for path in by_day[day]:
+            try:
+                fh = open_log(path)
+            except OSError:
+                continue
+            with fh:
+                for line in fh:
+                    line = line.rstrip("\r\n")
+                    ts = line[:19]
+                    if len(ts) < 19:
+                        continue
+                    if (since and ts < since) or (until and ts > until):
+                        continue
+                    records.append((ts, line))
+        # sortowanie stabilne – wpisy z tą samą sekundą zostają w kolejności zapisu
+        records.sort(key=lambda r: r[0])
+        for ts, line in records:
+            yield ts, host, line
+
+
+def merge_shards(
+    shards: Dict[str, List[str]],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Iterator[Tuple[str, str]]:
+    """Stream ``(host, line)`` from all shards ordered by timestamp.
+
+    Shards are read one day at a time (sorted per day, see `_iter_shard`), so
+    memory use is one day of logs per host.
+    """
+    streams = [_iter_shard(host, paths, since, until) for host, paths in sorted(shards.items())]
+    for _, host, line in heapq.merge(*streams):
+        yield host, line
+
+
+def _with_host(line: str, host: str) -> str:
+    record = parse_record(line)
+    if record is None:
+        return line
+    ts, payload = record
+    payload.setdefault("host", host)
+    return f"{ts} {json.dumps(payload, ensure_ascii=False)}"
+
+
+def _default_logs_dir() -> str:
+    return os.path.join(os.getcwd(), "logs")
+
+
+def _cmd_index(args: argparse.Namespace) -> int:
+    with LogIndex(args.logs) as index:
+        added = index.rebuild() if args.rebuild else index.update()
+    print(f"Zaindeksowano {added} nowych wpisów")
+    return 0
+
+
+def _cmd_query(args: argparse.Namespace) -> int:
+    with LogIndex(args.logs) as index:
+        if not args.no_update:
+            index.update()
+        hits = index.search(
+            event=args.event,
+            session_id=args.session,
+            user=args.user,
+            dmc=args.dmc,
+            since=_normalize_ts(args.since),
+            until=_normalize_ts(args.until, end=True),
+            day=args.date,
+            limit=args.limit,
+        )
+        if args.count:
+            print(len(hits))
+            return 0
+        for line in index.read_lines(hits):
+            if args.json:
+                record = parse_record(line)
+                if record is not None:
+                    print(json.dumps(record[1], ensure_ascii=False))
+            else:
+                print(line)
+    return 0
+
+
+def _cmd_merge(args: argparse.Namespace) -> int:
+    since = _normalize_ts(args.since or args.date)
+    until = _normalize_ts(args.until or args.date, end=True)
+    shards = collect_shards(
+        args.logs,
+        kind="keys" if args.keys else "main",
+        hosts=args.host,
+        first_day=since[:10] if since else None,
+        last_day=until[:10] if until else None,
+    )
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for host, line in merge_shards(shards, since, until):
+            out.write(_with_host(line, host) if args.with_host else line)
+            out.write("\n")
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+def _normalize_ts(value: Optional[str], end: bool = False) -> Optional[str]:
+    """Accept ``YYYY-MM-DD``, ``YYYY-MM-DD HH:MM`` or full timestamps."""
+    if not value:
+        return None
+    value = value.replace("T", " ")
+    if len(value) == 10:
+        return value + (" 23:59:59" if end else " 00:00:00")
+    if len(value) == 16:
+        return value + (":59" if end else ":00")
+    return value[:19]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Narzędzia dzienników QW2")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_index = sub.add_parser("index", help="uzupełnij indeks dzienników")
+    p_index.add_argument("--logs", default=_default_logs_dir(), help="katalog logs/")
+    p_index.add_argument("--rebuild", action="store_true", help="zbuduj indeks od zera")
+    p_index.set_defaults(func=_cmd_index)
+
+    p_query = sub.add_parser("query", help="wyszukaj wpisy w dziennikach")
+    p_query.add_argument("--logs", default=_default_logs_dir(), help="katalog logs/")
+    p_query.add_argument("--event")
+    p_query.add_argument("--session", help="session_id")
+    p_query.add_argument("--user", help="użytkownik / badge")
+    p_query.add_argument("--dmc")
+    p_query.add_argument("--date", help="dzień YYYY-MM-DD")
+    p_query.add_argument("--since", help="początek zakresu (YYYY-MM-DD[ HH:MM[:SS]])")
+    p_query.add_argument("--until", help="koniec zakresu (YYYY-MM-DD[ HH:MM[:SS]])")
+    p_query.add_argument("--limit", type=int)
+    p_query.add_argument("--count", action="store_true", help="wypisz tylko liczbę wpisów")
+    p_query.add_argument("--json", action="store_true", help="wypisz same obiekty JSON")
+    p_query.add_argument("--no-update", action="store_true", help="nie uzupełniaj indeksu przed zapytaniem")
+    p_query.set_defaults(func=_cmd_query)
+
+    p_merge = sub.add_parser("merge", help="scal dzienniki wszystkich stacji w kolejności czasu")
+    p_merge.add_argument("--logs", default=_default_logs_dir(), help="katalog logs/ (np. na udziale)")
+    p_merge.add_argument("--date", help="dzień YYYY-MM-DD")
+    p_merge.add_argument("--since", help="początek zakresu (YYYY-MM-DD[ HH:MM[:SS]])")
+    p_merge.add_argument("--until", help="koniec zakresu (YYYY-MM-DD[ HH:MM[:SS]])")
+    p_merge.add_argument("--host", action="append", help="tylko wskazane stacje (można powtórzyć)")
+    p_merge.add_argument("--keys", action="store_true", help="scal dzienniki klawiszy zamiast głównych")
+    p_merge.add_argument("--with-host", action="store_true", help="dodaj pole host do każdego wpisu")
+    p_merge.add_argument("-o", "--output", help="plik wynikowy (domyślnie stdout)")
+    p_merge.set_defaults(func=_cmd_merge)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,21 @@ udostępniony folder sieciowy. Główne elementy:
     katalog docelowy jest chwilowo niedostępny
 - funkcje `init_logging`, `log_event`, `flush_pending_events`, `set_extra_log_dir`
     – API do inicjalizacji i wysyłania zdarzeń
+- rotacja dzienników (`compress_log`, `enforce_retention`, `set_log_retention`)
+    – kompresja gzip poprzednich dni w tle i limit rozmiaru/wieku katalogu
+- polityka zapisu (`set_log_policy`, `load_log_policy`, plik `log_policy.json`)
+    – próg poziomu, tryb klawiszy (wszystkie / tylko `key_sequence` / brak),
+    reguły per widget i limity zdarzeń na sekundę, stosowane na wejściu `log_event`
+- `start_trace` / `Trace` – wspólny `trace_id` i czasy trwania dla zdarzeń
+    jednej operacji (np. jednego skanu)
+- `open_log`, `iter_log_files` – odczyt dzienników, także skompresowanych
+- `_LogShipper`, `set_log_shipping` – tryb wysyłki: zapis tylko lokalnie,
+    a na udział trafiają w tle skompresowane paczki dopisywane do jednego
+    pliku `.log.gz` na dzień (kursor w `.ship_cursor.json`)
+
+Na katalogu `extra_dir` każda stacja zapisuje własne pliki
+`QW2_<HOST>_YYYY-MM-DD.log` / `QW2_keys_<HOST>_YYYY-MM-DD.log`, dzięki czemu
+stacje nie dopisują równocześnie do tego samego pliku na udziale.
 
 Moduł jest zaprojektowany tak, by obsługiwać zarówno lokalne logi,
 jak i opcjonalny katalog `extra_dir` (np. udział sieciowy) z buforowaniem
@@ -16,21 +31,50 @@ w przypadku braku dostępu.
 """
 
 import atexit
+import contextlib
+import gzip
 import json
 import logging
 import os
+import re
+import shutil
+import socket
 import threading
+import time
 import uuid
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+
+# blokady dopisywania per plik – kompresja (`compress_log`) nie może zgubić linii dopisanej w trakcie
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(path: str) -> threading.Lock:
+    key = os.path.normcase(os.path.abspath(path))
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.Lock()
+        return lock
 
 
 class _BufferedSink:
     """Append-only writer that buffers records when the destination is unavailable."""
 
-    def __init__(self, root: Optional[str], app_name: str, suffix: str = "", max_buffer: int = 20000):
+    def __init__(
+        self,
+        root: Optional[str],
+        app_name: str,
+        suffix: str = "",
+        max_buffer: int = 20000,
+        host: Optional[str] = None,
+    ):
         self._lock = threading.Lock()
         self.suffix = suffix
+        # na wspólnym udziale każda stacja pisze do własnego pliku (shard per host)
+        self.host = host
         self.max_buffer = max_buffer
         self.buffer = []  # type: list[tuple[str, datetime]]
         self.offline = False
@@ -57,9 +101,10 @@ class _BufferedSink:
 
     def _filename(self, when: datetime) -> str:
         date_str = when.strftime("%Y-%m-%d")
+        host_part = f"_{self.host}" if self.host else ""
         if self.suffix:
-            return f"{self.app_name}{self.suffix}_{date_str}.log"
-        return f"{self.app_name}_{date_str}.log"
+            return f"{self.app_name}{self.suffix}{host_part}_{date_str}.log"
+        return f"{self.app_name}{host_part}_{date_str}.log"
 
     def _write_direct(self, line: str, when: datetime) -> None:
         logs_dir = self._logs_dir()
@@ -67,7 +112,7 @@ class _BufferedSink:
             raise FileNotFoundError("Logs directory not configured")
         os.makedirs(logs_dir, exist_ok=True)
         path = os.path.join(logs_dir, self._filename(when))
-        with open(path, "a", encoding="utf-8") as fh:
+        with _path_lock(path), open(path, "a", encoding="utf-8") as fh:
             fh.write(line)
             fh.write("\n")
         self.last_path = path
@@ -104,6 +149,13 @@ class _BufferedSink:
         with self._lock:
             self.just_recovered = False
             previously_offline = self.offline or bool(self.buffer)
+            if self.buffer:
+                # zaległe wpisy najpierw, aby plik pozostał uporządkowany w czasie
+                self._append_buffer(line, moment)
+                success = self._flush_buffer_locked()
+                if success:
+                    self.just_recovered = previously_offline
+                return success
             try:
                 self._write_direct(line, moment)
             except Exception as exc:  # pragma: no cover - defensive
@@ -141,6 +193,519 @@ def _format_line(payload: Dict[str, Any], when: datetime) -> str:
     return f"{when.strftime('%Y-%m-%d %H:%M:%S')} {json.dumps(payload, ensure_ascii=False)}"
 
 
+# ---------------------------------------------------------------------------
+# Rotacja: kompresja poprzednich dni i limit rozmiaru/wieku katalogu logów
+# ---------------------------------------------------------------------------
+
+# opcjonalny numer partii (`.000001`) mają paczki wysłane przez starsze wersje `_LogShipper`
+_LOG_NAME_RE = re.compile(
+    r"^(?P<stem>.+)_(?P<date>\d{4}-\d{2}-\d{2})(?:\.(?P<part>\d+))?\.log(?P<gz>\.gz)?$"
+)
+
+# domyślne budżety: (maks. wiek w dniach, maks. rozmiar katalogu w bajtach)
+_retention: Dict[str, Tuple[Optional[int], Optional[int]]] = {
+    "local": (180, 2 * 1024 ** 3),
+    "extra": (365, None),
+}
+
+_maintenance_lock = threading.Lock()
+_maintenance_thread: Optional[threading.Thread] = None
+
+
+def parse_log_name(name: str) -> Optional[Tuple[str, date, bool]]:
+    """Return ``(stem, day, compressed)`` for a daily log file name or ``None``."""
+    match = _LOG_NAME_RE.match(name)
+    if not match:
+        return None
+    try:
+        day = datetime.strptime(match.group("date"), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+    return match.group("stem"), day, bool(match.group("gz"))
+
+
+def open_log(path: str) -> TextIO:
+    """Open a daily log for reading, transparently decompressing ``.gz`` files."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def host_tag(host: Optional[str] = None) -> str:
+    """Return the host name in a form safe for log file names."""
+    return re.sub(r"[^A-Za-z0-9.-]", "-", host or socket.gethostname()) or "unknown"
+
+
+def iter_log_files(logs_dir: str, stem: Optional[Union[str, Iterable[str]]] = None) -> List[str]:
+    """List daily log files (plain and compressed) sorted by day and name.
+
+    ``stem`` limits the result to one file stem (e.g. ``QW2_keys_HOST``) or a
+    collection of stems.
+    """
+    if isinstance(stem, str):
+        stem = {stem}
+    elif stem is not None:
+        stem = set(stem)
+    found = []
+    try:
+        names = os.listdir(logs_dir)
+    except OSError:
+        return []
+    for name in names:
+        parsed = parse_log_name(name)
+        if parsed is None:
+            continue
+        if stem is not None and parsed[0] not in stem:
+            continue
+        part = int(_LOG_NAME_RE.match(name).group("part") or 0)
+        # plik .gz przed .log z tego samego dnia – dopisane później linie są nowsze
+        found.append((parsed[1], parsed[0], part, not parsed[2], os.path.join(logs_dir, name)))
+    found.sort()
+    return [item[4] for item in found]
+
+
+def compress_log(path: str) -> str:
+    """Gzip a finished daily log next to itself and remove the original.
+
+    When the ``.gz`` already exists (late buffered lines were appended to the
+    plain file after compression) the data is added as a new gzip member, which
+    readers decode as one continuous stream. Appends by this process wait for
+    the copy and removal, so no late line is lost in between.
+    """
+    with _path_lock(path):
+        return _compress_locked(path)
+
+
+def _compress_locked(path: str) -> str:
+    target = path + ".gz"
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        if os.path.exists(target):
+            shutil.copyfile(target, tmp)
+            mode = "ab"
+        else:
+            mode = "wb"
+        with open(path, "rb") as src, gzip.open(tmp, mode) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        stat = os.stat(path)
+        os.utime(tmp, (stat.st_atime, stat.st_mtime))
+        os.replace(tmp, target)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.remove(path)
+    return target
+
+
+def enforce_retention(
+    logs_dir: str,
+    max_age_days: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    today: Optional[date] = None,
+    stems: Optional[Iterable[str]] = None,
+) -> List[str]:
+    """Delete old daily logs so the directory fits the age and size budget.
+
+    The current day is never removed; the size budget is met by dropping the
+    oldest days first. With ``stems`` only those files are considered, so a
+    station manages just its own shards on a shared directory.
+    """
+    today = today or date.today()
+    entries = []
+    for path in iter_log_files(logs_dir, stems):
+        parsed = parse_log_name(os.path.basename(path))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        entries.append((parsed[1], path, size))
+
+    removed = []
+    kept = []
+    for day, path, size in entries:
+        if max_age_days is not None and (today - day).days > max_age_days:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError:
+                pass
+        else:
+            kept.append((day, path, size))
+
+    if max_bytes is not None:
+        total = sum(size for _, _, size in kept)
+        for day, path, size in kept:
+            if total <= max_bytes or day >= today:
+                break
+            try:
+                os.remove(path)
+                removed.append(path)
+                total -= size
+            except OSError:
+                pass
+    return removed
+
+
+def rotate_logs_dir(
+    logs_dir: str,
+    max_age_days: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    today: Optional[date] = None,
+    stems: Optional[Iterable[str]] = None,
+) -> Dict[str, List[str]]:
+    """Compress every plain log from previous days and apply the retention budget."""
+    today = today or date.today()
+    compressed = []
+    errors = []
+    for path in iter_log_files(logs_dir, stems):
+        parsed = parse_log_name(os.path.basename(path))
+        if parsed[2] or parsed[1] >= today:
+            continue
+        try:
+            compressed.append(compress_log(path))
+        except Exception as exc:  # plik w użyciu / brak dostępu – spróbujemy przy następnej rotacji
+            errors.append(f"{path}: {exc}")
+    removed = enforce_retention(logs_dir, max_age_days, max_bytes, today, stems)
+    return {"compressed": compressed, "removed": removed, "errors": errors}
+
+
+def set_log_retention(kind: str, max_age_days: Optional[int] = None, max_bytes: Optional[int] = None) -> None:
+    """Set the retention budget for ``"local"`` logs or the ``"extra"`` directory."""
+    if kind not in _retention:
+        raise ValueError(f"Unknown log directory kind: {kind}")
+    _retention[kind] = (max_age_days, max_bytes)
+
+
+def _run_maintenance(targets: List[Tuple[str, str, Optional[List[str]]]]) -> None:
+    for kind, root, stems in targets:
+        logs_dir = os.path.join(root, "logs")
+        if not os.path.isdir(logs_dir):
+            continue
+        max_age_days, max_bytes = _retention.get(kind, (None, None))
+        try:
+            result = rotate_logs_dir(logs_dir, max_age_days, max_bytes, stems=stems)
+        except Exception as exc:  # pragma: no cover - defensive
+            log_event("log_rotation_failed", level="warning", kind=kind, logs_dir=logs_dir, error=str(exc))
+            continue
+        if result["compressed"] or result["removed"] or result["errors"]:
+            log_event(
+                "log_rotation",
+                kind=kind,
+                logs_dir=logs_dir,
+                compressed=len(result["compressed"]),
+                removed=len(result["removed"]),
+                errors=result["errors"][:10],
+            )
+
+
+def schedule_log_maintenance() -> Optional[threading.Thread]:
+    """Run compression and retention for local and extra logs on a background thread."""
+    global _maintenance_thread
+
+    targets = []
+    if _base_dir:
+        targets.append(("local", _base_dir, None))
+    if _extra_dir and _app_name:
+        # na udziale rotujemy tylko własne shardy tej stacji
+        host = host_tag()
+        targets.append(("extra", _extra_dir, [f"{_app_name}_{host}", f"{_app_name}_keys_{host}"]))
+    if not targets:
+        return None
+    with _maintenance_lock:
+        if _maintenance_thread is not None and _maintenance_thread.is_alive():
+            return _maintenance_thread
+        _maintenance_thread = threading.Thread(
+            target=_run_maintenance, args=(targets,), name="qw2-log-rotation", daemon=True
+        )
+        _maintenance_thread.start()
+        return _maintenance_thread
+
+
+# ---------------------------------------------------------------------------
+# Wysyłka paczek: logi tylko lokalnie, na udział trafiają skompresowane partie
+# ---------------------------------------------------------------------------
+
+
+class _LogShipper:
+    """Background uploader of compressed log batches to the extra directory.
+
+    Local daily files are read from a per-file cursor (offset in the
+    decompressed stream, so rotation to ``.gz`` does not matter) and every
+    batch is appended as one gzip member to the day's shard
+    ``<stem>_<HOST>_<date>.log.gz`` (one file per stem, host and day; readers
+    decode the members as one stream). The shard size before an append is
+    saved in the cursor first, so an append left unconfirmed by a crash is cut
+    off and re-sent, and shipping resumes exactly where it stopped.
+    """
+
+    def __init__(
+        self,
+        local_root: str,
+        extra_root: str,
+        app_name: str,
+        interval: float = 30.0,
+        batch_bytes: int = 256 * 1024,
+        host: Optional[str] = None,
+    ):
+        self.local_root = local_root
+        self.extra_root = extra_root
+        self.app_name = app_name
+        self.interval = interval
+        self.batch_bytes = batch_bytes
+        self.host = host_tag(host)
+        self.local_logs = os.path.join(local_root, "logs")
+        self.cursor_path = os.path.join(self.local_logs, ".ship_cursor.json")
+        self.cursor = self._load_cursor()
+        self.last_error: Optional[str] = None
+        self.last_ship: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_cursor(self) -> Dict[str, Any]:
+        try:
+            with open(self.cursor_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if isinstance(data, dict) and isinstance(data.get("files"), dict):
+                return data
+        except (OSError, ValueError):
+            pass
+        # wcześniejsza historia nie jest wysyłana – start od dnia włączenia trybu
+        return {"since": date.today().isoformat(), "files": {}}
+
+    def _save_cursor(self) -> None:
+        os.makedirs(self.local_logs, exist_ok=True)
+        tmp = self.cursor_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.cursor, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.cursor_path)
+
+    def _sources(self) -> Dict[str, List[str]]:
+        """Group local files by logical name (``X.log`` and its rotated ``X.log.gz``)."""
+        stems = {self.app_name, f"{self.app_name}_keys"}
+        since = self.cursor.get("since", "")
+        sources: Dict[str, List[str]] = {}
+        for path in iter_log_files(self.local_logs, stems):
+            name = os.path.basename(path)
+            parsed = parse_log_name(name)
+            if parsed[1].isoformat() < since:
+                continue
+            logical = name[:-3] if name.endswith(".gz") else name
+            sources.setdefault(logical, []).append(path)
+        return sources
+
+    def pending_bytes(self) -> int:
+        """Cheap estimate of unshipped data (plain files only, via ``stat``)."""
+        total = 0
+        for logical, paths in self._sources().items():
+            entry = self.cursor["files"].get(logical, {})
+            plain = [p for p in paths if not p.endswith(".gz")]
+            if entry.get("done") and not plain:
+                continue
+            if not plain or len(paths) > 1:
+                # skompresowany dzień z zaległościami – wysyłamy od razu
+                return self.batch_bytes
+            try:
+                total += max(0, os.path.getsize(plain[0]) - entry.get("offset", 0))
+            except OSError:
+                continue
+        return total
+
+    def _read_batch(self, paths: List[str], offset: int) -> bytes:
+        """Read complete lines from ``offset`` of the logical stream, up to ``batch_bytes``."""
+        chunks: List[bytes] = []
+        size = 0
+        skip = offset
+        for path in paths:
+            if path.endswith(".gz"):
+                fh = gzip.open(path, "rb")
+            else:
+                fh = open(path, "rb")
+            with fh:
+                if skip:
+                    if not path.endswith(".gz"):
+                        part_len = os.fstat(fh.fileno()).st_size
+                        if skip >= part_len:
+                            skip -= part_len
+                            continue
+                    fh.seek(skip)
+                    skip -= fh.tell()
+                    if skip > 0:
+                        continue
+                for raw in iter(fh.readline, b""):
+                    if not raw.endswith(b"\n"):
+                        # linia w trakcie zapisu – dokończymy przy następnej wysyłce
+                        return b"".join(chunks)
+                    chunks.append(raw)
+                    size += len(raw)
+                    if size >= self.batch_bytes:
+                        return b"".join(chunks)
+        return b"".join(chunks)
+
+    def _shard_path(self, logical: str) -> str:
+        stem, day, _ = parse_log_name(logical)
+        return os.path.join(self.extra_root, "logs", f"{stem}_{self.host}_{day.isoformat()}.log.gz")
+
+    def _upload(self, logical: str, entry: Dict[str, Any], data: bytes) -> str:
+        """Append ``data`` as a gzip member to the day's shard (the caller confirms it in the cursor)."""
+        final = self._shard_path(logical)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        member = gzip.compress(data)
+        with open(final, "r+b" if os.path.exists(final) else "wb") as fh:
+            end = fh.seek(0, os.SEEK_END)
+            pending = entry.get("pending")
+            if pending is not None and end > pending:
+                # dopisanie niepotwierdzone w kursorze (awaria, przerwany zapis) – wysyłamy je ponownie
+                fh.truncate(pending)
+                end = fh.seek(pending)
+            entry["pending"] = end
+            self._save_cursor()
+            fh.write(member)
+            fh.flush()
+            os.fsync(fh.fileno())
+        return final
+
+    def ship_once(self) -> int:
+        """Ship every pending batch now; returns the number of shipped bytes."""
+        shipped = 0
+        today = date.today()
+        with self._lock:
+            try:
+                for logical, paths in sorted(self._sources().items()):
+                    entry = self.cursor["files"].setdefault(logical, {"offset": 0})
+                    has_plain = any(not p.endswith(".gz") for p in paths)
+                    if entry.get("done") and not has_plain:
+                        continue
+                    while True:
+                        data = self._read_batch(paths, entry["offset"])
+                        if not data:
+                            break
+                        last_path = self._upload(logical, entry, data)
+                        entry.pop("pending", None)
+                        entry["offset"] += len(data)
+                        entry.pop("done", None)
+                        self._save_cursor()
+                        shipped += len(data)
+                        self._note(True, extra_path=last_path)
+                    if parse_log_name(logical)[1] < today:
+                        entry["done"] = True
+                        self._save_cursor()
+            except Exception as exc:  # udział niedostępny – ponowimy przy następnym cyklu
+                self.last_error = str(exc)
+                self._note(False, error=str(exc))
+                return shipped
+        self.last_error = None
+        self.last_ship = datetime.now()
+        return shipped
+
+    def _note(self, ok: bool, **details: Any) -> None:
+        with _event_lock:
+            if ok and _network_up is not True:
+                _safe_note_network_ok(stage="ship", **details)
+            elif not ok:
+                _safe_note_network_error(stage="ship", **details)
+
+    def _run(self) -> None:
+        last = datetime.now()
+        while not self._stop.is_set():
+            self._wake.wait(1.0)
+            forced = self._wake.is_set()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            due = (datetime.now() - last).total_seconds() >= self.interval
+            if forced or due or self.pending_bytes() >= self.batch_bytes:
+                self.ship_once()
+                last = datetime.now()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="qw2-log-shipper", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, final_ship: bool = True, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if final_ship:
+            self.ship_once()
+
+
+_shipper: Optional[_LogShipper] = None
+_ship_config: Dict[str, Any] = {"enabled": False, "interval": 30.0, "batch_bytes": 256 * 1024}
+
+
+def set_log_shipping(enabled: bool, interval: Optional[float] = None, batch_bytes: Optional[int] = None) -> None:
+    """Switch between per-line remote appends and batched shipping to ``extra_dir``.
+
+    In shipping mode lines go only to the local ``logs`` directory and a
+    background shipper uploads compressed batches every ``interval`` seconds
+    or as soon as ``batch_bytes`` of new data is waiting.
+    """
+    _ship_config["enabled"] = bool(enabled)
+    if interval is not None:
+        _ship_config["interval"] = float(interval)
+    if batch_bytes is not None:
+        _ship_config["batch_bytes"] = int(batch_bytes)
+    _configure_network(_extra_dir)
+
+
+def _configure_network(extra_dir: Optional[str]) -> None:
+    """Set up either the per-line network sinks or the batch shipper for ``extra_dir``."""
+    global _network_main_sink, _network_key_sink, _shipper
+
+    shipping = bool(extra_dir and _app_name and _base_dir and _ship_config["enabled"])
+    if _shipper is not None and (
+        not shipping or _shipper.extra_root != extra_dir or _shipper.local_root != _base_dir
+    ):
+        _shipper.stop(final_ship=False)
+        _shipper = None
+
+    if not extra_dir or not _app_name:
+        _network_main_sink = None
+        _network_key_sink = None
+        return
+
+    if shipping:
+        _network_main_sink = None
+        _network_key_sink = None
+        if _shipper is None:
+            _shipper = _LogShipper(
+                _base_dir,
+                extra_dir,
+                _app_name,
+                interval=_ship_config["interval"],
+                batch_bytes=_ship_config["batch_bytes"],
+            )
+        else:
+            _shipper.interval = _ship_config["interval"]
+            _shipper.batch_bytes = _ship_config["batch_bytes"]
+        _shipper.start()
+        return
+
+    if _network_main_sink is None:
+        _network_main_sink = _BufferedSink(extra_dir, _app_name, suffix="", max_buffer=50000, host=host_tag())
+    else:
+        _network_main_sink.configure(extra_dir, _app_name)
+    if _network_key_sink is None:
+        _network_key_sink = _BufferedSink(extra_dir, _app_name, suffix="_keys", max_buffer=50000, host=host_tag())
+    else:
+        _network_key_sink.configure(extra_dir, _app_name)
+
+
 _network_status_recursing = False
 _disk_status_recursing = False
 
@@ -235,6 +800,8 @@ _current_date: Optional[date] = None
 _extra_dir: Optional[str] = None
 _session_id: Optional[str] = None
 
+_event_lock = threading.RLock()
+
 _KEY_SEQUENCE_TIMEOUT = timedelta(seconds=1.0)
 _key_buffer: Optional[Dict[str, Any]] = None
 
@@ -258,11 +825,21 @@ def _create_file_handler(base_dir: str, app_name: str):
     return handler, path
 
 
-def init_logging(base_dir: str, app_name: str = "QW2", level=logging.INFO, extra_dir: Optional[str] = None):
-    """Initialize logging to daily files locally and optionally on a network share."""
+def init_logging(
+    base_dir: str,
+    app_name: str = "QW2",
+    level=logging.INFO,
+    extra_dir: Optional[str] = None,
+    ship_logs: Optional[bool] = None,
+):
+    """Initialize logging to daily files locally and optionally on a network share.
+
+    ``ship_logs`` switches the share between per-line appends and batched
+    shipping (see `set_log_shipping`); ``None`` keeps the current mode.
+    """
 
     global _logger, _base_dir, _app_name, _current_date, _extra_dir, _session_id
-    global _network_up, _network_main_sink, _network_key_sink, _local_key_sink
+    global _network_up, _local_key_sink
 
     _base_dir = base_dir
     _app_name = app_name
@@ -281,18 +858,14 @@ def init_logging(base_dir: str, app_name: str = "QW2", level=logging.INFO, extra
     else:
         _local_key_sink.configure(base_dir, app_name)
 
-    if extra_dir:
-        if _network_main_sink is None:
-            _network_main_sink = _BufferedSink(extra_dir, app_name, suffix="", max_buffer=50000)
-        else:
-            _network_main_sink.configure(extra_dir, app_name)
-        if _network_key_sink is None:
-            _network_key_sink = _BufferedSink(extra_dir, app_name, suffix="_keys", max_buffer=50000)
-        else:
-            _network_key_sink.configure(extra_dir, app_name)
-    else:
-        _network_main_sink = None
-        _network_key_sink = None
+    try:
+        load_log_policy(os.path.join(base_dir, "log_policy.json"))
+    except Exception as exc:  # pragma: no cover - defensive
+        logging.getLogger().warning(f"Invalid log policy: {exc}")
+
+    if ship_logs is not None:
+        _ship_config["enabled"] = bool(ship_logs)
+    _configure_network(extra_dir)
 
     try:
         logger = logging.getLogger(app_name)
@@ -300,6 +873,8 @@ def init_logging(base_dir: str, app_name: str = "QW2", level=logging.INFO, extra
 
         for handler in list(logger.handlers):
             logger.removeHandler(handler)
+            # zamknięcie zwalnia plik poprzedniego dnia, aby rotacja mogła go skompresować
+            handler.close()
 
         handler, path = _create_file_handler(base_dir, app_name)
         logger.addHandler(handler)
@@ -315,6 +890,8 @@ def init_logging(base_dir: str, app_name: str = "QW2", level=logging.INFO, extra
         if session_started:
             log_startup(app_name=app_name, base_dir=base_dir, extra_dir=_extra_dir)
 
+        schedule_log_maintenance()
+
     except Exception as exc:  # pragma: no cover - defensive
         logging.getLogger().warning(f"Failed to init logger: {exc}")
 
@@ -375,6 +952,114 @@ def _emit(level: str, payload: Dict[str, Any], when: Optional[datetime] = None)
         _handle_sink_result(_network_main_sink, success, "main_log", "network")
 
 
+# ---------------------------------------------------------------------------
+# Polityka zapisu: filtrowanie poziomów, tryby klawiszy, limity częstości
+# ---------------------------------------------------------------------------
+
+_LEVELS = {"debug": 10, "info": 20, "warning": 30, "warn": 30, "error": 40}
+_KEY_MODES = ("all", "sequence", "off")
+
+_DEFAULT_POLICY: Dict[str, Any] = {
+    # zdarzenia poniżej tego poziomu są pomijane
+    "min_level": "debug",
+    # "all" – każdy klawisz + key_sequence, "sequence" – tylko złożone key_sequence, "off" – bez klawiszy
+    "key_mode": "all",
+    # nadpisanie key_mode dla wybranych widgetów, np. {"hidden_scan": "sequence"}
+    "widgets": {},
+    # maks. liczba zdarzeń danej nazwy na sekundę, np. {"key_sequence": 5}
+    "rate_limits": {},
+}
+
+_policy: Dict[str, Any] = dict(_DEFAULT_POLICY)
+_rate_buckets: Dict[str, List[float]] = {}
+_dropped: Dict[str, int] = {}
+
+
+def set_log_policy(**options: Any) -> None:
+    """Update the write policy (``min_level``, ``key_mode``, ``widgets``, ``rate_limits``)."""
+    unknown = set(options) - set(_DEFAULT_POLICY)
+    if unknown:
+        raise ValueError(f"Unknown log policy options: {sorted(unknown)}")
+    level = options.get("min_level")
+    if level is not None and str(level).lower() not in _LEVELS:
+        raise ValueError(f"Unknown log level: {level}")
+    modes = [options.get("key_mode")] + list((options.get("widgets") or {}).values())
+    for mode in modes:
+        if mode is not None and mode not in _KEY_MODES:
+            raise ValueError(f"Unknown key mode: {mode}")
+    with _event_lock:
+        _policy.update(options)
+        _rate_buckets.clear()
+
+
+def load_log_policy(path: str) -> bool:
+    """Load the write policy from a JSON file; returns ``False`` if the file is missing."""
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return False
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    with _event_lock:
+        _policy.clear()
+        _policy.update(_DEFAULT_POLICY)
+    set_log_policy(**data)
+    return True
+
+
+def policy_stats() -> Dict[str, int]:
+    """Number of events dropped by the policy since start, per event name."""
+    with _event_lock:
+        return dict(_dropped)
+
+
+def logger_status() -> Dict[str, Any]:
+    """Online state of the log destinations and the number of records buffered while offline."""
+    sinks = {"network_main": _network_main_sink, "network_keys": _network_key_sink, "local_keys": _local_key_sink}
+    return {
+        "session_id": _session_id,
+        "network_up": _network_up,
+        "disk_up": _disk_up,
+        "buffered": {name: len(sink.buffer) for name, sink in sinks.items() if sink is not None},
+    }
+
+
+def _key_mode(widget: Any) -> str:
+    widgets = _policy.get("widgets") or {}
+    if widget is not None and str(widget) in widgets:
+        return widgets[str(widget)]
+    return _policy.get("key_mode", "all")
+
+
+def _rate_allows(name: str, now: datetime) -> bool:
+    limit = (_policy.get("rate_limits") or {}).get(name)
+    if not limit:
+        return True
+    # kubełek żetonów: [dostępne żetony, czas ostatniego uzupełnienia]
+    stamp = now.timestamp()
+    bucket = _rate_buckets.setdefault(name, [float(limit), stamp])
+    bucket[0] = min(float(limit), bucket[0] + (stamp - bucket[1]) * limit)
+    bucket[1] = stamp
+    if bucket[0] < 1.0:
+        return False
+    bucket[0] -= 1.0
+    return True
+
+
+def _policy_allows(name: str, level: str, kwargs: Dict[str, Any], now: datetime) -> bool:
+    allowed = True
+    if _LEVELS.get(level, 20) < _LEVELS.get(str(_policy.get("min_level", "debug")).lower(), 10):
+        allowed = False
+    elif name == "key" and _key_mode(kwargs.get("widget")) == "off":
+        allowed = False
+    elif not _rate_allows(name, now):
+        allowed = False
+    if not allowed:
+        _dropped[name] = _dropped.get(name, 0) + 1
+    return allowed
+
+
 def _flush_key_buffer(reason: str) -> None:
     global _key_buffer
 
@@ -393,13 +1078,17 @@ def _flush_key_buffer(reason: str) -> None:
         "widget": buffer.get("widget"),
         "started_at": buffer.get("start_ts"),
         "ended_at": buffer.get("last_ts"),
-        "keys": buffer.get("keys", []),
         "flush_reason": reason,
     }
+    if "keys" in buffer:
+        payload["keys"] = buffer["keys"]
     if _session_id:
         payload["session_id"] = _session_id
 
     level = buffer.get("level", "info")
+    if not _rate_allows("key_sequence", datetime.now()):
+        _dropped["key_sequence"] = _dropped.get("key_sequence", 0) + 1
+        return
     when = buffer.get("last_ts")
     moment = datetime.fromisoformat(when) if isinstance(when, str) else datetime.now()
     _emit(level, payload, moment)
@@ -424,6 +1113,10 @@ def flush_pending_events(reason: str = "manual") -> None:
 @atexit.register
 def _flush_on_exit() -> None:
     flush_pending_events(reason="atexit")
+    if _dropped:
+        log_event("log_policy_dropped", counts=policy_stats())
+    if _shipper is not None:
+        _shipper.stop(final_ship=True)
 
 
 def _write_keypress_log(raw_kwargs: Dict[str, Any], when: datetime) -> None:
@@ -443,6 +1136,14 @@ def _write_keypress_log(raw_kwargs: Dict[str, Any], when: datetime) -> None:
 
 
 def log_event(name: str, level: str = "info", **kwargs: Any) -> None:
+    # zdarzenia mogą przychodzić także z wątków w tle (np. rotacja logów)
+    with _event_lock:
+        _log_event_locked(name, level, **kwargs)
+
+
+def _log_event_locked(name: str, level: str = "info", **kwargs: Any) -> None:
+    global _key_buffer
+
     try:
         _rotate_if_needed()
     except Exception:
@@ -453,7 +1154,12 @@ def log_event(name: str, level: str = "info", **kwargs: Any) -> None:
     now = datetime.now()
     lvl = (level or "info").lower()
 
-    if name == "key":
+    if not _policy_allows(name, lvl, kwargs, now):
+        return
+
+    key_mode = _key_mode(kwargs.get("widget")) if name == "key" else "all"
+
+    if name == "key" and key_mode == "all":
         _write_keypress_log(kwargs, now)
 
     if name != "key":
@@ -473,6 +1179,8 @@ def log_event(name: str, level: str = "info", **kwargs: Any) -> None:
 
     if not is_textual:
         flush_pending_events(reason="non_textual_key")
+        if key_mode == "sequence":
+            return
         payload = {"ts": now.isoformat(), "event": name}
         if _session_id:
             payload["session_id"] = _session_id
@@ -497,7 +1205,8 @@ def log_event(name: str, level: str = "info", **kwargs: Any) -> None:
         if same_user and same_widget and now - last_ts <= _KEY_SEQUENCE_TIMEOUT:
             _key_buffer["text"] += key_text
             _key_buffer["last_ts"] = entry["ts"]
-            _key_buffer.setdefault("keys", []).append(entry)
+            if "keys" in _key_buffer:
+                _key_buffer["keys"].append(entry)
             return
         _flush_key_buffer("sequence_break")
 
@@ -507,9 +1216,11 @@ def log_event(name: str, level: str = "info", **kwargs: Any) -> None:
         "widget": widget,
         "start_ts": entry["ts"],
         "last_ts": entry["ts"],
-        "keys": [entry],
         "level": lvl,
     }
+    if key_mode == "all":
+        # w trybie "sequence" szczegóły pojedynczych klawiszy nie są zapisywane
+        _key_buffer["keys"] = [entry]
 
 
 def _update_status(kind: str, is_ok: bool, details: Dict[str, Any]) -> None:
@@ -532,6 +1243,64 @@ def _update_status(kind: str, is_ok: bool, details: Dict[str, Any]) -> None:
     log_event(event_name, **details)
 
 
+class Trace:
+    """Groups the events of one operation (e.g. a scan) under a common ``trace_id``.
+
+    Every event carries ``elapsed_ms`` since the start of the trace; `span`
+    additionally measures the duration of a single step.
+    """
+
+    def __init__(self, kind: str, **fields: Any):
+        self.kind = kind
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.fields = dict(fields)
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000.0, 1)
+
+    def update(self, **fields: Any) -> None:
+        self.fields.update(fields)
+
+    def event(self, name: str, level: str = "info", **kwargs: Any) -> None:
+        payload = dict(self.fields)
+        payload.update(kwargs)
+        log_event(name, level, trace_id=self.trace_id, trace_kind=self.kind, elapsed_ms=self.elapsed_ms(), **payload)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """Log ``<name>_issued`` and ``<name>_returned`` with ``duration_ms``.
+
+        The yielded dict can be filled with result fields; an exception is
+        logged as ``<name>_failed`` and re-raised.
+        """
+        result: Dict[str, Any] = {}
+        self.event(f"{name}_issued", "debug", **kwargs)
+        start = time.perf_counter()
+        try:
+            yield result
+        except Exception as exc:
+            duration = round((time.perf_counter() - start) * 1000.0, 1)
+            self.event(f"{name}_failed", "warning", duration_ms=duration, error=str(exc), **kwargs)
+            raise
+        duration = round((time.perf_counter() - start) * 1000.0, 1)
+        self.event(f"{name}_returned", duration_ms=duration, **kwargs, **result)
+
+    def finish(self, outcome: str, level: str = "info", **kwargs: Any) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.event(f"{self.kind}_finished", level, outcome=outcome, total_ms=self.elapsed_ms(), **kwargs)
+
+
+def start_trace(kind: str, **fields: Any) -> Trace:
+    """Start a new trace and log ``<kind>_started``."""
+    trace = Trace(kind, **fields)
+    trace.event(f"{kind}_started")
+    return trace
+
+
 def log_startup(**details: Any) -> None:
     log_event("app_startup", **details)
 
@@ -558,18 +1327,7 @@ def get_logger():
 
 
 def set_extra_log_dir(path: Optional[str]):
-    global _extra_dir, _network_main_sink, _network_key_sink, _network_up
+    global _extra_dir, _network_up
     _extra_dir = path
     _network_up = None
-    if path and _app_name:
-        if _network_main_sink is None:
-            _network_main_sink = _BufferedSink(path, _app_name, suffix="", max_buffer=50000)
-        else:
-            _network_main_sink.configure(path, _app_name)
-        if _network_key_sink is None:
-            _network_key_sink = _BufferedSink(path, _app_name, suffix="_keys", max_buffer=50000)
-        else:
-            _network_key_sink.configure(path, _app_name)
-    else:
-        _network_main_sink = None
-        _network_key_sink = None
+    _configure_network(path)
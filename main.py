@@ -14,19 +14,31 @@ Kluczowe elementy:
     - `get_matching_info`, `check_inspect` – pobieranie danych z intranetu
     - `start_new_pallet`, `_do_assign`, `sync_file` – operacje na paletach i plikach
 
+Każdy skan otrzymuje `trace_id` (`logger.start_trace`), a jego zdarzenia
+(skan DMC, zapytania do intranetu, werdykt, zapisane pliki, zmiana palety)
+trafiają z czasami trwania do dziennika `logs/` w katalogu lokalnym.
+
 Plik zawiera również flagę TEST_MODE, która pozwala na uruchomienie
 aplikacji bez dostępu do serwerów intranetu (przydatne do testów).
+
+Moduły spoza UI (`requests`, `batch_export`, `scan_pipeline`, `csv`) są
+importowane dopiero przy pierwszym użyciu, a usługi tła (`sync_reconcile`,
+`day_archive`, eksport `metrics`) startują po pokazaniu okna logowania, żeby
+okno logowania pojawiało się jak najszybciej;
+`python main.py --profile-startup` wypisuje czasy importów i inicjalizacji.
 """
 
 import sys
+import profiling
+profiling.enable_if_requested(sys.argv)  # musi być przed pozostałymi importami
+
 import re
-import csv
 import os
 import json
-from turtle import color
-import requests
-import shutil
 import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
 import getpass
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
@@ -34,31 +46,40 @@ from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit,
     QVBoxLayout, QHBoxLayout, QMessageBox, QFrame,
     QPushButton, QDialog, QDialogButtonBox,
-    QFormLayout, QFileDialog, QSpinBox, QListWidget,
+    QFormLayout, QFileDialog, QSpinBox, QListView,
     QTabWidget, QComboBox, QInputDialog, 
     QAbstractItemView, QShortcut, QTableWidget, QTableWidgetItem,
-    QMainWindow, QAction, QToolBar, QSizePolicy
+    QMainWindow, QAction, QToolBar, QSizePolicy, QPlainTextEdit,
+    QCheckBox, QProgressDialog
 )
 from PyQt5.QtGui import QFont, QPalette, QColor, QRegExpValidator, QKeySequence
-from PyQt5.QtCore import Qt, QTimer, QRegExp, QSettings, QEvent
+from PyQt5.QtCore import Qt, QTimer, QRegExp, QSettings, QEvent, QAbstractListModel, QModelIndex, pyqtSignal
+
+from logger import Trace, init_logging, log_event, logger_status, start_trace, flush_pending_events
+from durable_io import write_atomic, write_csv_atomic, copy_atomic
+from search_index import UnassignedIndex
+from throughput import OUTCOME_MAP, ThroughputStats
+from scanner_input import ScannerInput, SerialScanSource
+from intranet import DEFAULT_BASE_URL, FakeIntranetClient, IntranetClient, IntranetOffline
+from verification import (
+    BATCH_HEADER, batch_rows, eol_verdict, inspect_rows, load_pallet_csv, mismatch_rows, parse_pairs,
+    piece_csv_path, recheck_eol, verdict_name, verify_many, verify_piece,
+)
+from metrics import StationMetrics
 
 
 # ============ TRYB TESTOWY =============
 HOSTNAME = socket.gethostname()
 USERNAME = getpass.getuser()
 TEST_MODE = False #(HOSTNAME == "N07WNB1559") or (USERNAME == "andrzej.florek")
+# w trybie testowym zapytania obsługuje intranet.FakeIntranetClient
+# ============ TRYB TESTOWY =============
 
-def fake_get_matching_info(self, serno, line=436):
-    # zawsze zwraca child_serno „TESTCHILD…”
-    return {"child_serno": "1"}
+# strefa czasowa znaczników w plikach CSV – tworzona raz przy starcie
+WARSAW_TZ = ZoneInfo("Europe/Warsaw")
 
-def fake_check_inspect(self, serno, inspect, line, machine):
-    # ⋅QW2_child_serno→ pusty (nie było skanu)
-    if inspect == "QW2_child_serno":
-        return []
-    # ⋅Status EOL→ zawsze OK
-    return [{"inspectdate": "2025-06-26 12:00:00", "judge": "0"}]
-# ============ TRYB TESTOWY =============
+# wynik check_inspect przy błędzie zapytania – odróżnia błąd od braku rekordów (None)
+LOOKUP_FAILED = object()
 
 # Wzorce
 dmc_regex = re.compile(r'^\d+VIT\d{14}$')
@@ -90,7 +111,9 @@ class LoginDialog(QDialog):
         super().accept()
 
 class SettingsDialog(QDialog):
-    def __init__(self, parent, local_dir, sync_dir, pallet_dir, current_counter):
+    def __init__(self, parent, local_dir, sync_dir, pallet_dir, current_counter,
+                 export_mode="piece", batch_size=0, scanner_port="", scan_mode="serial", intranet_url="",
+                 recheck_eol=False):
         super().__init__(parent)
         self.setWindowTitle("Ustawienia")
         self.local_dir = local_dir
@@ -135,6 +158,48 @@ class SettingsDialog(QDialog):
         row_counter.addWidget(lbl_cnt)
         row_counter.addWidget(self.spin_counter)
 
+        # Tryb eksportu: plik na sztukę lub plik zbiorczy (zmiana / N sztuk)
+        self.combo_export = QComboBox()
+        self.combo_export.addItem("Plik na sztukę", "piece")
+        self.combo_export.addItem("Plik zbiorczy na zmianę", "batch")
+        self.combo_export.setCurrentIndex(max(0, self.combo_export.findData(export_mode)))
+        self.spin_batch = QSpinBox()
+        self.spin_batch.setRange(0, 10000)
+        self.spin_batch.setSpecialValueText("cała zmiana")
+        self.spin_batch.setValue(int(batch_size))
+        row_export = QHBoxLayout()
+        row_export.addWidget(QLabel("Eksport:"))
+        row_export.addWidget(self.combo_export)
+        row_export.addWidget(QLabel("Sztuk w pliku:"))
+        row_export.addWidget(self.spin_batch)
+
+        # Skaner na porcie szeregowym / wirtualnym COM (puste = tylko klawiatura)
+        self.edit_scanner_port = QLineEdit(scanner_port)
+        self.edit_scanner_port.setPlaceholderText("np. COM3 lub /dev/ttyACM0; puste = klawiatura")
+        row_scanner = QHBoxLayout()
+        row_scanner.addWidget(QLabel("Port skanera:"))
+        row_scanner.addWidget(self.edit_scanner_port)
+
+        # Tryb skanowania: szeregowy lub potokowy (weryfikacja sztuki w tle)
+        self.combo_scan_mode = QComboBox()
+        self.combo_scan_mode.addItem("Szeregowy", "serial")
+        self.combo_scan_mode.addItem("Potokowy (weryfikacja w tle)", "pipelined")
+        self.combo_scan_mode.setCurrentIndex(max(0, self.combo_scan_mode.findData(scan_mode)))
+        row_scan_mode = QHBoxLayout()
+        row_scan_mode.addWidget(QLabel("Tryb skanowania:"))
+        row_scan_mode.addWidget(self.combo_scan_mode)
+
+        # Adres intranetu Traceability2 (puste = domyślny; np. lokalny stub do testów)
+        self.edit_intranet_url = QLineEdit(intranet_url)
+        self.edit_intranet_url.setPlaceholderText(DEFAULT_BASE_URL)
+        row_intranet = QHBoxLayout()
+        row_intranet.addWidget(QLabel("Adres intranetu:"))
+        row_intranet.addWidget(self.edit_intranet_url)
+
+        # Ponowne sprawdzenie EOL wszystkich sztuk przed zapisem pliku palety
+        self.check_recheck_eol = QCheckBox("Sprawdź ponownie EOL przy zamykaniu palety")
+        self.check_recheck_eol.setChecked(bool(recheck_eol))
+
         # Dialog buttons
         dlg_buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         dlg_buttons.accepted.connect(self.accept)
@@ -146,6 +211,11 @@ class SettingsDialog(QDialog):
         main_layout.addLayout(row_sync)
         main_layout.addLayout(row_counter)
         main_layout.addLayout(row_pallet) 
+        main_layout.addLayout(row_export)
+        main_layout.addLayout(row_scanner)
+        main_layout.addLayout(row_scan_mode)
+        main_layout.addLayout(row_intranet)
+        main_layout.addWidget(self.check_recheck_eol)
         main_layout.addWidget(dlg_buttons)
 
     def select_local(self):
@@ -169,44 +239,111 @@ class SettingsDialog(QDialog):
     def accept(self):
         # zapisujemy wybraną przez użytkownika wartość licznika
         self.new_counter = self.spin_counter.value()
+        self.export_mode = self.combo_export.currentData()
+        self.batch_size = self.spin_batch.value()
+        self.scanner_port = self.edit_scanner_port.text().strip()
+        self.scan_mode = self.combo_scan_mode.currentData()
+        self.intranet_url = self.edit_intranet_url.text().strip()
+        self.recheck_eol = self.check_recheck_eol.isChecked()
         super().accept()
 
+class UnassignedModel(QAbstractListModel):
+    """List model over one pallet's entry in the shared ``unassigned`` dict.
+
+    Rows are inserted/removed with begin/end signals, so the view updates
+    only the touched rows instead of rebuilding the whole list.
+    """
+
+    def __init__(self, unassigned_dict, pallet_id, parent=None):
+        super().__init__(parent)
+        self.unassigned = unassigned_dict
+        self.pallet_id = pallet_id
+
+    def items(self):
+        return self.unassigned.setdefault(self.pallet_id, [])
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.unassigned.get(self.pallet_id, []))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        itm = self.items()[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{itm['dmc']} → {itm['stack']}"
+        if role == Qt.UserRole:
+            return itm
+        return None
+
+    def append_items(self, new_items):
+        if not new_items:
+            return
+        items = self.items()
+        first = len(items)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_items) - 1)
+        items.extend(new_items)
+        self.endInsertRows()
+
+    def take_rows(self, rows):
+        """Remove ``rows`` and return their items in original order."""
+        items = self.items()
+        taken = {}
+        # usuwamy ciągłe zakresy od końca – jeden sygnał na zakres
+        for first, last in reversed(_row_ranges(rows)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for offset, itm in enumerate(items[first:last + 1]):
+                taken[first + offset] = itm
+            del items[first:last + 1]
+            self.endRemoveRows()
+        return [taken[r] for r in sorted(taken)]
+
+
+def _row_ranges(rows):
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in ranges]
+
+
 class UnassignedDialog(QDialog):
     def __init__(self, parent, unassigned_dict):
         super().__init__(parent)
         self.setWindowTitle("Nieprzypisane kody")
         self.resize(550, 400)
         self.unassigned = unassigned_dict  # dict: {pallet_id: [list]}
-        self.list_widgets = []
         self.pallet_ids = list(self.unassigned.keys())
+        # modele i widoki tworzone dopiero przy pierwszym otwarciu zakładki
+        self.models = {}
+        self.views = {}
+        # indeks DMC/stacków ze wszystkich palet – wyszukiwanie bez przeglądania zakładek
+        self.index = UnassignedIndex(self.unassigned)
+        self.search_hits = []
+        self.search_pos = -1
 
         main = QVBoxLayout(self)
+        search_row = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Szukaj DMC lub stacka (Enter – następny)")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self._on_search_changed)
+        self.search_edit.returnPressed.connect(self._next_hit)
+        self.search_label = QLabel("")
+        search_row.addWidget(self.search_edit)
+        search_row.addWidget(self.search_label)
+        main.addLayout(search_row)
         self.tabs = QTabWidget()
-        for idx, (pid, items) in enumerate(self.unassigned.items()):
+        for pid, items in self.unassigned.items():
             page = QWidget()
-            lay = QVBoxLayout(page)
-            lw = QListWidget()
-            lw.setSelectionMode(QAbstractItemView.ExtendedSelection)
-            for itm in items:
-                lw.addItem(f"{itm['dmc']} → {itm['stack']}")
-            lay.addWidget(lw)
-            self.list_widgets.append(lw)
-
-            # Przyciski Dodaj / Usuń / Przenieś
-            btn_row = QHBoxLayout()
-            btn_add = QPushButton("Dodaj")
-            btn_rm  = QPushButton("Usuń")
-            btn_mv  = QPushButton("Przenieś")
-            btn_row.addWidget(btn_add)
-            btn_row.addWidget(btn_rm)
-            btn_row.addWidget(btn_mv)
-            lay.addLayout(btn_row)
-            btn_add.clicked.connect(lambda _, i=idx: self._add_item(i))
-            btn_rm .clicked.connect(lambda _, i=idx: self._remove_item(i))
-            btn_mv .clicked.connect(lambda _, i=idx: self._move_item(i))
-
+            QVBoxLayout(page)
             self.tabs.addTab(page, f"Paleta {pid} ({len(items)})")
+        self.tabs.currentChanged.connect(self._ensure_tab)
         main.addWidget(self.tabs)
+        self._ensure_tab(self.tabs.currentIndex())
 
         btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Close)
         btns.button(QDialogButtonBox.Ok).setText("Przypisz paletę")
@@ -214,14 +351,55 @@ class UnassignedDialog(QDialog):
         btns.rejected.connect(self.reject)
         main.addWidget(btns)
 
+    def _model(self, pid):
+        model = self.models.get(pid)
+        if model is None:
+            model = UnassignedModel(self.unassigned, pid, self)
+            idx = self.pallet_ids.index(pid)
+            # licznik w nazwie zakładki podąża za modelem
+            model.rowsInserted.connect(lambda *_, i=idx: self._update_tab_text(i))
+            model.rowsRemoved.connect(lambda *_, i=idx: self._update_tab_text(i))
+            self.models[pid] = model
+        return model
+
+    def _ensure_tab(self, idx):
+        if idx < 0 or idx in self.views:
+            return
+        pid = self.pallet_ids[idx]
+        lay = self.tabs.widget(idx).layout()
+        view = QListView()
+        view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        view.setUniformItemSizes(True)
+        view.setModel(self._model(pid))
+        lay.addWidget(view)
+        self.views[idx] = view
+
+        # Przyciski Dodaj / Usuń / Przenieś
+        btn_row = QHBoxLayout()
+        btn_add = QPushButton("Dodaj")
+        btn_rm  = QPushButton("Usuń")
+        btn_mv  = QPushButton("Przenieś")
+        btn_row.addWidget(btn_add)
+        btn_row.addWidget(btn_rm)
+        btn_row.addWidget(btn_mv)
+        lay.addLayout(btn_row)
+        btn_add.clicked.connect(lambda _, i=idx: self._add_item(i))
+        btn_rm .clicked.connect(lambda _, i=idx: self._remove_item(i))
+        btn_mv .clicked.connect(lambda _, i=idx: self._move_item(i))
+
+    def _selected_rows(self, idx):
+        view = self.views.get(idx)
+        if view is None:
+            return []
+        return sorted({i.row() for i in view.selectionModel().selectedRows()})
+
     def selected_pallet_id(self):
         return self.pallet_ids[self.tabs.currentIndex()]
 
     def selected_items(self):
         idx = self.tabs.currentIndex()
-        lw = self.list_widgets[idx]
-        sel = lw.selectedIndexes()
-        return [self.unassigned[self.pallet_ids[idx]][i.row()] for i in sel]
+        items = self.unassigned[self.pallet_ids[idx]]
+        return [items[row] for row in self._selected_rows(idx)]
 
     def selected_chunk(self):
         idx = self.tabs.currentIndex()
@@ -233,21 +411,17 @@ class UnassignedDialog(QDialog):
         stack, ok2 = QInputDialog.getText(self, "Dodaj", "Kod stacka:")
         if not ok2 or not stack: return
         itm = {"dmc": dmc.strip(), "stack": stack.strip()}
-        self.unassigned[self.pallet_ids[idx]].append(itm)
-        self._refresh_tab(idx)
+        self._model(self.pallet_ids[idx]).append_items([itm])
+        self.index.add(self.pallet_ids[idx], [itm])
 
     def _remove_item(self, idx):
-        lw = self.list_widgets[idx]
-        rows = sorted({i.row() for i in lw.selectedIndexes()}, reverse=True)
+        rows = self._selected_rows(idx)
         if not rows:
             return
-        for row in rows:
-            self.unassigned[self.pallet_ids[idx]].pop(row)
-        self._refresh_tab(idx)
+        self.index.remove(self._model(self.pallet_ids[idx]).take_rows(rows))
 
     def _move_item(self, idx):
-        lw = self.list_widgets[idx]
-        rows = sorted({i.row() for i in lw.selectedIndexes()}, reverse=True)
+        rows = self._selected_rows(idx)
         if not rows:
             return
 
@@ -266,26 +440,44 @@ class UnassignedDialog(QDialog):
         if not ok or not dest_pid:
             return
 
-        # Przenosimy wybrane pozycje
-        for row in rows:
-            itm = self.unassigned[self.pallet_ids[idx]].pop(row)
-            self.unassigned[dest_pid].append(itm)
-
-        # Odśwież obie zakładki
-        dest_idx = self.pallet_ids.index(dest_pid)
-        self._refresh_tab(idx)
-        self._refresh_tab(dest_idx)
-
-    def _refresh_tab(self, idx):
-        tab = self.tabs.widget(idx)
-        lw = tab.findChild(QListWidget)
-        lw.clear()
-        for itm in self.unassigned[self.pallet_ids[idx]]:
-            lw.addItem(f"{itm['dmc']} → {itm['stack']}")
-        self.tabs.setTabText(
-            idx,
-            f"Paleta {self.pallet_ids[idx]} ({len(self.unassigned[self.pallet_ids[idx]])})"
-        )
+        # Przenosimy wybrane pozycje – oba modele emitują tylko zmienione wiersze
+        moved = self._model(self.pallet_ids[idx]).take_rows(rows)
+        self._model(dest_pid).append_items(moved)
+        self.index.add(dest_pid, moved)
+
+    def _on_search_changed(self, text):
+        self.search_hits = self.index.search(text)
+        self.search_pos = -1
+        if not text.strip():
+            self.search_label.setText("")
+            return
+        if not self.search_hits:
+            self.search_label.setText("Brak wyników")
+            return
+        self._next_hit()
+
+    def _next_hit(self):
+        if not self.search_hits:
+            return
+        self.search_pos = (self.search_pos + 1) % len(self.search_hits)
+        pid, _, itm = self.search_hits[self.search_pos]
+        # wiersz mógł się przesunąć od zapytania – ustalamy go ponownie
+        items = self.unassigned.get(pid, [])
+        row = next((r for r, candidate in enumerate(items) if candidate is itm), -1)
+        if row < 0:
+            return
+        idx = self.pallet_ids.index(pid)
+        self.tabs.setCurrentIndex(idx)
+        self._ensure_tab(idx)
+        view = self.views[idx]
+        index = view.model().index(row, 0)
+        view.setCurrentIndex(index)
+        view.scrollTo(index, QAbstractItemView.PositionAtCenter)
+        self.search_label.setText(f"{self.search_pos + 1}/{len(self.search_hits)}")
+
+    def _update_tab_text(self, idx):
+        pid = self.pallet_ids[idx]
+        self.tabs.setTabText(idx, f"Paleta {pid} ({len(self.unassigned.get(pid, []))})")
 
 class PalletDialog(QDialog):
     def __init__(self, parent=None):
@@ -343,18 +535,299 @@ class StatsDialog(QDialog):
         tbl.resizeColumnsToContents()
         layout.addWidget(tbl)
 
+class ResultTiles(QWidget):
+    """Row of per-piece result tiles for the pipelined scan mode (newest on the left)."""
+
+    MAX_TILES = 8
+    STYLES = {
+        "verifying": ("⏳", "#9e9e9e"),
+        "saving": ("💾", "#607d8b"),
+        "ok": ("✅ OK", "#2e7d32"),
+        "nok": ("❌ NOK", "#c62828"),
+        "missing": ("⚠️ BRAK", "#ef6c00"),
+        "error": ("💥 BŁĄD", "#6a1b9a"),
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.layout_tiles = QHBoxLayout(self)
+        self.layout_tiles.setContentsMargins(0, 0, 0, 0)
+        self.layout_tiles.addStretch(1)
+        self.tiles = {}  # seq -> QLabel
+        self.finished = set()
+
+    def update_job(self, job):
+        tile = self.tiles.get(job.seq)
+        if tile is None:
+            tile = QLabel()
+            tile.setAlignment(Qt.AlignCenter)
+            tile.setMinimumWidth(110)
+            self.layout_tiles.insertWidget(0, tile)
+            self.tiles[job.seq] = tile
+            # najstarsze zakończone kafelki znikają (sztuki w toku zostają)
+            excess = len(self.tiles) - self.MAX_TILES
+            for seq in sorted(self.finished)[:max(0, excess)]:
+                self.finished.discard(seq)
+                self.tiles.pop(seq).deleteLater()
+        if job.status in ("done", "error"):
+            self.finished.add(job.seq)
+        if job.status == "error":
+            key = "error"
+        elif job.status == "done":
+            key = job.result.get("verdict", "error")
+        else:
+            key = job.status
+        text, color = self.STYLES.get(key, self.STYLES["error"])
+        tile.setText(f"<b>{text}</b><br>…{job.dmc[-6:]}")
+        tile.setToolTip(f"{job.dmc}\n{job.error or ''}".strip())
+        tile.setStyleSheet(
+            f"QLabel {{ border: 2px solid {color}; border-radius: 6px; padding: 4px; color: {color}; }}"
+        )
+
+class BatchVerifyDialog(QDialog):
+    """Concurrent re-verification of a tray / returned pallet (list of DMC or DMC;stack)."""
+
+    result_ready = pyqtSignal(int, dict)
+    batch_done = pyqtSignal()
+
+    VERDICT_TEXT = {
+        "ok": "OK", "nok": "NOK", "missing": "BRAK DANYCH EOL", "mismatch": "NIEZGODNY STACK",
+        "no_data": "BRAK child_serno", "error": "BŁĄD",
+    }
+    VERDICT_COLOR = {"ok": "#c8e6c9", "nok": "#ffcdd2", "mismatch": "#ffcdd2", "missing": "#ffe0b2",
+                     "no_data": "#ffe0b2", "error": "#e1bee7"}
+
+    def __init__(self, parent, intranet, pallet_dir, workers=8):
+        super().__init__(parent)
+        self.setWindowTitle("Weryfikacja zbiorcza")
+        self.resize(900, 600)
+        self.intranet = intranet
+        self.pallet_dir = pallet_dir
+        self.workers = workers
+        self.pairs = []
+        self.results = []
+        self.cancel = threading.Event()
+        self.worker = None
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Zeskanuj lub wklej kody – w każdej linii DMC albo DMC;stack:"))
+        self.edit_codes = QPlainTextEdit()
+        self.edit_codes.setMaximumHeight(140)
+        layout.addWidget(self.edit_codes)
+
+        row = QHBoxLayout()
+        self.btn_load = QPushButton("Wczytaj CSV palety")
+        self.btn_load.clicked.connect(self.load_pallet)
+        self.btn_run = QPushButton("Weryfikuj")
+        self.btn_run.clicked.connect(self.run)
+        self.btn_export = QPushButton("Eksportuj CSV")
+        self.btn_export.clicked.connect(self.export)
+        self.btn_export.setEnabled(False)
+        self.progress_label = QLabel("")
+        row.addWidget(self.btn_load)
+        row.addWidget(self.btn_run)
+        row.addWidget(self.btn_export)
+        row.addStretch(1)
+        row.addWidget(self.progress_label)
+        layout.addLayout(row)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(BATCH_HEADER))
+        self.table.setHorizontalHeaderLabels(BATCH_HEADER)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.result_ready.connect(self._on_result)
+        self.batch_done.connect(self._on_done)
+
+    def load_pallet(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Wczytaj paletę", self.pallet_dir, "CSV (*.csv)")
+        if not path:
+            return
+        try:
+            pairs = load_pallet_csv(path)
+        except Exception as e:
+            QMessageBox.warning(self, "Błąd", f"Nie udało się wczytać pliku: {e}")
+            return
+        self.edit_codes.setPlainText("\n".join(f"{d};{st}" if st else d for d, st in pairs))
+
+    def run(self):
+        self.pairs = parse_pairs(self.edit_codes.toPlainText())
+        if not self.pairs:
+            return
+        self.results = [None] * len(self.pairs)
+        self.table.setRowCount(len(self.pairs))
+        for i, (dmc, stack) in enumerate(self.pairs):
+            self.table.setItem(i, 0, QTableWidgetItem(dmc))
+            self.table.setItem(i, 1, QTableWidgetItem(stack))
+            self.table.setItem(i, 3, QTableWidgetItem("⏳"))
+        self.done_count = 0
+        self.started = datetime.now()
+        self.btn_run.setEnabled(False)
+        self.btn_export.setEnabled(False)
+        self.cancel.clear()
+        log_event("batch_verify_started", pieces=len(self.pairs), workers=self.workers)
+        self.worker = threading.Thread(target=self._work, name="qw2-batch-verify-main", daemon=True)
+        self.worker.start()
+
+    def _work(self):
+        # wątek tła – wyniki do GUI przez sygnały
+        try:
+            verify_many(
+                self.intranet, self.pairs, self.workers,
+                on_result=lambda idx, res: self.result_ready.emit(idx, res), cancel=self.cancel
+            )
+        finally:
+            self.batch_done.emit()
+
+    def _on_result(self, idx, res):
+        self.results[idx] = res
+        self.done_count += 1
+        row = batch_rows([res])[1]
+        row[3] = self.VERDICT_TEXT.get(res.get("verdict"), row[3])
+        color = QColor(self.VERDICT_COLOR.get(res.get("verdict"), "#ffffff"))
+        for col, value in enumerate(row):
+            item = QTableWidgetItem(value)
+            item.setBackground(color)
+            self.table.setItem(idx, col, item)
+        self.progress_label.setText(f"{self.done_count}/{len(self.pairs)}")
+
+    def _on_done(self):
+        self.btn_run.setEnabled(True)
+        self.btn_export.setEnabled(any(r is not None for r in self.results))
+        self.table.resizeColumnsToContents()
+        counts = {}
+        for r in self.results:
+            if r is not None:
+                counts[r["verdict"]] = counts.get(r["verdict"], 0) + 1
+        elapsed = (datetime.now() - self.started).total_seconds()
+        self.progress_label.setText(
+            f"{self.done_count}/{len(self.pairs)} w {elapsed:.1f} s – "
+            + ", ".join(f"{self.VERDICT_TEXT.get(k, k)}: {v}" for k, v in sorted(counts.items()))
+        )
+        log_event("batch_verify_finished", pieces=self.done_count, duration_s=round(elapsed, 1), **counts)
+
+    def export(self):
+        default = os.path.join(self.pallet_dir, datetime.now().strftime("weryfikacja_%Y-%m-%d_%H-%M.csv"))
+        path, _ = QFileDialog.getSaveFileName(self, "Eksportuj wyniki", default, "CSV (*.csv)")
+        if not path:
+            return
+        try:
+            write_csv_atomic(path, batch_rows(self.results), delimiter=';')
+        except Exception as e:
+            QMessageBox.warning(self, "Błąd zapisu", f"Nie udało się zapisać pliku: {e}")
+            return
+        self.progress_label.setText(f"Zapisano {os.path.basename(path)}")
+
+    def done(self, result):
+        # zamknięcie dialogu przerywa dalsze zapytania (trwające kończą się w tle)
+        self.cancel.set()
+        super().done(result)
+
+class ThroughputDialog(QDialog):
+    """Live rolling-window panel (pieces/h, cycle time, NOK and mismatch rates)."""
+
+    def __init__(self, parent, stats, intranet=None):
+        super().__init__(parent)
+        self.setWindowTitle("Wydajność – na żywo")
+        self.resize(480, 420)
+        self.stats = stats
+        self.intranet = intranet
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        self.values = {}
+        for key, label in (
+            ("pieces_per_hour", "Sztuki / h"),
+            ("pieces", "Sztuki w oknie"),
+            ("avg_cycle_ms", "Średni czas cyklu"),
+            ("nok_rate", "NOK"),
+            ("mismatch_rate", "Niezgodny stack"),
+            ("missing_rate", "Brak danych EOL"),
+            ("errors", "Błędy (intranet / zapis)"),
+            ("intranet_calls", "Zapytania intranetu (sieć / połączone)"),
+        ):
+            value = QLabel("-")
+            value.setFont(QFont("Arial", 14, QFont.Bold))
+            form.addRow(label + ":", value)
+            self.values[key] = value
+        layout.addLayout(form)
+        self.window_label = QLabel("")
+        layout.addWidget(self.window_label)
+
+        self.recent = QTableWidget()
+        self.recent.setColumnCount(4)
+        self.recent.setHorizontalHeaderLabels(["Czas", "Wynik", "Cykl [s]", "DMC"])
+        self.recent.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.recent)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(2000)
+        self.refresh()
+
+    @staticmethod
+    def _percent(value):
+        return "-" if value is None else f"{value * 100:.1f} %"
+
+    def refresh(self):
+        snap = self.stats.snapshot()
+        self.values["pieces_per_hour"].setText(f"{snap['pieces_per_hour']:.1f}")
+        self.values["pieces"].setText(str(snap["pieces"]))
+        cycle = snap["avg_cycle_ms"]
+        self.values["avg_cycle_ms"].setText("-" if cycle is None else f"{cycle / 1000:.1f} s")
+        for key in ("nok_rate", "mismatch_rate", "missing_rate"):
+            self.values[key].setText(self._percent(snap[key]))
+        self.values["errors"].setText(str(snap["errors"]))
+        calls = self.intranet.stats() if self.intranet is not None else {}
+        self.values["intranet_calls"].setText(
+            f"{calls.get('network_calls', 0)} / {calls.get('coalesced', 0)}" if calls else "-"
+        )
+        self.window_label.setText(f"Okno kroczące: ostatnie {snap['window_minutes']:.0f} min")
+
+        recent = self.stats.ring.latest(20)
+        self.recent.setRowCount(len(recent))
+        for row, rec in enumerate(recent):
+            cycle_ms = rec.get("cycle_ms")
+            self.recent.setItem(row, 0, QTableWidgetItem(rec["ts"].strftime("%H:%M:%S")))
+            self.recent.setItem(row, 1, QTableWidgetItem(rec["outcome"].upper()))
+            self.recent.setItem(row, 2, QTableWidgetItem("-" if cycle_ms is None else f"{cycle_ms / 1000:.1f}"))
+            self.recent.setItem(row, 3, QTableWidgetItem(rec.get("dmc") or ""))
+        self.recent.resizeColumnsToContents()
+
 class TraceabilityApp(QMainWindow):
+    # zmiana stanu intranetu (z wątku roboczego / wątku próby do wątku GUI)
+    intranet_state_changed = pyqtSignal(bool, str)
+    # liczba plików czekających na wysłanie do sync_dir (z wątku uzgadniania)
+    sync_backlog_changed = pyqtSignal(int, str)
+
     def __init__(self):
         super().__init__()
         # Ustawiamy, żeby widget odbierał klawisze nawet jeśli focus jest gdzie indziej:
         self.setFocusPolicy(Qt.StrongFocus)
         self.setFocus()
         self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
-        QApplication.instance().installEventFilter(self)
         # ustawienia persistent
         self.settings = QSettings("NMAP", "BSG H66 2 QW2 Traceability App")
         self.local_dir = self.settings.value("local_dir", os.getcwd())
-        
+        # dziennik zdarzeń: lokalnie w local_dir/logs, opcjonalnie kopia na udziale
+        init_logging(
+            self.local_dir,
+            "QW2",
+            extra_dir=self.settings.value("log_extra_dir", "") or None,
+            ship_logs=str(self.settings.value("log_ship_mode", "false")).lower() == "true",
+        )
+        self.scan_trace = None
+        # bieżąca wydajność (okno kroczące) – kubełki minutowe w local_dir/stats
+        self.throughput = ThroughputStats(stats_dir=os.path.join(self.local_dir, "stats"))
+        self.throughput_dialog = None
+        # metryki stanowiska (Prometheus): liczniki aktualizowane przy każdym skanie
+        self.metrics = StationMetrics()
+        self.metrics_server = None
+        self.metrics_file = None
+        # profilowanie na żądanie (ukryta akcja w menu)
+        self.profiler = None
+        profiling.mark("logging_ready")
+
         counter_json = os.path.join(self.local_dir, "counter.json")
         if os.path.exists(counter_json):
             try:
@@ -371,6 +844,18 @@ class TraceabilityApp(QMainWindow):
 
         self.sync_dir = self.settings.value("sync_dir", os.getcwd())
         self.pallet_dir = self.settings.value("pallet_dir", os.path.join(self.local_dir, "palety"))
+        # tryb eksportu: "piece" – plik CSV na sztukę, "batch" – plik zbiorczy na zmianę / N sztuk
+        self.export_mode = self.settings.value("export_mode", "piece")
+        self.export_batch_size = int(self.settings.value("export_batch_size", 0))
+        self.batch_writer = None
+        self._configure_export()
+        self.intranet = self._create_intranet_client()
+        # "serial" – sztuka po sztuce, "pipelined" – weryfikacja i zapis w tle
+        self.scan_mode = self.settings.value("scan_mode", "serial")
+        self.pipeline = None
+        # sztuki gotowe do zaliczenia, wstrzymane na czas zaliczania / zamykania palety
+        self._commit_queue = deque()
+        self._commit_hold = 0
         self.unassigned_file = os.path.join(self.local_dir, "unassigned.json")
         # ładujemy listę: lista słowników {"dmc":…, "stack":…}
         self.unassigned = self._load_unassigned()
@@ -382,9 +867,27 @@ class TraceabilityApp(QMainWindow):
         self.last_activity = datetime.now()
         self.skip_flag = False
         self.toolbar_scale = float(self.settings.value("toolbar_scale", 1.0))
+        profiling.mark("state_loaded")
         self.init_ui()
         self.set_toolbar_scale(self.toolbar_scale)  # ustaw skalę po inicjalizacji UI
+        self._configure_scan_mode()
+        profiling.mark("ui_built")
         self.counter_label.setText(f"Sztuki: {self.good_counter}/72")
+        # opcjonalny skaner na porcie COM – kody czytane w wątku tła, niezależnie od fokusu
+        self.serial_source = None
+        self.serial_queue = deque()
+        self._serial_busy = False
+        self.serial_drain_timer = QTimer(self)
+        self.serial_drain_timer.setSingleShot(True)
+        self.serial_drain_timer.timeout.connect(self._drain_serial_queue)
+        self._configure_serial_scanner()
+        # uzgadnianie local_dir -> sync_dir w tle (pliki, których kopia się nie udała)
+        self.reconciler = None
+        # pakowanie zamkniętych dni CSV do archiwów zip (0 = wyłączone)
+        self.archiver = None
+        # uzgadnianie, archiwizacja i eksport metryk startują w pętli zdarzeń okna logowania,
+        # już po jego narysowaniu
+        QTimer.singleShot(250, self._start_background_services)
         self.init_login()  # <-- logowanie przed pokazaniem okna
         if self.badge:  # tylko jeśli login się udał
             self.showMaximized()
@@ -394,21 +897,180 @@ class TraceabilityApp(QMainWindow):
             self.start_inactivity_timer()
 
     def keyPressEvent(self, event):
-        print(f"[DEBUG] keyPressEvent: {event.key()}")  # zobaczysz w konsoli numery klawiszy
+        log_event("window_key", level="debug", key=event.key(), user=self.badge)
         if event.key() == Qt.Key_B and self.btn_skip.isVisible():
-            print("[DEBUG] przechwytuję B, wywołuję skip")
+            log_event("skip_shortcut", key="B", user=self.badge)
             self.skip_stack_scan()
         else:
             super().keyPressEvent(event)
 
-    def eventFilter(self, obj, event):
-        # kiedy wciśnięto SPACJĘ i widoczny jest przycisk skip → wywołaj skip_stack_scan
-        if event.type() == QEvent.KeyPress and event.key() == Qt.Key_Space and self.btn_skip.isVisible():
+    def _on_scanned(self, widget, code, info):
+        # kod ze skanera (albo wpisany ręcznie i zatwierdzony Enterem) – jeden sygnał na cały kod
+        if widget is self.input_dmc:
+            self.on_dmc_enter()
+        elif widget is self.hidden_scan:
+            self.on_child_enter()
+
+    def _configure_serial_scanner(self):
+        if self.serial_source is not None:
+            self.serial_source.stop()
+            self.serial_source = None
+        port = str(self.settings.value("scanner_port", "") or "").strip()
+        if not port:
+            return
+        self.serial_source = SerialScanSource(
+            port,
+            int(self.settings.value("scanner_baud", 9600)),
+            str(self.settings.value("scanner_terminator", "CR")),
+            self,
+        )
+        self.serial_source.code_received.connect(self._on_serial_code)
+        self.serial_source.status_changed.connect(self._on_serial_status)
+        self.serial_source.start()
+        log_event("serial_scanner_configured", port=port)
+
+    def _start_background_services(self):
+        # po pokazaniu okna logowania – importy i wątki tła nie opóźniają startu
+        for configure in (self._configure_reconciler, self._configure_archiver, self._configure_metrics):
+            try:
+                configure()
+            except Exception as e:
+                # usługa tła nie może zatrzymać pozostałych ani wyjść ze slotu Qt
+                log_event("background_service_failed", level="error", service=configure.__name__, error=str(e))
+
+    def _configure_reconciler(self):
+        from sync_reconcile import SyncReconciler
+
+        if self.reconciler is not None:
+            self.reconciler.stop()
+            self.reconciler = None
+        self.reconciler = SyncReconciler(
+            self.local_dir, self.sync_dir,
+            interval_s=float(self.settings.value("sync_reconcile_interval_s", 300)),
+            on_status=self.sync_backlog_changed.emit,
+        )
+        self.reconciler.start()
+
+    def _configure_archiver(self):
+        if self.archiver is not None:
+            self.archiver.stop()
+            self.archiver = None
+        keep_days = int(self.settings.value("archive_keep_days", 30))
+        if keep_days > 0:
+            from day_archive import DayArchiver
+
+            self.archiver = DayArchiver(self.local_dir, keep_days)
+            self.archiver.start()
+
+    def _configure_metrics(self):
+        from metrics import DEFAULT_PORT, MetricsFileWriter, MetricsServer
+
+        self.metrics.registry.add_collector(self._collect_metrics)
+        port = int(self.settings.value("metrics_port", DEFAULT_PORT))
+        if port > 0:
+            bind = str(self.settings.value("metrics_bind", "127.0.0.1") or "127.0.0.1")
+            try:
+                self.metrics_server = MetricsServer(self.metrics.registry, bind, port)
+                self.metrics_server.start()
+                log_event("metrics_endpoint", address=f"{bind}:{port}")
+            except OSError as e:
+                # np. port zajęty przez drugą instancję – metryki tylko w pliku
+                log_event("metrics_endpoint_failed", level="warning", address=f"{bind}:{port}", error=str(e))
+        interval = float(self.settings.value("metrics_file_interval_s", 30))
+        if interval > 0:
+            self.metrics_file = MetricsFileWriter(
+                self.metrics.registry, os.path.join(self.local_dir, "logs", "metrics.prom"), interval
+            )
+            self.metrics_file.start()
+
+    def _collect_metrics(self):
+        # wywoływane przy pobraniu metryk (wątek serwera / zapisu) – tylko odczyt stanu
+        m = self.metrics
+        m.intranet_up.set(1 if self.intranet.online else 0)
+        for kind, value in self.intranet.stats().items():
+            m.intranet_calls.set(value, kind)
+        if self.reconciler is not None:
+            m.sync_backlog.set(self.reconciler.backlog)
+        pipeline = self.pipeline
+        m.pipeline_in_flight.set((pipeline.pending() if pipeline is not None else 0) + len(self._commit_queue))
+        m.pallet_pieces.set(self.good_counter)
+
+    def _on_sync_backlog(self, backlog, error):
+        self.sync_label.setVisible(backlog > 0)
+        self.sync_label.setText(f"Niezsynchronizowane pliki: {backlog}")
+        self.sync_label.setToolTip(error or "Ponowna wysyłka w tle")
+
+    def _trigger_reconcile(self):
+        # uzgadnianie startuje po oknie logowania (lub nie wystartowało) – wtedy nadrobi przy pierwszym przebiegu
+        if self.reconciler is not None:
+            self.reconciler.trigger()
+
+    def _produced_file(self, path, synced=False):
+        """Register a written (``synced``: also copied to sync_dir) file with the reconciler; thread-safe."""
+        if self.reconciler is not None:
+            self.reconciler.note_file(path, synced=synced)
+
+    def _on_serial_status(self, connected, message):
+        if connected:
+            log_event("serial_scanner_connected", port=message)
+            self.statusBar().showMessage(f"Skaner podłączony: {message}", 5000)
+        else:
+            log_event("serial_scanner_lost", level="warning", details=message)
+            self.statusBar().showMessage(f"Brak skanera: {message}", 10000)
+
+    def _on_serial_code(self, code):
+        self.serial_queue.append(code)
+        self._drain_serial_queue()
+
+    def _drain_serial_queue(self):
+        # kody czekają w kolejce, gdy otwarty jest dialog lub trwa obsługa poprzedniego kodu
+        while self.serial_queue:
+            if self._serial_busy or QApplication.activeModalWidget() is not None:
+                self.serial_drain_timer.start(200)
+                return
+            code = self.serial_queue.popleft()
+            self._serial_busy = True
+            try:
+                self._dispatch_serial_code(code)
+            finally:
+                self._serial_busy = False
+
+    def _dispatch_serial_code(self, code):
+        if not self.badge:
+            log_event("serial_scan_ignored", level="warning", code=code, reason="not_logged_in")
+            return
+        if self.btn_skip.isVisible():
+            # oczekiwany skan stacka
+            self.hidden_scan.setText(code)
+            self.on_child_enter()
+        elif self.input_dmc.isEnabled():
+            self.input_dmc.setText(code)
+            self.on_dmc_enter()
+        else:
+            log_event("serial_scan_ignored", level="warning", code=code, reason="busy")
+
+    def _on_scan_hotkey(self, widget, key):
+        # SPACJA na pustym polu skanu stacka, gdy widoczny jest przycisk skip → skip_stack_scan
+        if key == Qt.Key_Space and self.btn_skip.isVisible():
             self.skip_stack_scan()
-            return True    # nie przekazujemy dalej
-        return super().eventFilter(obj, event)
+
+    def _report_startup(self):
+        """Log time-to-login (and the detailed profile with --profile-startup) once per run."""
+        profiling.mark("login_dialog")
+        target = float(self.settings.value("startup_target_ms", profiling.STARTUP_TARGET_MS))
+        report = profiling.finish_startup(os.path.join(self.local_dir, "logs"), target)
+        if report is None:
+            return
+        log_event(
+            "startup_time",
+            level="info" if report["within_target"] else "warning",
+            time_to_login_ms=report["time_to_login_ms"],
+            target_ms=report["target_ms"],
+            stages={s["stage"]: s["took_ms"] for s in report["stages"]},
+        )
 
     def init_login(self):
+        self._report_startup()
         if TEST_MODE:
             # tryb testowy: zawsze zalogowany, bez dialogu
             self.badge = "R-7015"
@@ -417,8 +1079,11 @@ class TraceabilityApp(QMainWindow):
         dlg = LoginDialog(self)
         if dlg.exec_() == QDialog.Accepted:
             self.badge = dlg.badge
+            log_event("user_login", user=self.badge, host=HOSTNAME)
             self.update_user_menu()  # odśwież menu po zalogowaniu
         else:
+            log_event("login_cancelled", host=HOSTNAME)
+            flush_pending_events(reason="login_cancelled")
             sys.exit()
 
     def count_pallets_for_current_shift(self):
@@ -523,12 +1188,24 @@ class TraceabilityApp(QMainWindow):
 
         action_stats = QAction("Statystyki", self)
         action_stats.triggered.connect(self.show_stats)
+        action_throughput = QAction("Wydajność (na żywo)", self)
+        action_throughput.triggered.connect(self.show_throughput)
+        action_batch_verify = QAction("Weryfikacja zbiorcza", self)
+        action_batch_verify.triggered.connect(self.show_batch_verify)
         action_settings = QAction("Ustawienia", self)
         action_settings.triggered.connect(self.open_settings)
 
         # Dodaj akcje do menu po prawej stronie
         menu.addAction(action_stats)
+        menu.addAction(action_throughput)
+        menu.addAction(action_batch_verify)
         menu.addAction(action_settings)
+        # akcja serwisowa – widoczna tylko po otwarciu menu z wciśniętym Shift (lub w trakcie sesji)
+        self.action_profiler = QAction("Profilowanie: start", self)
+        self.action_profiler.triggered.connect(self.toggle_profiler)
+        self.action_profiler.setVisible(False)
+        menu.addAction(self.action_profiler)
+        menu.aboutToShow.connect(self._reveal_service_actions)
         menubar.setCornerWidget(QWidget(), Qt.TopLeftCorner)  # aby menu było po prawej
 
         # --- pasek narzędzi ---
@@ -560,7 +1237,7 @@ class TraceabilityApp(QMainWindow):
         self.input_dmc = QLineEdit()
         self.input_dmc.setFont(font_big)
         self.input_dmc.setAlignment(Qt.AlignCenter)
-        self.input_dmc.returnPressed.connect(self.on_dmc_enter)
+        self.input_dmc.setObjectName("input_dmc")
 
         sep = QFrame()
         sep.setFrameShape(QFrame.HLine)
@@ -578,7 +1255,7 @@ class TraceabilityApp(QMainWindow):
         self.label_gauges.hide()
 
         self.hidden_scan = QLineEdit()
-        self.hidden_scan.returnPressed.connect(self.on_child_enter)
+        self.hidden_scan.setObjectName("hidden_scan")
         self.hidden_scan.setEchoMode(QLineEdit.Password)
         self.hidden_scan.setFixedSize(1,1)
 
@@ -587,10 +1264,34 @@ class TraceabilityApp(QMainWindow):
         self.btn_skip.clicked.connect(self.skip_stack_scan)
         self.btn_skip.hide()
 
+        # wejście skanera: filtr tylko na polach skanu, kod przekazywany jednym sygnałem po Enter
+        self.scanner = ScannerInput(self)
+        self.scanner.watch(self.input_dmc)
+        self.scanner.watch(self.hidden_scan, hotkeys=(Qt.Key_Space,))
+        self.scanner.scanned.connect(self._on_scanned)
+        self.scanner.hotkey.connect(self._on_scan_hotkey)
+
         self.shortcut_skip = QShortcut(QKeySequence(Qt.Key_Space), self)
         self.shortcut_skip.setContext(Qt.ApplicationShortcut)
         self.shortcut_skip.activated.connect(self.skip_stack_scan)
 
+        # stały wskaźnik awarii intranetu w pasku stanu (zamiast powtarzanych okienek błędów)
+        self.intranet_label = QLabel("⚠ Intranet offline")
+        self.intranet_label.setStyleSheet("color: white; background-color: #c62828; font-weight: bold; padding: 2px 8px;")
+        self.intranet_label.hide()
+        self.statusBar().addPermanentWidget(self.intranet_label)
+        self.intranet_state_changed.connect(self._on_intranet_state)
+        # wskaźnik plików niewysłanych do folderu traceability
+        self.sync_label = QLabel("")
+        self.sync_label.setStyleSheet("color: black; background-color: #ffb300; font-weight: bold; padding: 2px 8px;")
+        self.sync_label.hide()
+        self.statusBar().addPermanentWidget(self.sync_label)
+        self.sync_backlog_changed.connect(self._on_sync_backlog)
+
+        # kafelki wyników sztuk weryfikowanych w tle (tryb potokowy)
+        self.result_tiles = ResultTiles()
+        self.result_tiles.hide()
+
         # --- układ główny ---
         layout = QVBoxLayout()
         layout.setSpacing(20)  # Jednakowy odstęp między wszystkimi elementami
@@ -606,6 +1307,7 @@ class TraceabilityApp(QMainWindow):
         layout.addWidget(self.label_gauges)
         layout.addWidget(self.hidden_scan)
         layout.addWidget(self.btn_skip)
+        layout.addWidget(self.result_tiles)
         
         # Dodaj rozciągacz na dole aby wyśrodkować pionowo
         layout.addStretch(1)
@@ -633,6 +1335,49 @@ class TraceabilityApp(QMainWindow):
         except Exception as e:
             self.statusBar().showMessage(f"Błąd statystyk: {e}", 10000)  # 10 sekund
 
+    def show_throughput(self):
+        # panel niemodalny – można go zostawić otwartego obok okna skanowania
+        if self.throughput_dialog is None:
+            self.throughput_dialog = ThroughputDialog(self, self.throughput, self.intranet)
+        self.throughput_dialog.refresh()
+        self.throughput_dialog.show()
+        self.throughput_dialog.raise_()
+
+    def _reveal_service_actions(self):
+        shift = bool(QApplication.keyboardModifiers() & Qt.ShiftModifier)
+        self.action_profiler.setVisible(shift or self.profiler is not None)
+
+    def toggle_profiler(self):
+        if self.profiler is not None:
+            self._stop_profiler()
+            return
+        self.profiler = profiling.SamplingProfiler()
+        self.profiler.start()
+        self.action_profiler.setText("Profilowanie: stop")
+        log_event("profiler_started", interval_s=self.profiler.interval_s)
+        self.statusBar().showMessage("Profilowanie włączone", 5000)
+
+    def _stop_profiler(self):
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        self.action_profiler.setText("Profilowanie: start")
+        session = logger_status()["session_id"] or "brak"
+        path = os.path.join(self.local_dir, "logs", f"profile_{session}_{datetime.now():%Y%m%d_%H%M%S}.folded")
+        try:
+            profiler.write(path)
+        except OSError as e:
+            log_event("profiler_write_failed", level="error", path=path, error=str(e))
+            self.statusBar().showMessage(f"Nie udało się zapisać profilu: {e}", 10000)
+            return
+        log_event("profiler_stopped", path=path, samples=profiler.samples, duration_s=round(profiler.duration_s, 1))
+        self.statusBar().showMessage(f"Profil zapisany: {path}", 10000)
+
+    def show_batch_verify(self):
+        dlg = BatchVerifyDialog(
+            self, self.intranet, self.pallet_dir, int(self.settings.value("batch_verify_workers", 8))
+        )
+        dlg.exec_()
+
     def collect_stats(self):
         from collections import defaultdict
         stats = defaultdict(lambda: {"dzienna": 0, "nocna": 0})  # klucz: data (YYYY-MM-DD)
@@ -713,8 +1458,11 @@ class TraceabilityApp(QMainWindow):
     def _save_unassigned(self):
         try:
             os.makedirs(self.local_dir, exist_ok=True)
-            with open(self.unassigned_file, 'w', encoding='utf-8') as f:
-                json.dump(self.unassigned, f, ensure_ascii=False, indent=2)
+            # zapis atomowy (plik tymczasowy + fsync + rename) – brak uciętego pliku po zaniku zasilania
+            write_atomic(
+                self.unassigned_file,
+                json.dumps(self.unassigned, ensure_ascii=False, indent=2).encode("utf-8")
+            )
         except Exception as e:
             QMessageBox.warning(self, "Błąd zapisu", f"unassigned.json: {e}")
             self.statusBar().showMessage(f"unassigned.json: {e}", 10000)
@@ -724,21 +1472,23 @@ class TraceabilityApp(QMainWindow):
             QMessageBox.information(self, "Brak", "Brak nieprzypisanych kodów.")
             return
 
-        dlg = UnassignedDialog(self, self.unassigned)
-        result = dlg.exec_()
-        if result == QDialog.Accepted:
-            # 1) Pobieramy całą aktywną paletę
-            pallet_id = dlg.selected_pallet_id()
-            to_assign = dlg.selected_chunk()
-            if to_assign:
-                assigned = self._do_assign(to_assign, pid=pallet_id)
-                if assigned and pallet_id in self.unassigned:
-                    del self.unassigned[pallet_id]
-                    self._save_unassigned()
-                    self.statusBar().showMessage(f"Przypisano paletę {pallet_id}", 30000)
-        else:
-            # nawet jeśli dialog zamknięto bez przypisania, zapisujemy zmiany (np. dodane/usunięte kody)
-            self._save_unassigned()
+        # okno edytuje i zamyka palety – sztuki z potoku czekają na jego zamknięcie
+        with self._holding_commits():
+            dlg = UnassignedDialog(self, self.unassigned)
+            result = dlg.exec_()
+            if result == QDialog.Accepted:
+                # 1) Pobieramy całą aktywną paletę
+                pallet_id = dlg.selected_pallet_id()
+                to_assign = dlg.selected_chunk()
+                if to_assign:
+                    assigned = self._do_assign(to_assign, pid=pallet_id)
+                    if assigned and pallet_id in self.unassigned:
+                        del self.unassigned[pallet_id]
+                        self._save_unassigned()
+                        self.statusBar().showMessage(f"Przypisano paletę {pallet_id}", 30000)
+            else:
+                # nawet jeśli dialog zamknięto bez przypisania, zapisujemy zmiany (np. dodane/usunięte kody)
+                self._save_unassigned()
 
     def generate_pallet_id(self):
         """Zwraca nowy ID palety w formacie YYYYMMDD_001 lub prosty liczbowy."""
@@ -757,48 +1507,59 @@ class TraceabilityApp(QMainWindow):
 
     def start_new_pallet(self):
         """Ręcznie rozpocznij nową pustą paletę z potwierdzeniem i możliwością przypisania obecnej."""
-        chunk = self.unassigned.get(self.current_pallet_id)
-        if self.current_pallet_id and chunk:
-            reply = QMessageBox.question(
-                self,
-                "Nowa paleta",
-                "Czy na pewno rozpocząć nową paletę?\n"
-                "Aktualna zostanie zakończona i przypisana do palety.",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
-            )
-            if reply != QMessageBox.Yes:
-                return
-            # Przypisz aktualną paletę jak po 72 sztukach
-            if chunk:
-                self._do_assign(chunk, pid=self.current_pallet_id)
+        # sztuki z potoku trafiają na paletę dopiero po jej zamknięciu / rozpoczęciu nowej
+        with self._holding_commits():
+            chunk = self.unassigned.get(self.current_pallet_id)
+            if self.current_pallet_id and chunk:
+                reply = QMessageBox.question(
+                    self,
+                    "Nowa paleta",
+                    "Czy na pewno rozpocząć nową paletę?\n"
+                    "Aktualna zostanie zakończona i przypisana do palety.",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    return
+                # Przypisz aktualną paletę jak po 72 sztukach
+                if not self._do_assign(chunk, pid=self.current_pallet_id):
+                    # odmowa po weryfikacji EOL, anulowanie lub błąd zapisu – paleta zostaje bieżącą
+                    self.statusBar().showMessage(
+                        f"Paleta {self.current_pallet_id} nie została przypisana – nowa paleta nie została rozpoczęta", 30000
+                    )
+                    return
                 del self.unassigned[self.current_pallet_id]
                 self._save_unassigned()
-        else:
-            reply = QMessageBox.question(
-                self,
-                "Nowa paleta",
-                "Czy na pewno rozpocznij nową paletę?",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
-            )
-            if reply != QMessageBox.Yes:
-                return
+            else:
+                reply = QMessageBox.question(
+                    self,
+                    "Nowa paleta",
+                    "Czy na pewno rozpocznij nową paletę?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    return
 
-        self.current_pallet_id = self.generate_pallet_id()
-        self.unassigned[self.current_pallet_id] = []
-        self._save_unassigned()
-        self.good_counter = 0
-        self.update_counter_labels()
-        self.settings.setValue("good_counter", self.good_counter)
+            self.current_pallet_id = self.generate_pallet_id()
+            self.unassigned[self.current_pallet_id] = []
+            self._save_unassigned()
+            self.good_counter = 0
+            self.update_counter_labels()
+            self.settings.setValue("good_counter", self.good_counter)
 
     def start_inactivity_timer(self):
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.check_inactivity)
         self.timer.start(60000)
+        # zamknięcie partii eksportu po końcu zmiany, także gdy nie ma już skanów
+        self.batch_timer = QTimer(self)
+        self.batch_timer.timeout.connect(self.publish_export_batch)
+        self.batch_timer.start(60000)
 
     def check_inactivity(self):
         if datetime.now() - self.last_activity > timedelta(minutes=30):
+            log_event("inactivity_logout", user=self.badge)
             QMessageBox.information(self, "Wylogowanie", "Brak aktywności. Wylogowano.")
             self.logout()
 
@@ -806,6 +1567,7 @@ class TraceabilityApp(QMainWindow):
         self.last_activity = datetime.now()
 
     def logout(self):
+        log_event("user_logout", user=self.badge)
         self.badge = None
         self.timer.stop()
         self.init_login()
@@ -837,11 +1599,40 @@ class TraceabilityApp(QMainWindow):
         self.unassigned[self.current_pallet_id] = []
         self._save_unassigned()
 
+    def _configure_export(self):
+        if self.export_mode == "batch":
+            from batch_export import ShiftBatchWriter  # import leniwy – potrzebny tylko w trybie zbiorczym
+            self.batch_writer = ShiftBatchWriter(self.local_dir, self.sync_dir, self.export_batch_size)
+            self.publish_export_batch()
+        else:
+            if self.batch_writer is not None and self.batch_writer.state.get("file"):
+                # zmiana trybu – domykamy rozpoczętą partię
+                self.batch_writer.publish()
+            self.batch_writer = None
+
+    def publish_export_batch(self):
+        if self.batch_writer is None:
+            return
+        try:
+            published = self.batch_writer.publish_if_due()
+        except Exception as e:
+            self.statusBar().showMessage(f"Błąd publikacji pliku zbiorczego: {e}", 60000)
+            return
+        if published:
+            self.statusBar().showMessage(f"Opublikowano plik zbiorczy: {os.path.basename(published[-1])}", 15000)
+        elif self.batch_writer.state.get("unpublished"):
+            self.statusBar().showMessage("Plik zbiorczy czeka na publikację (brak dostępu do folderu traceability)", 60000)
+
     def open_settings(self):
         dlg = SettingsDialog(
             self,
             self.local_dir, self.sync_dir, self.pallet_dir,
-            self.good_counter
+            self.good_counter,
+            self.export_mode, self.export_batch_size,
+            str(self.settings.value("scanner_port", "") or ""),
+            self.scan_mode,
+            str(self.settings.value("intranet_url", "") or ""),
+            str(self.settings.value("pallet_recheck_eol", "false")).lower() == "true",
         )
         if dlg.exec_() == QDialog.Accepted:
             # katalogi
@@ -852,6 +1643,35 @@ class TraceabilityApp(QMainWindow):
             self.settings.setValue("local_dir",  self.local_dir)
             self.settings.setValue("sync_dir",   self.sync_dir)
             self.settings.setValue("pallet_dir", self.pallet_dir)  # <<< nowość
+            reconciler = self.reconciler
+            if reconciler is None or (reconciler.local_dir, reconciler.sync_dir) != (self.local_dir, self.sync_dir):
+                self._configure_reconciler()
+                self._configure_archiver()
+
+            self.export_mode = dlg.export_mode
+            self.export_batch_size = dlg.batch_size
+            self.settings.setValue("export_mode", self.export_mode)
+            self.settings.setValue("export_batch_size", self.export_batch_size)
+            self._configure_export()
+
+            self.scan_mode = dlg.scan_mode
+            self.settings.setValue("scan_mode", self.scan_mode)
+            self._configure_scan_mode()
+
+            if dlg.scanner_port != str(self.settings.value("scanner_port", "") or ""):
+                self.settings.setValue("scanner_port", dlg.scanner_port)
+                self._configure_serial_scanner()
+
+            if dlg.intranet_url != str(self.settings.value("intranet_url", "") or ""):
+                self.settings.setValue("intranet_url", dlg.intranet_url)
+                self.intranet.close()
+                self.intranet = self._create_intranet_client()
+                self.intranet_label.hide()
+                if self.throughput_dialog is not None:
+                    self.throughput_dialog.intranet = self.intranet
+                log_event("intranet_url_changed", url=dlg.intranet_url or DEFAULT_BASE_URL)
+
+            self.settings.setValue("pallet_recheck_eol", "true" if dlg.recheck_eol else "false")
 
             # stan licznika…
             self.good_counter = dlg.new_counter
@@ -860,38 +1680,99 @@ class TraceabilityApp(QMainWindow):
             # self.counter_label.setText(f"Sztuki: {self.good_counter}/72")
             self.update_counter_labels()
 
+    def _trace_event(self, name, level="info", trace=None, **kwargs):
+        """Zdarzenie w ramach skanu (z trace_id) lub zwykłe zdarzenie poza skanem.
+
+        Bez ``trace`` używany jest bieżący skan; w trybie potokowym sztuki w tle mają własny trace.
+        """
+        trace = trace if trace is not None else self.scan_trace
+        if trace is not None and not trace.finished:
+            trace.event(name, level, **kwargs)
+        else:
+            log_event(name, level, user=self.badge, **kwargs)
+
+    def _finish_trace(self, outcome, level="info", trace=None, **kwargs):
+        current = trace is None
+        trace = self.scan_trace if current else trace
+        if trace is not None and not trace.finished:
+            self.metrics.scan(outcome, trace.elapsed_ms())
+            if outcome in OUTCOME_MAP:
+                self.throughput.record(outcome, trace.elapsed_ms(), dmc=trace.fields.get("dmc"))
+            trace.finish(outcome, level, **kwargs)
+        if current:
+            self.scan_trace = None
+
+    def _lookup_span(self, endpoint, **kwargs):
+        trace = self.scan_trace
+        if trace is None or trace.finished:
+            # zapytanie poza skanem – własny trace_id, bez zdarzeń start/koniec
+            trace = Trace("lookup", user=self.badge)
+        return trace.span("lookup", endpoint=endpoint, **kwargs)
+
+    def _create_intranet_client(self):
+        # zapytania do intranetu; przy awarii obwód otwiera się i zapytania kończą się od razu.
+        # W TEST_MODE bez adresu – stałe odpowiedzi; z adresem (np. intranet_stub.py) – prawdziwy klient HTTP
+        url = str(self.settings.value("intranet_url", "") or "").strip()
+        replay = str(self.settings.value("intranet_replay", "") or "").strip()
+        if replay:
+            # odtwarzanie nagranego dnia zamiast sieci (testy wydajności na prawdziwym ruchu)
+            from intranet_replay import ReplayClient
+
+            client = ReplayClient(
+                replay, float(self.settings.value("intranet_replay_scale", 1.0)),
+                on_state_change=self.intranet_state_changed.emit,
+            )
+            client.observer = self.metrics.intranet_request
+            log_event("intranet_replay", path=replay, requests=len(client.entries), scale=client.time_scale)
+            return client
+        if TEST_MODE and not url:
+            return FakeIntranetClient()
+        client = IntranetClient(url or None, on_state_change=self.intranet_state_changed.emit)
+        client.observer = self.metrics.intranet_request
+        if str(self.settings.value("intranet_record", "false")).lower() == "true":
+            from intranet_replay import TrafficRecorder
+
+            path = os.path.join(self.local_dir, "logs", f"intranet_{datetime.now():%Y%m%d_%H%M%S}.jsonl.gz")
+            client.recorder = TrafficRecorder(path, client.base_url)
+            log_event("intranet_recording", path=path)
+        return client
+
+    def _on_intranet_state(self, online, message):
+        self.intranet_label.setVisible(not online)
+        if online:
+            log_event("intranet_online")
+            self.statusBar().showMessage("Intranet dostępny", 5000)
+        else:
+            log_event("intranet_offline", level="error", details=message)
+            self.intranet_label.setToolTip(message)
+
+    def _lookup_failed(self, serno, error):
+        if isinstance(error, IntranetOffline) or not self.intranet.online:
+            # obwód otwarty – wskaźnik w pasku stanu zamiast kolejnego okienka
+            self.statusBar().showMessage("Intranet offline – poczekaj na przywrócenie połączenia", 5000)
+        else:
+            QMessageBox.critical(self, f"Błąd pobierania danych z intranetu dla {serno}", f"{error}")
+
     def get_matching_info(self, serno, line=436):
         self.record_activity()
         try:
-            resp = requests.get(
-                "http://intranet/Traceability2/getMaching/",
-                params={"line": line, "machine": "", "serno_out": serno}
-            )
-            resp.raise_for_status()
-            data = resp.json()
+            with self._lookup_span("getMaching", serno=serno, line=line) as result:
+                data = self.intranet.get_matching_info(serno, line, result=result)
         except Exception as e:
-            QMessageBox.critical(self, f"Błąd pobierania danych z intranetu dla {serno}", f"{e}")
+            self._lookup_failed(serno, e)
             return None
-        if not isinstance(data, dict):
+        if data is None:
             QMessageBox.critical(self, f"Błąd danych", f"Brak danych o {serno} w intranecie.")
         return data
 
     def check_inspect(self, serno, inspect, line, machine):
         self.record_activity()
         try:
-            resp = requests.get(
-                "http://intranet/Traceability2/getInspect/",
-                params={"line": line, "machine": machine, "inspect": inspect, "serno": serno}
-            )
-            resp.raise_for_status()
-            data = resp.json()
+            with self._lookup_span("getInspect", serno=serno, inspect=inspect, line=line, machine=machine) as result:
+                return self.intranet.check_inspect(serno, inspect, line, machine, result=result)
         except Exception as e:
-            QMessageBox.critical(self, f"Błąd pobierania danych z intranetu dla {serno}", f"{e}")
-            return None
-        
-        if isinstance(data, list) and data:
-            return data
-        return None
+            self._lookup_failed(serno, e)
+            return LOOKUP_FAILED
 
     def on_dmc_enter(self):
         self.record_activity()
@@ -899,17 +1780,31 @@ class TraceabilityApp(QMainWindow):
             QMessageBox.warning(self, "Brak badge", "Zaloguj się przed skanowaniem.")
             return
         code = self.input_dmc.text().strip()
+        # poprzedni skan porzucony bez skanu stacka – zamykamy jego trace
+        self._finish_trace("abandoned", "warning")
+        self.scan_trace = start_trace("scan", dmc=code, user=self.badge, host=HOSTNAME)
         if not dmc_regex.match(code):
+            self._finish_trace("invalid_dmc", "warning")
             QMessageBox.warning(self, "Błąd", "Niepoprawny format DMC.")
             self.input_dmc.clear()
             return
+        if not self.intranet.online:
+            self._finish_trace("lookup_error", "warning", offline=True)
+            self.statusBar().showMessage("Intranet offline – skan DMC wstrzymany do przywrócenia połączenia", 5000)
+            self.input_dmc.clear()
+            return
         existing = self.check_inspect(
             self.input_dmc.text().strip(),
             "QW2_child_serno",
             436,
             3661
         )
+        if existing is LOOKUP_FAILED:
+            self._finish_trace("lookup_error", "error", offline=not self.intranet.online)
+            self.input_dmc.clear()
+            return
         if existing:
+            self._trace_event("already_checked", "warning", stage="dmc")
             QMessageBox.information(
                 self, "Status QW2",
                 "Sztuka była już sprawdzona na QW2."
@@ -918,22 +1813,28 @@ class TraceabilityApp(QMainWindow):
         self.label_gauges.hide()
         self.statusBar().showMessage("Szukanie...", 10000)
         QApplication.processEvents()
-        try:
-            info = self.get_matching_info(code)
-        except Exception as e:
-            QMessageBox.critical(self, "Błąd pobierania", str(e))
-            self.statusBar().showMessage(f"Błąd pobierania: {str(e)}", 10000)
+        info = self.get_matching_info(code)
+        if info is None:
+            # błąd lub brak danych – komunikat pokazał już get_matching_info
+            self._finish_trace("lookup_error", "error", offline=not self.intranet.online)
+            self.input_dmc.clear()
             return
         child = info.get("child_serno")
         if not child:
+            self._finish_trace("no_child_serno", "warning")
             QMessageBox.warning(self, "Brak danych", f"Nie znaleziono child_serno dla {code}")
             return
         self.dmc_code, self.child_serno = code, child
+        self.scan_trace.update(child_serno=child)
+        self._trace_event("dmc_scanned")
         self.child_label.setText(child)
         self.child_label.show()
         self.instruction.setText("2) Zeskanuj kod stacka (child_serno):")
         self.statusBar().showMessage("Oczekuję...", 10000)
         self.input_dmc.setDisabled(True)
+        # pole stacka musi być puste – inaczej kolejny skan dopisałby się do poprzedniego
+        self.hidden_scan.clear()
+        self.scanner.reset(self.hidden_scan)
         self.hidden_scan.setFocus()
         self.btn_skip.show()
 
@@ -945,6 +1846,14 @@ class TraceabilityApp(QMainWindow):
         # wywołujemy tę samą logikę, ale z flagą skip
         self.on_child_enter()
 
+    def _ask_stack_rescan(self, message):
+        # sztuka nie jest zapisywana – DMC zostaje, operator skanuje stack jeszcze raz
+        self.statusBar().showMessage(message, 10000)
+        if hasattr(self, "skip_flag"): del self.skip_flag
+        self.hidden_scan.clear()
+        self.scanner.reset(self.hidden_scan)
+        self.hidden_scan.setFocus()
+
     def on_child_enter(self):
         self.record_activity()
 
@@ -953,18 +1862,31 @@ class TraceabilityApp(QMainWindow):
             scan = self.child_serno
         else:
             scan = self.hidden_scan.text().strip()
+        self._trace_event("stack_scanned", stack=scan, skipped=bool(skip), match=(scan == self.child_serno))
 
-        existing = self.check_inspect(
-            self.dmc_code,
-            "QW2_child_serno",
-            436,
-            3661
-        )
-        if existing:
-            QMessageBox.information(
-                self, "Status QW2",
-                "Sztuka była już sprawdzona na QW2."
+        pipelined = self.pipeline is not None
+        if not pipelined and not self.intranet.online:
+            # bez intranetu nie ma werdyktu EOL – czekamy na ponowny skan stacka zamiast zapisu „brak danych”
+            self._trace_event("intranet_offline", "warning", stage="stack")
+            self._ask_stack_rescan("Intranet offline – zeskanuj stack ponownie po przywróceniu połączenia")
+            return
+        if not pipelined:
+            existing = self.check_inspect(
+                self.dmc_code,
+                "QW2_child_serno",
+                436,
+                3661
             )
+            if existing is LOOKUP_FAILED:
+                self._trace_event("lookup_failed", "warning", stage="stack", endpoint="QW2_child_serno")
+                self._ask_stack_rescan("Błąd zapytania do intranetu – zeskanuj stack ponownie")
+                return
+            if existing:
+                self._trace_event("already_checked", "warning", stage="stack")
+                QMessageBox.information(
+                    self, "Status QW2",
+                    "Sztuka była już sprawdzona na QW2."
+                )
 
         insps = []
 
@@ -994,7 +1916,9 @@ class TraceabilityApp(QMainWindow):
                     break
                 else:
                     QMessageBox.warning(self, "Błąd", "Niepoprawny format badge (R-7015). Podaj poprawny numer badge.")
+            self._trace_event("mismatch_approved", approver=badge)
             self._log_mismatch(badge)
+            self._finish_trace("stack_mismatch", "warning", approver=badge)
             self.label_gauges.setText(
                 f"<span style='font-size:48pt; color:red; font-weight:bold'>❌Stack NIEPRAWIDŁOWY ❌</span>"
             )
@@ -1008,18 +1932,20 @@ class TraceabilityApp(QMainWindow):
         else:
             insps.append(("STACK", "OK", False))
 
+        if pipelined:
+            # weryfikacja EOL, zapis i zatwierdzenie na palecie w tle – operator skanuje kolejną sztukę
+            self._submit_piece(skip)
+            return
+
         eol_list = self.check_inspect(self.child_serno, "Status", 436, 3504)
-        if not eol_list:
-            missing = True
-            eol_ok = False
+        if eol_list is LOOKUP_FAILED:
+            # błąd zapytania to nie „brak danych EOL” – sztuka bez zapisu, ponowny skan stacka
+            self._trace_event("lookup_failed", "warning", stage="stack", endpoint="Status")
+            self._ask_stack_rescan("Błąd zapytania o status EOL – zeskanuj stack ponownie")
+            return
+        eol_ok, missing = eol_verdict(eol_list)
+        if missing:
             insps.append(("EOL", False, True))
-        else:
-            latest = max(
-                eol_list,
-                key=lambda x: datetime.strptime(x["inspectdate"], "%Y-%m-%d %H:%M:%S")
-            )
-            missing = False
-            eol_ok = (latest.get("judge") == "1")
         insps.append(("EOL", eol_ok, False))
 
         # Podsumowanie
@@ -1032,6 +1958,8 @@ class TraceabilityApp(QMainWindow):
         else:
             summary_text = "✅ OK ✅"
             color = "green"
+        verdict = verdict_name(eol_ok, missing)
+        self._trace_event("verdict", verdict=verdict, eol_ok=eol_ok, eol_missing=missing)
 
         # Duży status na środku
         self.label_gauges.setText(
@@ -1056,114 +1984,240 @@ class TraceabilityApp(QMainWindow):
         # gauge_judge = '1' if gauge_ok else '0'
 
         # Save CSV
-        ts = datetime.now(ZoneInfo("Europe/Warsaw"))
+        ts = datetime.now(WARSAW_TZ)
         ts_str = ts.strftime("%Y-%m-%d %H:%M:%S")
-        fn = ts.strftime("%Y%m%d%H%M") + f"_{self.dmc_code}.csv"
-        date_dir = os.path.join(self.local_dir,
-                                 ts.strftime("%Y"), ts.strftime("%m"), ts.strftime("%Y-%m-%d"))
         try:
-            os.makedirs(date_dir, exist_ok=True)
-            path = os.path.join(date_dir, fn)
-            rows = []
-            rows.append(["INSPECT","",ts_str,"436","ZI01-0010-0920","3661","ZI01-0010-0920-0380","139596023","505-455-99-99","1",self.dmc_code,"QW2_WpcRfid",self.badge,'-','-','0'])
-            rows.append(["INSPECT","",ts_str,"436","ZI01-0010-0920","3504","ZI01-0010-0920-0380","139596023","505-455-00-00","1",self.dmc_code,"QW2_EOL_Status", 'OK' if eol_ok else 'NOK','1' if eol_ok else '0','-','0'])
-            if missing:
-                rows.append(["INSPECT","",ts_str,"436","ZI01-0010-0920","3504","ZI01-0010-0920-0380","139596023","505-455-00-00","1",self.dmc_code,"QW2_EOL_Missing_data",'NOK','0','-','0'])
-            if skip:
-                rows.append([
-                    "INSPECT","",ts_str,
-                    "436","ZI01-0010-0920","3661","ZI01-0010-0920-0380",
-                    "139596023","505-455-99-99","1",
-                    self.dmc_code,"QW2_child_serno",
-                    "BRAK","2","-","0"
-                ])
+            rows = inspect_rows(self.dmc_code, self.badge, ts_str, eol_ok, missing, bool(skip))
+            if self.batch_writer is not None:
+                # tryb zbiorczy: dopisanie do pliku partii; zamkniętą partię publikuje timer (bez czekania na udział)
+                closed = self.batch_writer.append(rows, ts)
+                self._trace_event(
+                    "batch_appended", rows=len(rows), pieces=self.batch_writer.pending_pieces, closed=closed
+                )
             else:
-                rows.append([
-                    "INSPECT","",ts_str,
-                    "436","ZI01-0010-0920","3661","ZI01-0010-0920-0380",
-                    "139596023","505-455-99-99","1",
-                    self.dmc_code,"QW2_child_serno",
-                    "OK","1","-","0"
-                ])        
-            # Gauge row with dynamic status
-            # rows.append(["INSPECT","",ts_str,"436","ZI01-0010-0920","3661","ZI01-0010-0920-0380","139596023","505-455-99-99","1",self.dmc_code,"QW2_Gauge",gauge_status,gauge_judge,'-','0'])
-            with open(path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')  # <-- używamy średnika
-                writer.writerows(rows)
-            self.sync_file(path)
+                path = piece_csv_path(self.local_dir, ts, self.dmc_code)
+                write_csv_atomic(path, rows, delimiter=';')  # <-- używamy średnika
+                self._trace_event("file_written", path=path, rows=len(rows))
+                self._produced_file(path)
+                self.sync_file(path)
         except Exception as e:
+            self._finish_trace("file_error", "error", error=str(e))
             QMessageBox.warning(self, "Błąd zapisu pliku", f"Nie udało się zapisać pliku CSV: {e}")
             self.statusBar().showMessage(f"Błąd zapisu pliku: {e}", 10000)
             return
 
         # Przy CMM override sztuka zaliczana tylko jeśli EOL OK
         if eol_ok:
-            self.good_counter += 1
-            self.update_counter_labels()
-            self.settings.setValue("good_counter", self.good_counter)
-            self.unassigned.setdefault(self.current_pallet_id, []).append({
-                "dmc": self.dmc_code,
-                "stack": self.child_serno
-            })
-            self._save_unassigned()
+            self._count_good_piece(self.dmc_code, self.child_serno)
+        self._check_pallet_full()
+
+        # wyłączamy tryb skip i chowamy przycisk
+        self.btn_skip.hide()
+        if skip:
+            if hasattr(self, "skip_flag"): del self.skip_flag
 
-# Pobierz aktualną listę dla palety
+        self._finish_trace(verdict, skipped=bool(skip))
+
+        # Reset UI
+        self.input_dmc.setEnabled(True)
+        self.input_dmc.clear()
+        self.input_dmc.setFocus()
+        self.instruction.setText("1) Zeskanuj kod DMC klienta:")
+
+    def _count_good_piece(self, dmc, child_serno, trace=None):
+        self.good_counter += 1
+        self.update_counter_labels()
+        self.settings.setValue("good_counter", self.good_counter)
+        self.unassigned.setdefault(self.current_pallet_id, []).append({
+            "dmc": dmc,
+            "stack": child_serno
+        })
+        self._save_unassigned()
+        self._trace_event("piece_counted", trace=trace, pallet_id=self.current_pallet_id, good_counter=self.good_counter)
+
+    def _check_pallet_full(self, trace=None):
+        # Pobierz aktualną listę dla palety
         current_pallet = self.unassigned.get(self.current_pallet_id, [])
-        if self.good_counter >= 72:
-            if not current_pallet:
-                QMessageBox.warning(self, "Błąd", "Nie można przypisać pustej palety – brak nieprzypisanych sztuk.")
-                # Reset liczników i utwórz nową paletę, ale nie przypisuj pustej
-                self.good_counter = 0
-                self.update_counter_labels()
-                self.settings.setValue("good_counter", self.good_counter)
-                self.current_pallet_id = self.generate_pallet_id()
-                self.unassigned[self.current_pallet_id] = []
-                self._save_unassigned()
-                return
-            reply = QMessageBox.question(
-                self, "Pełna paleta",
-                "Osiągnięto 72 sztuki. Przypisać paletę teraz?",
-                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
-            )
-            if reply == QMessageBox.Yes:
-                self._do_assign(current_pallet, pid=self.current_pallet_id)
-                if self.current_pallet_id in self.unassigned:
-                    del self.unassigned[self.current_pallet_id]
-                    self._save_unassigned()
+        if self.good_counter < 72:
+            return
+        self._trace_event("pallet_full", trace=trace, pallet_id=self.current_pallet_id, pieces=len(current_pallet))
+        if not current_pallet:
+            QMessageBox.warning(self, "Błąd", "Nie można przypisać pustej palety – brak nieprzypisanych sztuk.")
+            # Reset liczników i utwórz nową paletę, ale nie przypisuj pustej
             self.good_counter = 0
             self.update_counter_labels()
             self.settings.setValue("good_counter", self.good_counter)
             self.current_pallet_id = self.generate_pallet_id()
             self.unassigned[self.current_pallet_id] = []
             self._save_unassigned()
+            self._trace_event("pallet_rollover", trace=trace, pallet_id=self.current_pallet_id, assigned=False)
+            return
+        reply = QMessageBox.question(
+            self, "Pełna paleta",
+            "Osiągnięto 72 sztuki. Przypisać paletę teraz?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+        )
+        assigned = False
+        if reply == QMessageBox.Yes:
+            assigned = self._do_assign(current_pallet, pid=self.current_pallet_id)
+            if not assigned:
+                # paleta zostaje nieprzypisana i bieżąca – sztuki i licznik bez zmian
+                self._trace_event("pallet_not_assigned", "warning", trace=trace, pallet_id=self.current_pallet_id)
+                self.statusBar().showMessage(
+                    f"Paleta {self.current_pallet_id} nie została przypisana – przypisz ją przez „Nieprzypisane” "
+                    "lub „Nowa paleta”", 60000
+                )
+                return
+            if self.current_pallet_id in self.unassigned:
+                del self.unassigned[self.current_pallet_id]
+                self._save_unassigned()
+        closed_pallet = self.current_pallet_id
+        self.good_counter = 0
+        self.update_counter_labels()
+        self.settings.setValue("good_counter", self.good_counter)
+        self.current_pallet_id = self.generate_pallet_id()
+        self.unassigned[self.current_pallet_id] = []
+        self._save_unassigned()
+        self._trace_event(
+            "pallet_rollover", trace=trace,
+            closed_pallet=closed_pallet, pallet_id=self.current_pallet_id, assigned=assigned
+        )
 
+    # --- tryb potokowy -------------------------------------------------------
+
+    def _configure_scan_mode(self):
+        if self.scan_mode == "pipelined" and self.pipeline is None:
+            from scan_pipeline import ScanPipeline  # import leniwy – tylko w trybie potokowym
+
+            self.pipeline = ScanPipeline(
+                self._verify_job, self._persist_job,
+                workers=int(self.settings.value("pipeline_workers", 2)), parent=self
+            )
+            self.pipeline.piece_updated.connect(self.result_tiles.update_job)
+            self.pipeline.piece_ready.connect(self._commit_piece)
+        elif self.scan_mode != "pipelined" and self.pipeline is not None:
+            # dokończ sztuki w toku przed powrotem do trybu szeregowego
+            self.pipeline.drain()
+            self.pipeline.shutdown()
+            self.pipeline = None
+        self.result_tiles.setVisible(self.pipeline is not None)
+
+    def _submit_piece(self, skip):
+        trace = self.scan_trace
+        self.scan_trace = None  # kolejny skan dostaje własny trace
+        from scan_pipeline import PieceJob
+
+        job = PieceJob(self.dmc_code, self.child_serno, bool(skip), self.badge, trace)
+        self.pipeline.submit(job)
+        self._trace_event("piece_queued", trace=trace, seq=job.seq, in_flight=self.pipeline.pending())
 
-        # wyłączamy tryb skip i chowamy przycisk
         self.btn_skip.hide()
         if skip:
             if hasattr(self, "skip_flag"): del self.skip_flag
-
-        # Reset UI
+        self.label_gauges.hide()
         self.input_dmc.setEnabled(True)
         self.input_dmc.clear()
         self.input_dmc.setFocus()
         self.instruction.setText("1) Zeskanuj kod DMC klienta:")
 
+    def _verify_job(self, job):
+        # wątek roboczy – bez widgetów; zapytania w ramach trace sztuki
+        span = None
+        if job.trace is not None:
+            span = lambda endpoint, **kw: job.trace.span("lookup", endpoint=endpoint, **kw)
+        job.result = verify_piece(self.intranet, job.dmc, job.child_serno, span=span)
+        self._trace_event(
+            "verdict", trace=job.trace,
+            verdict=job.result["verdict"], eol_ok=job.result["eol_ok"], eol_missing=job.result["missing"]
+        )
+
+    def _persist_job(self, job):
+        # wątek zapisu (jeden) – sztuki przychodzą w kolejności skanowania
+        ts = datetime.now(WARSAW_TZ)
+        r = job.result
+        rows = inspect_rows(job.dmc, job.badge, ts.strftime("%Y-%m-%d %H:%M:%S"), r["eol_ok"], r["missing"], job.skipped)
+        batch_writer = self.batch_writer
+        if batch_writer is not None:
+            closed = batch_writer.append(rows, ts)
+            self._trace_event("batch_appended", trace=job.trace, rows=len(rows), closed=closed)
+            return
+        path = piece_csv_path(self.local_dir, ts, job.dmc)
+        write_csv_atomic(path, rows, delimiter=';')
+        job.path = path
+        self._trace_event("file_written", trace=job.trace, path=path, rows=len(rows))
+        self._produced_file(path)
+        dest = os.path.join(self.sync_dir, os.path.basename(path))
+        started = datetime.now()
+        try:
+            copy_atomic(path, dest)
+        except Exception as e:
+            # plik lokalny jest zapisany – błąd kopii nie wstrzymuje zaliczenia sztuki
+            job.result["sync_error"] = str(e)
+            self._trace_event("sync_failed", "error", trace=job.trace, path=path, error=str(e))
+            self._trigger_reconcile()
+            return
+        self._produced_file(path, synced=True)
+        self._trace_event(
+            "file_synced", trace=job.trace, path=dest,
+            duration_ms=round((datetime.now() - started).total_seconds() * 1000.0, 1)
+        )
+
+    def _commit_piece(self, job):
+        """Ordered commit of a background-verified piece to the pallet (GUI thread)."""
+        self._commit_queue.append(job)
+        self._release_commits()
+
+    def _release_commits(self):
+        # okna zamykania palety i drain() uruchamiają zagnieżdżone pętle zdarzeń, w których
+        # przychodzi kolejne piece_ready – taka sztuka czeka w kolejce na koniec bieżącej operacji
+        if self._commit_hold:
+            return
+        self._commit_hold += 1
+        try:
+            while self._commit_queue:
+                self._commit_one(self._commit_queue.popleft())
+        finally:
+            self._commit_hold -= 1
+
+    @contextmanager
+    def _holding_commits(self):
+        """Hold pipelined pieces back while a pallet is being edited or closed."""
+        self._commit_hold += 1
+        try:
+            yield
+        finally:
+            self._commit_hold -= 1
+        self._release_commits()
+
+    def _commit_one(self, job):
+        if job.error:
+            outcome = "lookup_error" if job.error_stage == "verify" else "file_error"
+            self._finish_trace(outcome, "error", trace=job.trace, error=job.error)
+            self.statusBar().showMessage(f"Błąd sztuki {job.dmc}: {job.error} – zeskanuj ją ponownie", 30000)
+            return
+        r = job.result
+        if r.get("already_checked"):
+            self._trace_event("already_checked", "warning", trace=job.trace, stage="stack")
+        if r.get("sync_error"):
+            self.statusBar().showMessage(f"Nie udało się zsynchronizować: {r['sync_error']}", 60000)
+        if r["eol_ok"]:
+            self._count_good_piece(job.dmc, job.child_serno, trace=job.trace)
+        self._check_pallet_full(trace=job.trace)
+        self._finish_trace(r["verdict"], trace=job.trace, skipped=job.skipped, seq=job.seq)
+
     def _log_mismatch(self, approver):
-        ts = datetime.now(ZoneInfo("Europe/Warsaw"))
+        ts = datetime.now(WARSAW_TZ)
         ts_str = ts.strftime("%Y-%m-%d %H:%M:%S")
         fn = ts.strftime("%Y%m%d%H%M") + f"_{self.dmc_code}.csv"
         path = os.path.join(self.local_dir, fn)
-        row = ["INSPECT","",ts_str,"436","ZI01-0010-0920","3661","ZI01-0010-0920-0380","139596023","505-455-99-99","1",self.dmc_code,"QW2_WpcRfid",self.badge,'0','-','0']
-        row_child = ["INSPECT","",ts_str,"436","ZI01-0010-0920","3661","ZI01-0010-0920-0380","139596023","505-455-99-99","1",self.dmc_code,"QW2_child_serno",'NOK','0','-','0']
-        row_badge = ["INSPECT","",ts_str,"436","ZI01-0010-0920","3661","ZI01-0010-0920-0380","139596023","505-455-99-99","1",self.dmc_code,"QW2_Approver",approver,'0','-','0']
         try:
-            with open(path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')
-                writer.writerow(row)
-                writer.writerow(row_child)
-                writer.writerow(row_badge)
+            write_csv_atomic(path, mismatch_rows(self.dmc_code, self.badge, approver, ts_str), delimiter=';')
+            self._trace_event("file_written", path=path, rows=3, kind="mismatch")
+            # plik niezgodności trafia do sync_dir przez uzgadnianie w tle
+            self._produced_file(path)
+            self._trigger_reconcile()
         except Exception as e:
+            self._trace_event("file_write_failed", "error", path=path, kind="mismatch", error=str(e))
             QMessageBox.warning(self, "Błąd zapisu", f"Nie udało się zapisać pliku niezgodności: {e}")
             self.statusBar().showMessage(f"Nie udało się zapisać pliku niezgodności: {e}", 10000)
 
@@ -1173,28 +2227,99 @@ class TraceabilityApp(QMainWindow):
             os.makedirs(self.sync_dir, exist_ok=True)
             # Kopiujemy plik bezpośrednio do self.sync_dir
             dest = os.path.join(self.sync_dir, os.path.basename(local_path))
-            shutil.copy(local_path, dest)
+            started = datetime.now()
+            copy_atomic(local_path, dest)
+            self._produced_file(local_path, synced=True)
+            self._trace_event(
+                "file_synced", path=dest,
+                duration_ms=round((datetime.now() - started).total_seconds() * 1000.0, 1)
+            )
         except Exception as e:
-            QMessageBox.warning(self, "Sync error", f"Nie udało się zsynchronizować: {e}")
-            self.statusBar().showMessage(f"Nie udało się zsynchronizować: {e}", 60000)
+            self._trace_event("sync_failed", "error", path=local_path, error=str(e))
+            # plik jest zapisany lokalnie – uzgadnianie w tle ponowi wysyłkę, wskaźnik pokazuje zaległości
+            self._trigger_reconcile()
+            self.statusBar().showMessage(f"Nie udało się zsynchronizować (ponowię w tle): {e}", 60000)
+
+    def _recheck_pallet_eol(self, items, pid=None):
+        """Re-query EOL of every piece concurrently; return False when the pallet must not be written."""
+        pairs = [(itm["dmc"], itm["stack"]) for itm in items]
+        workers = int(self.settings.value("pallet_recheck_workers", 8))
+        progress = QProgressDialog("Ponowna weryfikacja EOL sztuk palety...", "Anuluj", 0, len(pairs), self)
+        progress.setWindowTitle("Zamykanie palety")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        finished = []  # indeksy gotowych sztuk (append z wątków puli)
+        outcome = {}
+        cancel = threading.Event()
+
+        def run():
+            outcome["results"] = verify_many(
+                self.intranet, pairs, workers, on_result=lambda idx, _res: finished.append(idx),
+                cancel=cancel, task=recheck_eol,
+            )
+
+        started = datetime.now()
+        worker = threading.Thread(target=run, name="qw2-pallet-recheck", daemon=True)
+        worker.start()
+        # pętla zdarzeń działa dalej – pasek postępu i przycisk Anuluj reagują w trakcie zapytań
+        while worker.is_alive():
+            progress.setValue(len(finished))
+            QApplication.processEvents()
+            if progress.wasCanceled():
+                cancel.set()
+            worker.join(0.05)
+        progress.setValue(len(pairs))
+        progress.close()
+        if cancel.is_set():
+            log_event("pallet_recheck_cancelled", level="warning", user=self.badge, pallet_id=pid)
+            return False
+
+        flagged = [r for r in outcome.get("results", []) if r is not None and r.get("verdict") != "ok"]
+        log_event(
+            "pallet_recheck", user=self.badge, pallet_id=pid, pieces=len(pairs), flagged=len(flagged),
+            duration_ms=int((datetime.now() - started).total_seconds() * 1000),
+        )
+        if not flagged:
+            return True
+        for r in flagged:
+            log_event("pallet_recheck_flagged", level="warning", user=self.badge, pallet_id=pid,
+                      dmc=r["dmc"], stack=r["stack"], verdict=r["verdict"], error=r.get("error", ""))
+        labels = {"nok": "NOK", "missing": "BRAK DANYCH", "error": "BŁĄD"}
+        lines = [f"{r['dmc']} ({r['stack']}): {labels.get(r['verdict'], r['verdict'])}" for r in flagged[:15]]
+        if len(flagged) > 15:
+            lines.append(f"... i {len(flagged) - 15} więcej")
+        reply = QMessageBox.warning(
+            self, "Zmiana statusu EOL",
+            f"{len(flagged)} sztuk palety nie ma już statusu EOL OK:\n\n" + "\n".join(lines)
+            + "\n\nZapisać plik palety mimo to? (Nie – paleta zostaje nieprzypisana, "
+              "oznaczone sztuki można usunąć w oknie „Nieprzypisane”.)",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No,
+        )
+        return reply == QMessageBox.Yes
 
     def _do_assign(self, items_to_assign, pid=None):
+        if str(self.settings.value("pallet_recheck_eol", "false")).lower() == "true":
+            if not self._recheck_pallet_eol(items_to_assign, pid):
+                return False
         dlg = PalletDialog(self)
         if dlg.exec_() == QDialog.Accepted:
             paleta, zmiana = dlg.pallet_code, dlg.shift
-            ts = datetime.now(ZoneInfo("Europe/Warsaw"))
+            ts = datetime.now(WARSAW_TZ)
             fname = ts.strftime("%Y-%m-%d_%H-%M") + f"_{paleta}_{zmiana}.csv"
             dest_folder = self.pallet_dir
             try:
                 os.makedirs(dest_folder, exist_ok=True)
                 path = os.path.join(dest_folder, fname)
-                with open(path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["Kod Vitesco", "Stack", "Paleta", "Zmiana"])
-                    for itm in items_to_assign:
-                        writer.writerow([itm["dmc"], itm["stack"], paleta, zmiana])
+                rows = [["Kod Vitesco", "Stack", "Paleta", "Zmiana"]]
+                rows.extend([itm["dmc"], itm["stack"], paleta, zmiana] for itm in items_to_assign)
+                write_csv_atomic(path, rows, delimiter=',')
+                log_event(
+                    "pallet_assigned", user=self.badge, pallet_id=pid, pallet=paleta, shift=zmiana,
+                    pieces=len(items_to_assign), path=path
+                )
                 return True
             except Exception as e:
+                log_event("file_write_failed", level="error", user=self.badge, kind="pallet", pallet_id=pid, error=str(e))
                 QMessageBox.warning(self, "Błąd zapisu", f"Nie udało się zapisać pliku palety: {e}")
                 self.statusBar().showMessage(f"Błąd zapisu pliku palety: {e}", 10000)
         return False
@@ -1205,6 +2330,33 @@ class TraceabilityApp(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, "Błąd zapisu", f"Nie udało się zapisać licznika: {e}")
             self.statusBar().showMessage(f"Nie udało się zapisać licznika: {e}", 10000)
+        self._finish_trace("app_closed", "warning")
+        if self.pipeline is not None:
+            # sztuki zeskanowane przed zamknięciem muszą zostać zapisane i zaliczone
+            if not self.pipeline.drain():
+                log_event("pipeline_not_drained", level="error", pending=self.pipeline.pending())
+            self.pipeline.shutdown()
+        if self._commit_queue:
+            # zamknięcie w trakcie zamykania palety – sztuki są zapisane w CSV, ale nie zaliczone na paletę
+            log_event("pipeline_commits_pending", level="error",
+                      dmcs=[job.dmc for job in self._commit_queue])
+        if self.profiler is not None:
+            self._stop_profiler()  # profil z sesji przerwanej zamknięciem też się przyda
+        log_event("app_closed", user=self.badge, good_counter=self.good_counter)
+        log_event("intranet_stats", **self.intranet.stats())
+        self.intranet.close()
+        if self.serial_source is not None:
+            self.serial_source.stop()
+        if self.reconciler is not None:
+            self.reconciler.stop()
+        if self.archiver is not None:
+            self.archiver.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.metrics_file is not None:
+            self.metrics_file.stop()
+        self.throughput.flush()
+        flush_pending_events(reason="close")
         super().closeEvent(event)
 
     def set_toolbar_scale(self, scale=1.0):
@@ -1253,12 +2405,9 @@ class TraceabilityApp(QMainWindow):
         return super().event(event)
 
 if __name__ == "__main__":
-    # ============ TRYB TESTOWY =============
-    if TEST_MODE:
-        TraceabilityApp.get_matching_info = fake_get_matching_info
-        TraceabilityApp.check_inspect    = fake_check_inspect
-    # ============ TRYB TESTOWY =============
+    profiling.mark("imports_done")
     app = QApplication(sys.argv)
+    profiling.mark("qapplication")
     win = TraceabilityApp()
     win.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+Metryki stanowiska w formacie tekstowym Prometheus.
+
+Liczniki i histogramy są aktualizowane przy każdym skanie i zapytaniu do
+intranetu (słownik + blokada, bez I/O). Wartości stanu – zaległości
+synchronizacji, bufory dziennika (`logger.logger_status`), dostępność
+intranetu, udziału logów i dysku – odczytywane są dopiero przy pobraniu
+metryk przez funkcje zbierające (`Registry.add_collector`).
+
+Udostępnianie:
+- `MetricsServer` – lokalny endpoint HTTP `GET /metrics` (domyślnie
+  `127.0.0.1:9466`, `QSettings` `metrics_bind` / `metrics_port`, 0 wyłącza),
+- `MetricsFileWriter` – okresowy zapis `<local_dir>/logs/metrics.prom`
+  (format kolektora plików node_exportera).
+
+`StationMetrics` powstaje przed oknem logowania, więc `http.server`
+i `durable_io` są importowane dopiero przy uruchomieniu eksportu.
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from logger import log_event, logger_status
+
+DEFAULT_PORT = 9466
+# granice kubełków histogramów [s]
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CYCLE_BUCKETS = (1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the value directly (gauges, or counters mirrored from another component)."""
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # na etykiety: liczności kubełków (bez kumulacji), suma, liczba
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0.0] * (len(self.buckets) + 3)
+            data[idx] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        names = self.label_names + ("le",)
+        for key, data in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, key + (_fmt(bound),))} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {_fmt(data[-1])}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_fmt(data[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {_fmt(data[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        """``fn`` refreshes gauges right before each render (scrape or file write)."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass  # błąd jednego źródła nie blokuje pozostałych metryk
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StationMetrics:
+    """The station's metric set; ``scan`` / ``intranet_request`` are cheap enough for every event."""
+
+    def __init__(self):
+        self.registry = Registry()
+        r = self.registry
+        self.scans = r.register(Counter("qw2_scans_total", "Zakończone skany wg wyniku.", ("outcome",)))
+        self.cycle = r.register(Histogram("qw2_scan_cycle_seconds", "Czas cyklu skanu (DMC -> wynik).",
+                                          buckets=CYCLE_BUCKETS))
+        self.intranet_latency = r.register(Histogram(
+            "qw2_intranet_request_seconds", "Czas zapytań sieciowych do intranetu.", ("endpoint", "result")))
+        self.intranet_calls = r.register(Counter(
+            "qw2_intranet_lookups_total", "Zapytania klienta intranetu wg rodzaju obsługi.", ("kind",)))
+        self.intranet_up = r.register(Gauge("qw2_intranet_up", "1 – intranet dostępny (obwód zamknięty)."))
+        self.sync_backlog = r.register(Gauge("qw2_sync_backlog_files", "Pliki niepotwierdzone w sync_dir."))
+        self.pipeline_in_flight = r.register(Gauge("qw2_pipeline_in_flight", "Sztuki w trybie potokowym w toku."))
+        self.pallet_pieces = r.register(Gauge("qw2_pallet_pieces", "Sztuki zaliczone na bieżącej palecie."))
+        self.log_buffer = r.register(Gauge(
+            "qw2_log_buffer_records", "Wpisy dziennika buforowane przy niedostępnym celu.", ("sink",)))
+        self.log_network_up = r.register(Gauge("qw2_log_network_up", "1 – udział sieciowy logów dostępny."))
+        self.log_disk_up = r.register(Gauge("qw2_log_disk_up", "1 – zapis logów na dysk lokalny działa."))
+        r.add_collector(self._collect_logger)
+
+    def scan(self, outcome: str, cycle_ms: Optional[float] = None) -> None:
+        self.scans.inc(outcome)
+        if cycle_ms is not None:
+            self.cycle.observe(cycle_ms / 1000.0)
+
+    def intranet_request(self, endpoint: str, ms: float, ok: bool) -> None:
+        self.intranet_latency.observe(ms / 1000.0, endpoint, "ok" if ok else "error")
+
+    def _collect_logger(self) -> None:
+        status = logger_status()
+        for sink, depth in status["buffered"].items():
+            self.log_buffer.set(depth, sink)
+        if status["network_up"] is not None:
+            self.log_network_up.set(1 if status["network_up"] else 0)
+        if status["disk_up"] is not None:
+            self.log_disk_up.set(1 if status["disk_up"] else 0)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+def _handler_class():
+    from http.server import BaseHTTPRequestHandler
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass  # każdy scrape w dzienniku to szum
+
+    return _Handler
+
+
+class MetricsServer:
+    """``GET /metrics`` on a daemon thread."""
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        from http.server import ThreadingHTTPServer
+
+        self.httpd = ThreadingHTTPServer((host, port), _handler_class())
+        self.httpd.daemon_threads = True
+        self.httpd.registry = registry
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="qw2-metrics", daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MetricsFileWriter:
+    """Periodically writes the rendered metrics to ``path`` (atomic replace)."""
+
+    def __init__(self, registry: Registry, path: str, interval_s: float = 30.0):
+        self.registry = registry
+        self.path = path
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="qw2-metrics-file", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def write(self) -> None:
+        from durable_io import write_atomic
+
+        write_atomic(self.path, self.registry.render().encode("utf-8"))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.write()
+            except Exception as exc:
+                log_event("metrics_write_failed", level="warning", path=self.path, error=str(exc))
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self.write()  # stan z chwili zamknięcia
+        except Exception:
+            pass
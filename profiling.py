@@ -0,0 +1,272 @@
+"""
+Pomiary czasu uruchomienia aplikacji QW2.
+
+Po restarcie stacji (np. po zaniku zasilania) operator czeka na okno
+logowania, dlatego mierzymy czas "do okna logowania" przy każdym starcie
+(zdarzenie `startup_time` w dzienniku, z progiem `STARTUP_TARGET_MS`).
+
+Z opcją `--profile-startup`:
+    python main.py --profile-startup
+dodatkowo rejestrowane są czasy importu modułów (hak na `__import__`)
+oraz etapy inicjalizacji (`mark`), a raport trafia do
+`<local_dir>/logs/startup_profile.json` i na standardowe wyjście.
+
+Profilowanie na żądanie w trakcie pracy (`SamplingProfiler`): wątek tła
+co `SAMPLE_INTERVAL_S` odczytuje stosy wszystkich wątków
+(`sys._current_frames`) – bez haków na każde wywołanie, więc narzut jest
+stały i mały także na stanowisku produkcyjnym, a w wyniku są też wątki
+weryfikacji, zapisu i synchronizacji. Próbki trafiają do pliku w formacie
+„folded” (wiersz = stos rozdzielony `;` + liczba próbek, zgodny
+z flamegraph.pl / speedscope), np.
+`<local_dir>/logs/profile_<session_id>_<czas>.folded`.
+
+Najgorętsze funkcje z zapisanego profilu:
+    python profiling.py hotspots logs/profile_….folded --top 25 [--thread MainThread]
+"""
+
+import builtins
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# docelowy czas od początku importów `main.py` do pokazania okna logowania
+STARTUP_TARGET_MS = 2000.0
+PROFILE_FLAG = "--profile-startup"
+# okres próbkowania profilera na żądanie (100 Hz)
+SAMPLE_INTERVAL_S = 0.01
+# bezpiecznik: sesja zapomniana przez serwis kończy się sama
+MAX_SESSION_S = 30 * 60
+
+_t0 = time.perf_counter()
+_enabled = False
+_marks: List[Tuple[str, float]] = []
+_imports: Dict[str, float] = {}
+_import_depth = 0
+_original_import = builtins.__import__
+_reported = False
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    global _import_depth
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    # liczymy tylko importy najwyższego poziomu – czas zawiera ich zależności
+    _import_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _import_depth -= 1
+        if _import_depth == 0:
+            _imports[name] = _imports.get(name, 0.0) + (time.perf_counter() - start) * 1000.0
+
+
+def enable_if_requested(argv: List[str]) -> bool:
+    """Turn on detailed profiling when ``--profile-startup`` is in ``argv`` (the flag is removed)."""
+    global _enabled
+    if PROFILE_FLAG not in argv:
+        return False
+    argv.remove(PROFILE_FLAG)
+    _enabled = True
+    builtins.__import__ = _timed_import
+    return True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def mark(name: str) -> None:
+    """Record that startup stage ``name`` has been reached."""
+    _marks.append((name, elapsed_ms()))
+
+
+def elapsed_ms() -> float:
+    return (time.perf_counter() - _t0) * 1000.0
+
+
+def startup_report(target_ms: Optional[float] = None) -> Dict[str, Any]:
+    target = STARTUP_TARGET_MS if target_ms is None else float(target_ms)
+    total = elapsed_ms()
+    stages = []
+    prev = 0.0
+    for name, at in _marks:
+        stages.append({"stage": name, "at_ms": round(at, 1), "took_ms": round(at - prev, 1)})
+        prev = at
+    report: Dict[str, Any] = {
+        "time_to_login_ms": round(total, 1),
+        "target_ms": target,
+        "within_target": total <= target,
+        "stages": stages,
+    }
+    if _enabled:
+        slowest = sorted(_imports.items(), key=lambda kv: kv[1], reverse=True)
+        report["imports"] = [{"module": m, "ms": round(ms, 1)} for m, ms in slowest]
+    return report
+
+
+def finish_startup(logs_dir: Optional[str], target_ms: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Close the startup measurement (once) and write/print the profile if enabled."""
+    global _reported
+    if _reported:
+        return None
+    _reported = True
+    report = startup_report(target_ms)
+    if _enabled:
+        builtins.__import__ = _original_import
+        if logs_dir:
+            try:
+                os.makedirs(logs_dir, exist_ok=True)
+                with open(os.path.join(logs_dir, "startup_profile.json"), "w", encoding="utf-8") as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+            except OSError:
+                pass
+        _print_report(report)
+    return report
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    status = "OK" if report["within_target"] else "PRZEKROCZONY"
+    print(f"Czas do okna logowania: {report['time_to_login_ms']:.0f} ms "
+          f"(cel {report['target_ms']:.0f} ms – {status})")
+    for stage in report["stages"]:
+        print(f"  {stage['stage']:24s} +{stage['took_ms']:8.1f} ms  (@{stage['at_ms']:.1f} ms)")
+    print("Najwolniejsze importy:")
+    for item in report.get("imports", [])[:15]:
+        print(f"  {item['module']:24s} {item['ms']:8.1f} ms")
+
+
+# --- profilowanie na żądanie --------------------------------------------------
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample the stacks of all threads at a fixed interval; results are folded stacks with counts."""
+
+    def __init__(self, interval_s: float = SAMPLE_INTERVAL_S, max_duration_s: float = MAX_SESSION_S):
+        self.interval_s = interval_s
+        self.max_duration_s = max_duration_s
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration_s = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="qw2-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = self.started_at + self.max_duration_s
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = self._labels.get(code)
+                    if label is None:
+                        label = self._labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+            if time.perf_counter() >= deadline:
+                break
+        self.duration_s = time.perf_counter() - self.started_at
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for key, count in sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True):
+                f.write(f"{key} {count}\n")
+
+
+def load_folded(path: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                counts[stack] = counts.get(stack, 0) + int(count)
+    return counts
+
+
+def hotspots(counts: Dict[str, int], top: int = 20, thread: Optional[str] = None) -> Dict[str, Any]:
+    """Rank functions by own samples (top of stack) and by samples they appear in (inclusive)."""
+    own: Dict[str, int] = {}
+    inclusive: Dict[str, int] = {}
+    total = 0
+    for key, count in counts.items():
+        frames = key.split(";")
+        if thread is not None and frames[0] != thread:
+            continue
+        frames = frames[1:]
+        total += count
+        if not frames:
+            continue
+        own[frames[-1]] = own.get(frames[-1], 0) + count
+        for name in set(frames):  # rekurencja liczona raz na próbkę
+            inclusive[name] = inclusive.get(name, 0) + count
+
+    def ranked(table):
+        rows = sorted(table.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        return [{"function": name, "samples": n, "pct": round(100.0 * n / total, 1) if total else 0.0}
+                for name, n in rows]
+
+    return {"samples": total, "self": ranked(own), "inclusive": ranked(inclusive)}
+
+
+def _print_hotspots(report: Dict[str, Any]) -> None:
+    print(f"Próbek: {report['samples']}")
+    for title, key in (("Czas własny", "self"), ("Czas łączny (z wywołanymi)", "inclusive")):
+        print(f"{title}:")
+        for row in report[key]:
+            print(f"  {row['pct']:5.1f}%  {row['samples']:7d}  {row['function']}")
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile stanowiska QW2")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_hot = sub.add_parser("hotspots", help="najgorętsze funkcje z pliku .folded")
+    p_hot.add_argument("path")
+    p_hot.add_argument("--top", type=int, default=20)
+    p_hot.add_argument("--thread", help="tylko wskazany wątek (np. MainThread)")
+    p_hot.add_argument("--json", action="store_true", help="wynik jako JSON")
+    args = parser.parse_args(argv)
+
+    report = hotspots(load_folded(args.path), args.top, args.thread)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_hotspots(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Tryb potokowy skanowania: weryfikacja i zapis sztuki N w tle, podczas
+gdy operator skanuje już sztukę N+1.
+
+Przebieg zadania (`PieceJob`):
+1. weryfikacja (zapytania do intranetu) – pula `workers` wątków, sztuki
+   mogą kończyć się w dowolnej kolejności,
+2. zapis (CSV / partia eksportu + kopia do `sync_dir`) – jeden wątek,
+   zadania przekazywane ściśle w kolejności skanowania,
+3. zatwierdzenie na palecie – sygnał `piece_ready` w wątku GUI, również
+   w kolejności skanowania (licznik, `unassigned`, pełna paleta).
+
+Zmiany stanu zadań (`piece_updated`) służą do odświeżania kafelków
+wyników. Wyniki z wątków trafiają do wątku GUI sygnałami Qt.
+"""
+
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+
+class PieceJob:
+    """One scanned piece travelling through the pipeline."""
+
+    def __init__(self, dmc: str, child_serno: str, skipped: bool, badge: str, trace=None):
+        self.seq = 0
+        self.dmc = dmc
+        self.child_serno = child_serno
+        self.skipped = skipped
+        self.badge = badge
+        self.trace = trace
+        # verifying -> saving -> done | error
+        self.status = "verifying"
+        self.result: Dict[str, Any] = {}
+        self.path: Optional[str] = None
+        self.error: Optional[str] = None
+        self.error_stage: Optional[str] = None
+        self.queued_at = time.perf_counter()
+
+
+class ScanPipeline(QObject):
+    """Parallel verification, ordered persistence and ordered commit of scanned pieces."""
+
+    piece_updated = pyqtSignal(object)
+    piece_ready = pyqtSignal(object)
+    # sygnały wewnętrzne: z wątków roboczych do wątku GUI
+    _verified = pyqtSignal(object)
+    _persisted = pyqtSignal(object)
+
+    def __init__(self, verify: Callable[[PieceJob], None], persist: Callable[[PieceJob], None],
+                 workers: int = 2, parent=None):
+        super().__init__(parent)
+        self._verify_fn = verify
+        self._persist_fn = persist
+        self._verify_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="qw2-verify")
+        self._persist_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qw2-persist")
+        self._seq = itertools.count(1)
+        self._next_persist = 1
+        self._verified_jobs: Dict[int, PieceJob] = {}
+        self._in_flight: Dict[int, PieceJob] = {}
+        self._verified.connect(self._on_verified)
+        self._persisted.connect(self._on_persisted)
+
+    def pending(self) -> int:
+        return len(self._in_flight)
+
+    def submit(self, job: PieceJob) -> PieceJob:
+        job.seq = next(self._seq)
+        self._in_flight[job.seq] = job
+        self.piece_updated.emit(job)
+        self._verify_pool.submit(self._run_stage, self._verify_fn, job, "verify", self._verified)
+        return job
+
+    @staticmethod
+    def _run_stage(fn, job: PieceJob, stage: str, done_signal) -> None:
+        if job.error is None:
+            try:
+                fn(job)
+            except Exception as exc:  # błąd trafia do kafelka i dziennika, potok działa dalej
+                job.error = str(exc)
+                job.error_stage = stage
+        done_signal.emit(job)
+
+    def _on_verified(self, job: PieceJob) -> None:
+        self._verified_jobs[job.seq] = job
+        # zapis w kolejności skanowania – czekamy na wcześniejsze sztuki
+        while self._next_persist in self._verified_jobs:
+            ready = self._verified_jobs.pop(self._next_persist)
+            self._next_persist += 1
+            if ready.error is None:
+                ready.status = "saving"
+                self.piece_updated.emit(ready)
+            self._persist_pool.submit(self._run_stage, self._persist_fn, ready, "persist", self._persisted)
+
+    def _on_persisted(self, job: PieceJob) -> None:
+        # jeden wątek zapisu – sztuki przychodzą już w kolejności skanowania
+        self._in_flight.pop(job.seq, None)
+        job.status = "error" if job.error else "done"
+        self.piece_updated.emit(job)
+        self.piece_ready.emit(job)
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Process events until every submitted piece has been committed (e.g. before exit)."""
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            QApplication.processEvents()
+            time.sleep(0.02)
+        return not self._in_flight
+
+    def shutdown(self) -> None:
+        self._verify_pool.shutdown(wait=False)
+        self._persist_pool.shutdown(wait=False)
@@ -0,0 +1,181 @@
+"""
+Obsługa wejścia ze skanera w trybie klawiatury (keyboard wedge).
+
+`ScannerInput` jest filtrem zdarzeń instalowanym tylko na polach skanu
+(`input_dmc`, `hidden_scan`), a nie na całej aplikacji. Znaki są zbierane
+we własnym buforze i wpisywane do pola jednym `insert` (po przerwie
+w pisaniu lub po Enter), zamiast przetwarzania i odświeżania pola przy każdym
+klawiszu. Enter kończy kod, który jest przekazywany jednym sygnałem
+`scanned(widget, code, info)`.
+
+`SerialScanSource` przenosi kody ze skanera na porcie szeregowym
+(`serial_scanner.SerialScannerReader`, wątek tła) do wątku GUI sygnałem
+`code_received` – niezależnie od tego, które okno ma fokus.
+
+Seria jest rozpoznawana po odstępach między klawiszami wg znaczników
+czasu zdarzeń (`QKeyEvent.timestamp()`), czyli czasu naciśnięcia, a nie
+obsłużenia klawisza – przycięcie UI nie rozbija serii. Zdarzenia klawiszy
+stojące w kolejce podczas przycięcia trafiają do bufora w kolejności, więc
+znaki nie giną.
+"""
+
+import time
+from typing import Dict, Optional
+
+from PyQt5.QtCore import QEvent, QObject, Qt, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QLineEdit
+
+from logger import log_event
+
+# maksymalny odstęp między znakami jednej serii ze skanera [ms]
+BURST_GAP_MS = 40
+# minimalna długość kodu, by uznać serię za skan (a nie szybkie pisanie)
+BURST_MIN_LEN = 6
+# po takim czasie bez klawiszy bufor jest pokazywany w polu (ręczne pisanie)
+IDLE_FLUSH_MS = 60
+
+_TERMINATORS = (Qt.Key_Return, Qt.Key_Enter)
+
+
+class _Burst:
+    __slots__ = ("pending", "first_ts", "last_ts", "max_gap", "keys", "clean")
+
+    def __init__(self):
+        self.pending = ""
+        # pole było puste przed pierwszym znakiem (kod nie jest dopisany do ręcznie wpisanego tekstu)
+        self.clean = False
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.max_gap = 0
+        self.keys = 0
+
+    def add(self, text: str, ts: int) -> None:
+        if self.last_ts is not None:
+            self.max_gap = max(self.max_gap, ts - self.last_ts)
+        else:
+            self.first_ts = ts
+        self.last_ts = ts
+        self.pending += text
+        self.keys += 1
+
+
+class ScannerInput(QObject):
+    """Event filter that assembles scanner bursts on the watched line edits."""
+
+    # (pole, kod, {"burst": bool, "keys": int, "duration_ms": int, "max_gap_ms": int})
+    scanned = pyqtSignal(object, str, dict)
+    # klawisz skrótu naciśnięty na pustym polu, np. spacja = pominięcie skanu stacka
+    hotkey = pyqtSignal(object, int)
+
+    def __init__(self, parent=None, burst_gap_ms: int = BURST_GAP_MS, min_len: int = BURST_MIN_LEN):
+        super().__init__(parent)
+        self.burst_gap_ms = burst_gap_ms
+        self.min_len = min_len
+        self._widgets: Dict[int, QLineEdit] = {}
+        self._hotkeys: Dict[int, set] = {}
+        self._bursts: Dict[int, _Burst] = {}
+        self._idle = QTimer(self)
+        self._idle.setSingleShot(True)
+        self._idle.timeout.connect(self._flush_all)
+
+    def watch(self, widget: QLineEdit, hotkeys=()) -> None:
+        key = id(widget)
+        self._widgets[key] = widget
+        self._hotkeys[key] = set(hotkeys)
+        self._bursts[key] = _Burst()
+        widget.installEventFilter(self)
+
+    def reset(self, widget: QLineEdit) -> None:
+        """Drop pending characters of ``widget`` (e.g. when the field is cleared)."""
+        if id(widget) in self._bursts:
+            self._bursts[id(widget)] = _Burst()
+
+    # --- filtr -------------------------------------------------------------
+
+    def eventFilter(self, obj, event):
+        if event.type() != QEvent.KeyPress:
+            return False
+        key = id(obj)
+        burst = self._bursts.get(key)
+        if burst is None:
+            return False
+        widget = self._widgets[key]
+        ts = event.timestamp() or int(time.monotonic() * 1000)
+
+        if event.key() in _TERMINATORS:
+            self._finish(widget, burst, ts)
+            return True
+
+        if (event.key() in self._hotkeys[key] and not burst.pending and not widget.text()):
+            self.hotkey.emit(widget, event.key())
+            return True
+
+        text = event.text()
+        printable = bool(text) and text.isprintable() and not (
+            event.modifiers() & (Qt.ControlModifier | Qt.AltModifier)
+        )
+        if not printable:
+            # klawisze edycyjne (Backspace, strzałki, skróty) – najpierw wpisujemy bufor
+            self._flush(widget, burst)
+            return False
+
+        if burst.last_ts is not None and ts - burst.last_ts > self.burst_gap_ms and burst.pending:
+            # przerwa – poprzednia część trafia do pola, nowa seria startuje od tego klawisza
+            self._flush(widget, burst)
+        if burst.first_ts is None:
+            burst.clean = not widget.text()
+        burst.add(text, ts)
+        self._idle.start(IDLE_FLUSH_MS)
+        return True
+
+    # --- bufor -------------------------------------------------------------
+
+    def _flush(self, widget: QLineEdit, burst: _Burst) -> None:
+        if not burst.pending:
+            return
+        widget.insert(burst.pending)
+        burst.pending = ""
+
+    def _flush_all(self) -> None:
+        for key, burst in self._bursts.items():
+            self._flush(self._widgets[key], burst)
+
+    def _finish(self, widget: QLineEdit, burst: _Burst, ts: int) -> None:
+        self._flush(widget, burst)
+        code = widget.text().strip()
+        is_burst = (
+            burst.clean
+            and burst.keys >= self.min_len
+            and burst.max_gap <= self.burst_gap_ms
+        )
+        info = {
+            "burst": is_burst,
+            "keys": burst.keys,
+            "duration_ms": (ts - burst.first_ts) if burst.first_ts is not None else 0,
+            "max_gap_ms": burst.max_gap,
+        }
+        self._bursts[id(widget)] = _Burst()
+        log_event("scanner_input", level="debug", widget=widget.objectName(), length=len(code), **info)
+        self.scanned.emit(widget, code, info)
+
+
+class SerialScanSource(QObject):
+    """Qt bridge for `serial_scanner.SerialScannerReader`; signals are delivered in the GUI thread."""
+
+    code_received = pyqtSignal(str)
+    status_changed = pyqtSignal(bool, str)
+
+    def __init__(self, port: str, baudrate: int = 9600, terminator: str = "CR", parent=None):
+        super().__init__(parent)
+        from serial_scanner import SerialScannerReader  # import leniwy – tylko gdy skonfigurowano port
+
+        # emit z wątku czytnika – Qt kolejkuje sygnał do wątku odbiorcy (połączenie automatyczne)
+        self.reader = SerialScannerReader(
+            port, self.code_received.emit, baudrate, terminator, on_status=self.status_changed.emit
+        )
+
+    def start(self) -> None:
+        self.reader.start()
+
+    def stop(self) -> None:
+        self.reader.stop()
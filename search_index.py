@@ -0,0 +1,154 @@
+"""
+Indeks wyszukiwania nieprzypisanych sztuk (DMC i kod stacka).
+
+`UnassignedIndex` trzyma w pamięci posortowaną listę kluczy (wyszukiwanie
+po prefiksie przez `bisect`) oraz indeks trigramów (wyszukiwanie po
+fragmencie), więc zapytanie nie przegląda wszystkich palet. Indeks jest
+aktualizowany przyrostowo przy dodaniu, usunięciu i przeniesieniu sztuk.
+Wyniki wskazują paletę i wiersz, w którym sztuka jest obecnie.
+"""
+
+import bisect
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_FIELDS = ("dmc", "stack")
+
+
+def _normalize(text: str) -> str:
+    return str(text or "").strip().upper()
+
+
+def _trigrams(key: str) -> Set[str]:
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class UnassignedIndex:
+    """Prefix and substring search over ``{pallet_id: [{"dmc", "stack"}, ...]}``."""
+
+    def __init__(self, unassigned: Optional[Dict[str, List[dict]]] = None):
+        self._unassigned: Dict[str, List[dict]] = {}
+        self._pallet: Dict[int, str] = {}      # id(item) -> pallet_id
+        self._items: Dict[int, dict] = {}      # id(item) -> item
+        self._keys: Dict[str, Set[int]] = {}   # klucz -> id sztuk
+        self._sorted: List[str] = []
+        self._grams: Dict[str, Set[str]] = {}  # trigram -> klucze
+        if unassigned is not None:
+            self.rebuild(unassigned)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def rebuild(self, unassigned: Dict[str, List[dict]]) -> None:
+        self._unassigned = unassigned
+        self._pallet.clear()
+        self._items.clear()
+        self._keys.clear()
+        self._grams.clear()
+        self._sorted = []
+        for pid, items in unassigned.items():
+            self.add(pid, items)
+
+    # --- aktualizacje ------------------------------------------------------
+
+    def add(self, pallet_id: str, items: Iterable[dict]) -> None:
+        """Index ``items`` as belonging to ``pallet_id`` (re-adding an item moves it)."""
+        for itm in items:
+            iid = id(itm)
+            if iid in self._items:
+                self._pallet[iid] = pallet_id
+                continue
+            self._items[iid] = itm
+            self._pallet[iid] = pallet_id
+            for key in self._item_keys(itm):
+                ids = self._keys.get(key)
+                if ids is None:
+                    ids = self._keys[key] = set()
+                    bisect.insort(self._sorted, key)
+                    for gram in _trigrams(key):
+                        self._grams.setdefault(gram, set()).add(key)
+                ids.add(iid)
+
+    def remove(self, items: Iterable[dict]) -> None:
+        for itm in items:
+            iid = id(itm)
+            if self._items.pop(iid, None) is None:
+                continue
+            self._pallet.pop(iid, None)
+            for key in self._item_keys(itm):
+                ids = self._keys.get(key)
+                if ids is None:
+                    continue
+                ids.discard(iid)
+                if not ids:
+                    del self._keys[key]
+                    pos = bisect.bisect_left(self._sorted, key)
+                    if pos < len(self._sorted) and self._sorted[pos] == key:
+                        del self._sorted[pos]
+                    for gram in _trigrams(key):
+                        keys = self._grams.get(gram)
+                        if keys is not None:
+                            keys.discard(key)
+                            if not keys:
+                                del self._grams[gram]
+
+    @staticmethod
+    def _item_keys(itm: dict) -> Set[str]:
+        return {k for k in (_normalize(itm.get(f)) for f in _FIELDS) if k}
+
+    # --- wyszukiwanie ------------------------------------------------------
+
+    def _prefix_keys(self, query: str) -> List[str]:
+        lo = bisect.bisect_left(self._sorted, query)
+        hi = bisect.bisect_left(self._sorted, query + "\uffff")
+        return self._sorted[lo:hi]
+
+    def _substring_keys(self, query: str) -> List[str]:
+        if len(query) < 3:
+            # za krótkie na trigramy – przeglądamy klucze (zapytania 1–2 znakowe są rzadkie)
+            return [k for k in self._sorted if query in k]
+        candidates: Optional[Set[str]] = None
+        for gram in sorted(_trigrams(query), key=lambda g: len(self._grams.get(g, ()))):
+            keys = self._grams.get(gram)
+            if not keys:
+                return []
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return []
+        return sorted(k for k in (candidates or ()) if query in k)
+
+    def search(self, query: str, limit: int = 200) -> List[Tuple[str, int, dict]]:
+        """Return ``(pallet_id, row, item)`` hits: prefix matches first, then substring matches."""
+        query = _normalize(query)
+        if not query:
+            return []
+        seen: Set[int] = set()
+        hits: List[Tuple[str, int, dict]] = []
+        prefix = self._prefix_keys(query)
+        prefix_set = set(prefix)
+        keys = prefix + [k for k in self._substring_keys(query) if k not in prefix_set]
+        for key in keys:
+            for iid in sorted(self._keys.get(key, ()), key=self._sort_key):
+                if iid in seen:
+                    continue
+                seen.add(iid)
+                located = self._locate(iid)
+                if located is not None:
+                    hits.append(located)
+                    if len(hits) >= limit:
+                        return hits
+        return hits
+
+    def _sort_key(self, iid: int) -> str:
+        return self._pallet.get(iid, "")
+
+    def _locate(self, iid: int) -> Optional[Tuple[str, int, dict]]:
+        pid = self._pallet.get(iid)
+        itm = self._items.get(iid)
+        items = self._unassigned.get(pid) if pid is not None else None
+        if itm is None or not items:
+            return None
+        # wiersz ustalamy przy zapytaniu – paleta ma kilkadziesiąt sztuk, a indeks nie musi śledzić przesunięć
+        for row, candidate in enumerate(items):
+            if candidate is itm:
+                return pid, row, itm
+        return None
@@ -0,0 +1,241 @@
+"""
+Skaner podłączony jako port szeregowy / wirtualny COM (USB-CDC).
+
+W trybie klawiatury kod trafia tylko do okna z fokusem; z portu
+szeregowego kody czytane są w wątku tła niezależnie od fokusu i
+obciążenia GUI. `SerialScannerReader` dzieli strumień bajtów na kody po
+znaku końca (`FrameSplitter`), a każdy kompletny kod przekazuje do
+funkcji `on_code` (wywoływanej w wątku czytnika – GUI musi przenieść ją
+do swojego wątku, np. sygnałem Qt). Po odłączeniu skanera port jest
+otwierany ponownie co `reconnect_s` sekund.
+
+Port otwierany jest przez `pyserial` (opcjonalna zależność, `pip install
+pyserial`); bez niego na Linuksie obsługiwane są ścieżki urządzeń i
+pseudoterminale (np. do testów: `python serial_scanner.py --selftest`).
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+TERMINATORS = {"CR": b"\r", "LF": b"\n", "CRLF": b"\r\n", "TAB": b"\t"}
+
+
+class FrameSplitter:
+    """Split a byte stream into codes; any of CR/LF (or the configured terminator) ends a frame."""
+
+    def __init__(self, terminator: bytes = b"\r", max_len: int = 512, encoding: str = "ascii"):
+        # CR i LF traktujemy zamiennie – skanery bywają ustawione na CR, LF albo CRLF
+        self.separators = set(terminator) | ({13, 10} if terminator in (b"\r", b"\n", b"\r\n") else set())
+        self.max_len = max_len
+        self.encoding = encoding
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> List[str]:
+        codes = []
+        for byte in data:
+            if byte in self.separators:
+                if self._buf:
+                    codes.append(self._buf.decode(self.encoding, errors="replace").strip())
+                    self._buf.clear()
+                continue
+            self._buf.append(byte)
+            if len(self._buf) > self.max_len:
+                # brak znaku końca – śmieci na linii, odrzucamy
+                self._buf.clear()
+        return [c for c in codes if c]
+
+    @property
+    def pending(self) -> bytes:
+        return bytes(self._buf)
+
+
+class _PosixPort:
+    """Minimal raw reader for tty/pty device paths (used when pyserial is not installed)."""
+
+    def __init__(self, path: str, baudrate: int):
+        import termios
+        import tty
+
+        self.fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(self.fd)
+            attrs = termios.tcgetattr(self.fd)
+            speed = getattr(termios, f"B{baudrate}", None)
+            if speed is not None:
+                attrs[4] = attrs[5] = speed
+                termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        except termios.error:
+            pass  # pseudoterminal / plik – prędkość bez znaczenia
+
+    def read(self, size: int, timeout: float) -> bytes:
+        import select
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return b""
+        try:
+            data = os.read(self.fd, size)
+        except BlockingIOError:
+            return b""
+        if not data:
+            raise OSError("port zamknięty")
+        return data
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _PySerialPort:
+    def __init__(self, port: str, baudrate: int):
+        import serial  # opcjonalna zależność
+
+        self.port = serial.Serial(port, baudrate=baudrate, timeout=0.2)
+
+    def read(self, size: int, timeout: float) -> bytes:
+        waiting = self.port.in_waiting
+        return self.port.read(max(1, min(size, waiting or 1)))
+
+    def close(self) -> None:
+        self.port.close()
+
+
+def open_port(port: str, baudrate: int = 9600):
+    try:
+        return _PySerialPort(port, baudrate)
+    except ImportError:
+        if os.name == "posix":
+            return _PosixPort(port, baudrate)
+        raise RuntimeError("Obsługa portu COM wymaga pakietu pyserial (pip install pyserial)")
+
+
+class SerialScannerReader:
+    """Background thread reading scanner codes from a serial port."""
+
+    def __init__(
+        self,
+        port: str,
+        on_code: Callable[[str], None],
+        baudrate: int = 9600,
+        terminator: str = "CR",
+        on_status: Optional[Callable[[bool, str], None]] = None,
+        reconnect_s: float = 2.0,
+    ):
+        self.port = port
+        self.baudrate = baudrate
+        self.on_code = on_code
+        self.on_status = on_status
+        self.reconnect_s = reconnect_s
+        self.splitter = FrameSplitter(TERMINATORS.get(str(terminator).upper(), b"\r"))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected: Optional[bool] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="qw2-serial-scanner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _set_status(self, connected: bool, message: str) -> None:
+        # zgłaszamy tylko zmianę stanu, nie każdą nieudaną próbę otwarcia
+        if connected == self.connected:
+            return
+        self.connected = connected
+        if self.on_status is not None:
+            try:
+                self.on_status(connected, message)
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                handle = open_port(self.port, self.baudrate)
+            except Exception as exc:
+                self._set_status(False, f"{self.port}: {exc}")
+                self._stop.wait(self.reconnect_s)
+                continue
+            self._set_status(True, self.port)
+            try:
+                while not self._stop.is_set():
+                    data = handle.read(256, 0.2)
+                    if not data:
+                        continue
+                    for code in self.splitter.feed(data):
+                        self.on_code(code)
+            except Exception as exc:  # odłączony skaner – ponowne otwarcie
+                self._set_status(False, f"{self.port}: {exc}")
+            finally:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
+            self._stop.wait(self.reconnect_s)
+
+
+# --- test na pseudoterminalu -----------------------------------------------
+
+def _selftest() -> int:
+    if os.name != "posix":
+        print("Test na pseudoterminalu dostępny tylko na Linuksie")
+        return 1
+    master, slave = os.openpty()
+    codes: List[str] = []
+    got = threading.Event()
+
+    def on_code(code: str) -> None:
+        codes.append(code)
+        if len(codes) == 3:
+            got.set()
+
+    reader = SerialScannerReader(os.ttyname(slave), on_code, reconnect_s=0.1)
+    reader.start()
+    time.sleep(0.3)
+    # kod podzielony na kilka zapisów + CRLF i LF – ramkowanie ma złożyć całe kody
+    for chunk in (b"12VIT0000", b"0000000001\r", b"\nSTACK-1\n", b"12VIT00000000000002\r\n"):
+        os.write(master, chunk)
+        time.sleep(0.05)
+    ok = got.wait(3.0)
+    reader.stop()
+    os.close(master)
+    os.close(slave)
+    print("Odebrane kody:", codes)
+    return 0 if ok and codes == ["12VIT00000000000001", "STACK-1", "12VIT00000000000002"] else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Odczyt skanera z portu szeregowego")
+    parser.add_argument("--selftest", action="store_true", help="test ramkowania na pseudoterminalu")
+    parser.add_argument("--port", help="port do podglądu kodów, np. COM3 lub /dev/ttyACM0")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--terminator", default="CR", choices=sorted(TERMINATORS))
+    args = parser.parse_args(argv)
+    if args.selftest:
+        return _selftest()
+    if not args.port:
+        parser.error("podaj --port albo --selftest")
+    reader = SerialScannerReader(
+        args.port, lambda code: print(code, flush=True), args.baud, args.terminator,
+        on_status=lambda ok, msg: print(("POŁĄCZONO " if ok else "BRAK PORTU ") + msg, file=sys.stderr),
+    )
+    reader.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        reader.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
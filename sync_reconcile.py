@@ -0,0 +1,349 @@
+"""
+Uzgadnianie plików między `local_dir` a `sync_dir` (udział traceability).
+
+Pliki tworzone przez aplikację – CSV sztuk w `local_dir/RRRR/MM/RRRR-MM-DD/`
+(także zamknięte partie eksportu zbiorczego) i pliki niezgodności
+`RRRRMMDDGGMM_<DMC>.csv` w katalogu głównym `local_dir` – trafiają na
+udział pod tą samą nazwą. Gdy kopia się nie uda, plik zostaje tylko
+lokalnie; `SyncReconciler` w wątku tła wysyła takie pliki ponownie.
+
+Dla każdego dnia prowadzony jest manifest
+`local_dir/sync_manifest/RRRR-MM-DD.json` (nazwa, rozmiar, mtime, SHA-1,
+czy plik jest na udziale). Przebieg jest przyrostowy, po katalogach dni:
+dzień bez zmian (ten sam mtime katalogu, brak niewysłanych plików) kosztuje
+jeden `stat`; na udziale sprawdzane są tylko pliki jeszcze niepotwierdzone
+(albo wszystkie z danego dnia przy `verify=True`), bez listowania całego
+`sync_dir`. Brakujące lub różniące się pliki są wysyłane zbiorczo
+w kilku wątkach (`durable_io.copy_atomic` kopiuje w wątku wywołującym).
+
+`note_file(path)` oznacza dzień do sprawdzenia w najbliższym przebiegu
+(`synced=True` po udanej kopii aplikacji – plik trafia do manifestu jako
+potwierdzony, bez ponownego czytania go z udziału),
+`trigger()` budzi wątek od razu, a `on_status(backlog, error)` zgłasza
+liczbę niewysłanych plików (np. do wskaźnika w pasku stanu).
+
+Bez GUI:
+    python sync_reconcile.py --local C:\\QW2 --sync \\\\serwer\\traceability --days 30 [--verify] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from durable_io import copy_atomic, write_atomic
+from logger import log_event
+
+MANIFEST_DIR = "sync_manifest"
+_DAY_DIR = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_ROOT_FILE = re.compile(r"^(\d{4})(\d{2})(\d{2})\d{4}_.+\.csv$")
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def day_of(path: str) -> Optional[str]:
+    """Day (``YYYY-MM-DD``) a produced file belongs to, from its day directory or file name."""
+    parent = os.path.basename(os.path.dirname(path))
+    if _DAY_DIR.match(parent):
+        return parent
+    m = _ROOT_FILE.match(os.path.basename(path))
+    return f"{m.group(1)}-{m.group(2)}-{m.group(3)}" if m else None
+
+
+class SyncReconciler:
+    """Background re-upload of produced files missing from (or different in) ``sync_dir``."""
+
+    def __init__(self, local_dir: str, sync_dir: str, lookback_days: int = 7, interval_s: float = 300.0,
+                 workers: int = 4, on_status: Optional[Callable[[int, str], None]] = None,
+                 dry_run: bool = False):
+        self.local_dir = local_dir
+        self.sync_dir = sync_dir
+        self.lookback_days = lookback_days
+        self.interval_s = interval_s
+        self.workers = max(1, workers)
+        self.on_status = on_status
+        self.dry_run = dry_run
+        self.manifest_dir = os.path.join(local_dir, MANIFEST_DIR)
+        self._lock = threading.Lock()
+        self._dirty: set = set()
+        self._unsynced: Dict[str, int] = {}
+        # pliki skopiowane przez aplikację: dzień -> nazwa -> (rozmiar, mtime_ns) z chwili kopii
+        self._copied: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self._bootstrapped = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error = ""
+
+    # --- API ---------------------------------------------------------------
+
+    @property
+    def backlog(self) -> int:
+        with self._lock:
+            return sum(self._unsynced.values())
+
+    def note_file(self, path: str, synced: bool = False) -> None:
+        """Mark the day of a newly written file for the next pass.
+
+        ``synced=True`` after a successful copy to ``sync_dir`` records the file
+        as confirmed without hashing it again on the share.
+        """
+        day = day_of(path)
+        if day is None:
+            return
+        copied = None
+        if synced:
+            try:
+                st = os.stat(path)
+                copied = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        with self._lock:
+            self._dirty.add(day)
+            if copied is not None:
+                self._copied.setdefault(day, {})[os.path.basename(path)] = copied
+
+    def trigger(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="qw2-sync-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:  # np. niedostępny dysk lokalny – kolejna próba w następnym przebiegu
+                self.last_error = str(exc)
+                log_event("sync_reconcile_failed", level="error", error=str(exc))
+                self._notify()
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+
+    def _notify(self) -> None:
+        if self.on_status is not None:
+            try:
+                self.on_status(self.backlog, self.last_error)
+            except Exception:
+                pass
+
+    # --- przebieg ----------------------------------------------------------
+
+    def run_once(self, days: Optional[Iterable[str]] = None, verify: bool = False) -> Dict[str, Any]:
+        """One reconciliation pass; returns counters of the pass."""
+        root_files = self._root_files_by_day()
+        if days is None:
+            with self._lock:
+                todo = set(self._dirty)
+                self._dirty.clear()
+                todo.update(day for day, count in self._unsynced.items() if count)
+            if not self._bootstrapped:
+                # pierwszy przebieg: ostatnie dni i dni z manifestami z niewysłanymi plikami
+                today = date.today()
+                todo.update((today - timedelta(days=i)).isoformat() for i in range(self.lookback_days + 1))
+                todo.update(self._manifest_days())
+                self._bootstrapped = True
+            todo.add(date.today().isoformat())
+            # pliki niezgodności z katalogu głównego – dzień bez zmian kończy się na porównaniu nazw
+            todo.update(root_files)
+        else:
+            todo = set(days)
+
+        summary = {"days": 0, "skipped": 0, "uploaded": 0, "failed": 0}
+        errors: List[str] = []
+        for day in sorted(todo):
+            uploaded, failed, unsynced, skipped, error = self._reconcile_day(day, root_files.get(day, {}), verify)
+            summary["days"] += 1
+            summary["skipped"] += skipped
+            summary["uploaded"] += uploaded
+            summary["failed"] += failed
+            if error:
+                errors.append(error)
+            with self._lock:
+                self._unsynced[day] = unsynced
+        self.last_error = errors[0] if errors else ""
+        summary["backlog"] = self.backlog
+        if summary["uploaded"] or summary["failed"]:
+            log_event("sync_reconciled", level="warning" if summary["failed"] else "info",
+                      error=self.last_error, **summary)
+        self._notify()
+        return summary
+
+    def _manifest_days(self) -> List[str]:
+        try:
+            return [n[:-5] for n in os.listdir(self.manifest_dir) if n.endswith(".json") and _DAY_DIR.match(n[:-5])]
+        except OSError:
+            return []
+
+    def _root_files_by_day(self) -> Dict[str, Dict[str, str]]:
+        """Mismatch files in the top of ``local_dir``, grouped by day (one directory listing)."""
+        by_day: Dict[str, Dict[str, str]] = {}
+        try:
+            with os.scandir(self.local_dir) as it:
+                for entry in it:
+                    m = _ROOT_FILE.match(entry.name)
+                    if m and entry.is_file():
+                        day = f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+                        by_day.setdefault(day, {})[entry.name] = entry.path
+        except OSError:
+            pass
+        return by_day
+
+    def _day_dir(self, day: str) -> str:
+        return os.path.join(self.local_dir, day[:4], day[5:7], day)
+
+    def _manifest_path(self, day: str) -> str:
+        return os.path.join(self.manifest_dir, f"{day}.json")
+
+    def _load_manifest(self, day: str) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(day), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("files"), dict):
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"dir_mtime": None, "files": {}}
+
+    def _save_manifest(self, day: str, manifest: Dict[str, Any]) -> None:
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        write_atomic(self._manifest_path(day), json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+    def _reconcile_day(self, day: str, root_files: Dict[str, str], verify: bool) -> Tuple[int, int, int, int, str]:
+        """Return ``(uploaded, failed, unsynced, skipped, error)`` for one day."""
+        manifest = self._load_manifest(day)
+        files: Dict[str, Dict[str, Any]] = manifest["files"]
+        with self._lock:
+            copied = self._copied.pop(day, {})
+        day_dir = self._day_dir(day)
+        try:
+            dir_mtime = os.stat(day_dir).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+
+        unsynced_before = [name for name, e in files.items() if not e.get("synced")]
+        if (not verify and dir_mtime == manifest.get("dir_mtime") and not unsynced_before
+                and set(root_files) <= set(files)):
+            return 0, 0, 0, 1, ""
+
+        changed = False
+        # lokalne pliki dnia: katalog dnia + pliki niezgodności z katalogu głównego
+        local: Dict[str, str] = dict(root_files)
+        if dir_mtime is not None:
+            with os.scandir(day_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(".csv") and not entry.name.startswith("."):
+                        local[entry.name] = entry.path
+        for name, path in local.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entry = files.get(name)
+            # skopiowany przez aplikację w tej samej wersji – potwierdzony bez czytania z udziału
+            copied_now = copied.get(name) == (st.st_size, st.st_mtime_ns)
+            if entry is None or entry.get("size") != st.st_size or entry.get("mtime") != st.st_mtime_ns:
+                files[name] = {"src": os.path.relpath(path, self.local_dir), "size": st.st_size,
+                               "mtime": st.st_mtime_ns, "sha1": file_sha1(path), "synced": copied_now}
+                changed = True
+            elif copied_now and not entry.get("synced"):
+                entry["synced"] = True
+                changed = True
+
+        # na udziale sprawdzamy tylko niepotwierdzone pliki (wszystkie przy verify)
+        to_check = [name for name, e in files.items()
+                    if (verify or not e.get("synced")) and (name in local or not e.get("synced"))]
+        to_upload = []
+        for name in to_check:
+            e = files[name]
+            dest = os.path.join(self.sync_dir, name)
+            try:
+                same = os.path.getsize(dest) == e["size"] and file_sha1(dest) == e["sha1"]
+            except OSError:
+                same = False
+            if same:
+                if not e.get("synced"):
+                    e["synced"] = True
+                    changed = True
+            else:
+                if e.get("synced"):
+                    e["synced"] = False
+                    changed = True
+                to_upload.append(name)
+
+        uploaded, failed, error = 0, 0, ""
+        if to_upload and not self.dry_run:
+            results = self._upload([(name, os.path.join(self.local_dir, files[name]["src"])) for name in to_upload])
+            for name, exc in results:
+                if exc is None:
+                    files[name]["synced"] = True
+                    uploaded += 1
+                else:
+                    failed += 1
+                    error = error or f"{name}: {exc}"
+            changed = changed or uploaded > 0
+
+        if (changed or manifest.get("dir_mtime") != dir_mtime) and files and not self.dry_run:
+            manifest["dir_mtime"] = dir_mtime
+            self._save_manifest(day, manifest)
+        unsynced = sum(1 for e in files.values() if not e.get("synced"))
+        return uploaded, failed, unsynced, 0, error
+
+    def _upload(self, items: List[Tuple[str, str]]) -> List[Tuple[str, Optional[Exception]]]:
+        os.makedirs(self.sync_dir, exist_ok=True)
+
+        def copy(item):
+            name, src = item
+            try:
+                copy_atomic(src, os.path.join(self.sync_dir, name))
+                return name, None
+            except Exception as exc:
+                return name, exc
+
+        # udział sieciowy: kilka kopii naraz ukrywa opóźnienie pojedynczego pliku
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="qw2-sync-upload") as pool:
+            return list(pool.map(copy, items))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Uzgadnianie plików local_dir -> sync_dir")
+    parser.add_argument("--local", required=True, help="folder lokalny (local_dir)")
+    parser.add_argument("--sync", required=True, help="folder traceability (sync_dir)")
+    parser.add_argument("--days", type=int, default=7, help="liczba ostatnich dni do sprawdzenia")
+    parser.add_argument("--verify", action="store_true", help="sprawdź na udziale także pliki oznaczone jako wysłane")
+    parser.add_argument("--dry-run", action="store_true", help="tylko raport, bez wysyłania")
+    args = parser.parse_args(argv)
+
+    reconciler = SyncReconciler(args.local, args.sync, dry_run=args.dry_run)
+    today = date.today()
+    days = [(today - timedelta(days=i)).isoformat() for i in range(args.days + 1)]
+    summary = reconciler.run_once(days=days, verify=args.verify)
+    summary["error"] = reconciler.last_error
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Bieżąca wydajność stanowiska: sztuki na godzinę, czas cyklu, odsetek NOK,
+niezgodności stacka i braków danych.
+
+`ThroughputStats` przyjmuje wynik każdego skanu (`record`) w czasie O(1):
+- ostatnie skany trzymane są w buforze cyklicznym (`ScanRing`) – do podglądu,
+- liczniki zbierane są w kubełkach minutowych; sumy dla okna kroczącego
+  (domyślnie 60 min) są aktualizowane przyrostowo, a kubełki starsze niż
+  okno odejmowane przy wypadaniu z okna.
+
+Zamknięte kubełki minutowe są dopisywane (bez czekania na fsync) do
+`<local_dir>/stats/throughput_RRRR-MM-DD.jsonl` i wczytywane po restarcie,
+więc panel po ponownym uruchomieniu od razu pokazuje ostatnią godzinę.
+"""
+
+import json
+import os
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from durable_io import get_writer
+
+# wyniki skanu liczone jako sztuka (mianownik odsetków)
+PIECE_OUTCOMES = ("ok", "nok", "missing", "mismatch")
+OUTCOMES = PIECE_OUTCOMES + ("error", "other")
+
+# wynik zakończenia śledzenia skanu (`Trace.finish`) -> kategoria statystyk
+OUTCOME_MAP = {
+    "ok": "ok",
+    "nok": "nok",
+    "missing": "missing",
+    "stack_mismatch": "mismatch",
+    "lookup_error": "error",
+    "file_error": "error",
+}
+
+
+class ScanRing:
+    """Fixed-size ring buffer of the most recent scans (oldest entries are overwritten)."""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = max(1, int(capacity))
+        self._buf: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._buf[self._next] = record
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def latest(self, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return up to ``n`` records, newest first."""
+        n = self._size if n is None else min(n, self._size)
+        out = []
+        for i in range(1, n + 1):
+            out.append(self._buf[(self._next - i) % self.capacity])
+        return out
+
+
+def _empty_counts() -> Dict[str, float]:
+    counts: Dict[str, float] = {k: 0 for k in OUTCOMES}
+    counts["cycle_ms_sum"] = 0.0
+    counts["cycle_n"] = 0
+    return counts
+
+
+class ThroughputStats:
+    """Rolling-window scan statistics over per-minute buckets."""
+
+    def __init__(self, window_minutes: int = 60, ring_size: int = 256, stats_dir: Optional[str] = None):
+        self.window = timedelta(minutes=window_minutes)
+        self.ring = ScanRing(ring_size)
+        self.stats_dir = stats_dir
+        self._buckets: Deque[Tuple[datetime, Dict[str, float]]] = deque()
+        self._totals = _empty_counts()
+        if stats_dir:
+            self._restore(datetime.now())
+
+    # --- zapis wyników -----------------------------------------------------
+
+    def record(self, outcome: str, cycle_ms: Optional[float] = None, ts: Optional[datetime] = None,
+               **fields: Any) -> None:
+        ts = ts or datetime.now()
+        kind = outcome if outcome in OUTCOMES else OUTCOME_MAP.get(outcome, "other")
+        counts = self._bucket_for(ts)
+        counts[kind] += 1
+        self._totals[kind] += 1
+        if cycle_ms is not None and kind in PIECE_OUTCOMES:
+            counts["cycle_ms_sum"] += cycle_ms
+            counts["cycle_n"] += 1
+            self._totals["cycle_ms_sum"] += cycle_ms
+            self._totals["cycle_n"] += 1
+        self.ring.append({"ts": ts, "outcome": kind, "cycle_ms": cycle_ms, **fields})
+        self._evict(ts)
+
+    def _bucket_for(self, ts: datetime) -> Dict[str, float]:
+        minute = ts.replace(second=0, microsecond=0)
+        if self._buckets and self._buckets[-1][0] == minute:
+            return self._buckets[-1][1]
+        if self._buckets and self._buckets[-1][0] > minute:
+            # zegar cofnięty – doliczamy do ostatniego kubełka
+            return self._buckets[-1][1]
+        if self._buckets:
+            self._persist(*self._buckets[-1])
+        counts = _empty_counts()
+        self._buckets.append((minute, counts))
+        return counts
+
+    def _evict(self, now: datetime) -> None:
+        limit = now.replace(second=0, microsecond=0) - self.window
+        while self._buckets and self._buckets[0][0] <= limit:
+            _, counts = self._buckets.popleft()
+            for key, value in counts.items():
+                self._totals[key] -= value
+
+    # --- odczyt ------------------------------------------------------------
+
+    def snapshot(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Rolling rates for the dashboard."""
+        now = now or datetime.now()
+        self._evict(now)
+        totals = self._totals
+        pieces = sum(totals[k] for k in PIECE_OUTCOMES)
+        if self._buckets:
+            covered = (now - self._buckets[0][0]).total_seconds() / 60.0
+            minutes = min(max(covered, 1.0), self.window.total_seconds() / 60.0)
+        else:
+            minutes = 0.0
+
+        def rate(key: str) -> Optional[float]:
+            return totals[key] / pieces if pieces else None
+
+        return {
+            "window_minutes": self.window.total_seconds() / 60.0,
+            "pieces": int(pieces),
+            "pieces_per_hour": pieces * 60.0 / minutes if minutes else 0.0,
+            "avg_cycle_ms": totals["cycle_ms_sum"] / totals["cycle_n"] if totals["cycle_n"] else None,
+            "ok_rate": rate("ok"),
+            "nok_rate": rate("nok"),
+            "mismatch_rate": rate("mismatch"),
+            "missing_rate": rate("missing"),
+            "errors": int(totals["error"]),
+        }
+
+    # --- kubełki minutowe na dysku -----------------------------------------
+
+    def _day_path(self, day: datetime) -> str:
+        return os.path.join(self.stats_dir, f"throughput_{day:%Y-%m-%d}.jsonl")
+
+    def _persist(self, minute: datetime, counts: Dict[str, float]) -> Optional[Future]:
+        if not self.stats_dir:
+            return None
+        line = json.dumps({"minute": minute.strftime("%Y-%m-%dT%H:%M"), **counts}, ensure_ascii=False) + "\n"
+        try:
+            os.makedirs(self.stats_dir, exist_ok=True)
+            # bez czekania na fsync – utrata ostatniej minuty po zaniku zasilania jest akceptowalna
+            return get_writer().append_bytes(self._day_path(minute), line.encode("utf-8"))
+        except Exception:
+            return None
+
+    def flush(self) -> None:
+        """Persist the current (still open) minute, e.g. on application exit."""
+        if not self._buckets:
+            return
+        future = self._persist(*self._buckets[-1])
+        if future is not None:
+            try:
+                future.result(timeout=2.0)
+            except Exception:
+                pass
+
+    def _restore(self, now: datetime) -> None:
+        start = now.replace(second=0, microsecond=0) - self.window
+        merged: Dict[datetime, Dict[str, float]] = {}
+        for day in sorted({start.date(), now.date()}):
+            path = self._day_path(datetime.combine(day, datetime.min.time()))
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    data = json.loads(line)
+                    minute = datetime.strptime(data.pop("minute"), "%Y-%m-%dT%H:%M")
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if minute <= start or minute > now:
+                    continue
+                # ta sama minuta mogła zostać zapisana dwa razy (flush przy zamknięciu) – wygrywa ostatni wpis
+                counts = _empty_counts()
+                for key in counts:
+                    try:
+                        counts[key] = float(data.get(key, 0) or 0)
+                    except (TypeError, ValueError):
+                        pass
+                merged[minute] = counts
+        for minute in sorted(merged):
+            counts = merged[minute]
+            self._buckets.append((minute, counts))
+            for key, value in counts.items():
+                self._totals[key] += value
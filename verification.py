@@ -0,0 +1,198 @@
+"""
+Weryfikacja sztuki i wiersze pliku inspekcji – bez GUI.
+
+Funkcje są wspólne dla trybu szeregowego (`on_child_enter`) i trybu
+potokowego (weryfikacja w wątku roboczym):
+- `verify_piece` – sprawdzenie, czy sztuka była już na QW2, i statusu EOL,
+- `eol_verdict` – werdykt z listy inspekcji EOL (najnowszy wpis),
+- `inspect_rows` / `mismatch_rows` – wiersze `INSPECT;...` do pliku CSV,
+- `piece_csv_path` – ścieżka pliku sztuki w drzewie `RRRR/MM/RRRR-MM-DD`,
+- `verify_many` – weryfikacja zbiorcza par DMC/stack (taca, zwrócona paleta)
+  w ograniczonej puli wątków; `batch_rows` – tabela wyników do CSV,
+- `recheck_eol` – ponowne sprawdzenie statusu EOL sztuki przy zamykaniu
+  palety (uruchamiane przez `verify_many(..., task=recheck_eol)`).
+"""
+
+import io
+import os
+import re
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_ROW_PREFIX = ["INSPECT", ""]
+_STATION_3661 = ["436", "ZI01-0010-0920", "3661", "ZI01-0010-0920-0380", "139596023", "505-455-99-99", "1"]
+_STATION_3504 = ["436", "ZI01-0010-0920", "3504", "ZI01-0010-0920-0380", "139596023", "505-455-00-00", "1"]
+
+
+def eol_verdict(eol_list: Optional[List[Dict[str, Any]]]) -> Tuple[bool, bool]:
+    """Return ``(eol_ok, missing)`` from the getInspect "Status" records."""
+    if not eol_list:
+        return False, True
+    latest = max(eol_list, key=lambda x: datetime.strptime(x["inspectdate"], "%Y-%m-%d %H:%M:%S"))
+    return latest.get("judge") == "1", False
+
+
+def verdict_name(eol_ok: bool, missing: bool) -> str:
+    return "missing" if missing else ("ok" if eol_ok else "nok")
+
+
+def verify_piece(client, dmc: str, child_serno: str,
+                 span: Optional[Callable[..., Any]] = None) -> Dict[str, Any]:
+    """Run the QW2 "already checked" and EOL lookups for one piece.
+
+    ``span(endpoint, **fields)`` may wrap each lookup (e.g. `Trace.span`);
+    `intranet.IntranetError` propagates to the caller.
+    """
+    def lookup(endpoint, **fields):
+        return span(endpoint, **fields) if span is not None else nullcontext({})
+
+    with lookup("getInspect", serno=dmc, inspect="QW2_child_serno", line=436, machine=3661) as result:
+        existing = client.check_inspect(dmc, "QW2_child_serno", 436, 3661, result=result)
+    with lookup("getInspect", serno=child_serno, inspect="Status", line=436, machine=3504) as result:
+        eol_list = client.check_inspect(child_serno, "Status", 436, 3504, result=result)
+    eol_ok, missing = eol_verdict(eol_list)
+    return {
+        "already_checked": bool(existing),
+        "eol_ok": eol_ok,
+        "missing": missing,
+        "verdict": verdict_name(eol_ok, missing),
+    }
+
+
+def inspect_rows(dmc: str, badge: str, ts_str: str, eol_ok: bool, missing: bool, skipped: bool) -> List[List[str]]:
+    """Rows of the per-piece inspection file (same layout as before the split)."""
+    rows = [
+        _ROW_PREFIX + [ts_str] + _STATION_3661 + [dmc, "QW2_WpcRfid", badge, '-', '-', '0'],
+        _ROW_PREFIX + [ts_str] + _STATION_3504 + [dmc, "QW2_EOL_Status", 'OK' if eol_ok else 'NOK',
+                                                  '1' if eol_ok else '0', '-', '0'],
+    ]
+    if missing:
+        rows.append(_ROW_PREFIX + [ts_str] + _STATION_3504 + [dmc, "QW2_EOL_Missing_data", 'NOK', '0', '-', '0'])
+    if skipped:
+        rows.append(_ROW_PREFIX + [ts_str] + _STATION_3661 + [dmc, "QW2_child_serno", "BRAK", "2", "-", "0"])
+    else:
+        rows.append(_ROW_PREFIX + [ts_str] + _STATION_3661 + [dmc, "QW2_child_serno", "OK", "1", "-", "0"])
+    return rows
+
+
+def mismatch_rows(dmc: str, badge: str, approver: str, ts_str: str) -> List[List[str]]:
+    return [
+        _ROW_PREFIX + [ts_str] + _STATION_3661 + [dmc, "QW2_WpcRfid", badge, '0', '-', '0'],
+        _ROW_PREFIX + [ts_str] + _STATION_3661 + [dmc, "QW2_child_serno", 'NOK', '0', '-', '0'],
+        _ROW_PREFIX + [ts_str] + _STATION_3661 + [dmc, "QW2_Approver", approver, '0', '-', '0'],
+    ]
+
+
+def piece_csv_path(local_dir: str, ts: datetime, dmc: str) -> str:
+    date_dir = os.path.join(local_dir, ts.strftime("%Y"), ts.strftime("%m"), ts.strftime("%Y-%m-%d"))
+    return os.path.join(date_dir, ts.strftime("%Y%m%d%H%M") + f"_{dmc}.csv")
+
+
+def verify_pair(client, dmc: str, stack: Optional[str] = None) -> Dict[str, Any]:
+    """Full check of one DMC (optionally against a scanned stack) – never raises."""
+    result: Dict[str, Any] = {"dmc": dmc, "stack": stack or "", "child_serno": "", "error": ""}
+    try:
+        info = client.get_matching_info(dmc)
+        child = (info or {}).get("child_serno") or ""
+        result["child_serno"] = child
+        if not child:
+            result["verdict"] = "no_data"
+            return result
+        result["stack_match"] = (not stack) or stack == child
+        result.update(verify_piece(client, dmc, child))
+        if not result["stack_match"]:
+            result["verdict"] = "mismatch"
+    except Exception as exc:
+        result["verdict"] = "error"
+        result["error"] = str(exc)
+    return result
+
+
+def recheck_eol(client, dmc: str, stack: Optional[str] = None) -> Dict[str, Any]:
+    """Re-query the EOL "Status" of an already counted piece (``stack`` is its child_serno) – never raises."""
+    result: Dict[str, Any] = {"dmc": dmc, "stack": stack or "", "child_serno": stack or "", "error": ""}
+    try:
+        eol_ok, missing = eol_verdict(client.check_inspect(stack or "", "Status", 436, 3504))
+        result.update(eol_ok=eol_ok, missing=missing, verdict=verdict_name(eol_ok, missing))
+    except Exception as exc:
+        result["verdict"] = "error"
+        result["error"] = str(exc)
+    return result
+
+
+def verify_many(client, pairs: List[Tuple[str, Optional[str]]], workers: int = 8,
+                on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                cancel=None, task: Callable[..., Dict[str, Any]] = verify_pair) -> List[Optional[Dict[str, Any]]]:
+    """Verify many ``(dmc, stack)`` pairs concurrently with at most ``workers`` lookups in flight.
+
+    ``on_result(index, result)`` is called from the worker threads as results
+    arrive; the returned list keeps the input order. ``cancel`` (a
+    `threading.Event`) stops submitting further pieces. ``task(client, dmc,
+    stack)`` is the per-piece check (`verify_pair` or `recheck_eol`).
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait  # import leniwy – poza startem
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(pairs)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="qw2-batch-verify") as pool:
+        pending = set()
+        items = iter(enumerate(pairs))
+        # ograniczona liczba zadań w kolejce – anulowanie działa od razu, a pamięć nie rośnie z długością listy
+        while True:
+            while len(pending) < workers * 2 and not (cancel is not None and cancel.is_set()):
+                nxt = next(items, None)
+                if nxt is None:
+                    break
+                idx, (dmc, stack) = nxt
+                future = pool.submit(task, client, dmc, stack)
+                future.index = idx
+                pending.add(future)
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[future.index] = future.result()
+                if on_result is not None:
+                    on_result(future.index, results[future.index])
+    return results
+
+
+def load_pallet_csv(path: str) -> List[Tuple[str, str]]:
+    """Read ``(dmc, stack)`` pairs from a pallet file written by `_do_assign` (or a ``;`` list)."""
+    import csv
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        text = f.read()
+    delimiter = ";" if text.count(";") > text.count(",") else ","
+    pairs = []
+    for row in csv.reader(io.StringIO(text), delimiter=delimiter):
+        if not row or not row[0].strip() or row[0].strip() == "Kod Vitesco":
+            continue
+        pairs.append((row[0].strip(), row[1].strip() if len(row) > 1 else ""))
+    return pairs
+
+
+def parse_pairs(text: str) -> List[Tuple[str, str]]:
+    """Parse pasted/scanned lines ``DMC`` or ``DMC;STACK`` (also ``,`` / tab separated)."""
+    pairs = []
+    for line in text.splitlines():
+        parts = [p.strip() for p in re.split(r"[;,\t]", line) if p.strip()]
+        if parts:
+            pairs.append((parts[0], parts[1] if len(parts) > 1 else ""))
+    return pairs
+
+
+BATCH_HEADER = ["DMC", "Stack", "Child serno", "Werdykt", "EOL", "Sprawdzona QW2", "Błąd"]
+
+
+def batch_rows(results: List[Optional[Dict[str, Any]]]) -> List[List[str]]:
+    rows = [list(BATCH_HEADER)]
+    for r in results:
+        if r is None:
+            continue
+        eol = "BRAK" if r.get("missing") else ("OK" if r.get("eol_ok") else ("NOK" if "eol_ok" in r else ""))
+        rows.append([
+            r["dmc"], r.get("stack", ""), r.get("child_serno", ""), r.get("verdict", ""),
+            eol, "TAK" if r.get("already_checked") else "", r.get("error", ""),
+        ])
+    return rows